@@ -0,0 +1,253 @@
+"""
+Benchmarks for the hot paths of the BURG SetupTool scene manager.
+
+Runs inside blender in background mode, using the startup file of the setup tool:
+
+    blender -b burg-toolkit-setup-gui/burg_setup_gui.blend \
+        --python benchmarks/bench_scene_manager.py -- \
+        --output results.json [--baseline baseline.json] [--save-baseline baseline.json]
+
+A synthetic object library is created in the work directory on first use,
+it does not need any downloads. Every case is run for a sweep of instance
+counts, the median of several repetitions is reported.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import bpy
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(BASE_DIR, 'burg-toolkit'))
+sys.path.append(os.path.join(BASE_DIR, 'burg-toolkit-setup-gui'))
+
+import burg_toolkit as burg  # noqa: E402
+import burg_setup_gui  # noqa: E402
+import burg_setup_gui_utils as utils  # noqa: E402
+import burg_setup_gui_synthetic as synthetic  # noqa: E402
+
+DEFAULT_INSTANCES = [10, 50, 100, 250, 500]
+# second library of the library_switch case, see main
+other_library_file = None
+
+
+def create_synthetic_library(work_dir, n_objects, triangles):
+    """
+    Creates and completes a library of small boxes, unless it already exists.
+
+    :return: Path to the object library yaml file
+    """
+
+    library_dir = os.path.join(work_dir, f"boxes_{n_objects}_{triangles}")
+    library_file = os.path.join(library_dir, 'object_library.yaml')
+    if not os.path.isfile(library_file):
+        synthetic.generate_library(library_dir, n_objects, shapes=("box",),
+                                   triangles=triangles, size_range=(0.008, 0.015))
+    # completion is done once, later runs reuse the completed library
+    utils.SceneManager().load_object_library(library_file)
+    return library_file
+
+
+def grid_poses(mng, n_instances):
+    """
+    Places all blender objects on a grid inside the ground area.
+    """
+
+    width, height = mng.scene.ground_area
+    columns = int(np.ceil(np.sqrt(n_instances * width / height)))
+    rows = int(np.ceil(n_instances / columns))
+    for i, key in enumerate(mng.blender_to_burg.keys()):
+        obj = bpy.data.objects[key]
+        obj.location[0] = (i % columns + 0.5) * width / columns
+        obj.location[1] = (i // columns + 0.5) * height / rows
+
+
+def setup_scene(mng, library_file, n_instances):
+    mng.remove_blender_objects()
+    mng.empty_scene(library_file, ground_area=burg.constants.SIZE_A2)
+    identifiers = list(mng.object_library.keys())
+    for i in range(n_instances):
+        mng.add_object(identifiers[i % len(identifiers)])
+    grid_poses(mng, n_instances)
+    mng.update_scene_poses()
+
+
+def reload_library(mng, library_file, n_instances):
+    mng.remove_blender_objects()
+    # otherwise the library is taken from the workspace without reading anything
+    mng.clear_workspace()
+    mng.object_library_file = None
+    mng.load_object_library(library_file)
+
+
+def switch_library(mng, library_file, n_instances):
+    # both libraries are kept in the workspace after the first switch
+    mng.load_object_library(other_library_file)
+    mng.load_object_library(library_file)
+
+
+def add_instances(mng, library_file, n_instances):
+    setup_scene(mng, library_file, n_instances)
+
+
+def update_scene_poses(mng, library_file, n_instances):
+    mng.update_scene_poses()
+
+
+def update_blender_poses(mng, library_file, n_instances):
+    mng.update_blender_poses()
+
+
+def check_status(mng, library_file, n_instances):
+    mng.check_status()
+
+
+def out_of_bounds(mng, library_file, n_instances):
+    mng.out_of_bounds_status(list(mng.blender_to_burg.keys()))
+
+
+def simulate_scene(mng, library_file, n_instances):
+    mng.simulate_scene(verbose=False)
+
+
+def synchronize(mng, library_file, n_instances):
+    # emulates an undo step: a tenth of the objects disappear outside of the manager
+    keys = list(mng.blender_to_burg.keys())
+    for key in keys[:max(1, n_instances // 10)]:
+        bpy.data.objects.remove(bpy.data.objects[key], do_unlink=True)
+    mng.synchronize()
+
+
+def update_previews(mng, library_file, n_instances):
+    burg_setup_gui.update_previews(None, bpy.context)
+
+
+def update_area_size(mng, library_file, n_instances):
+    burg_params = bpy.context.scene.burg_params
+    burg_params.area_size = 'SIZE_A3' if burg_params.area_size == 'SIZE_A2' else 'SIZE_A2'
+
+
+def export_printout(mng, library_file, n_instances):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        mng.get_printout().save_pdf(os.path.join(tmp_dir, 'printout.pdf'),
+                                    page_size=burg.constants.SIZE_A4)
+
+
+# name -> (function, scene needs to be rebuilt before every repetition)
+CASES = {"library_load": (reload_library, False),
+         "library_switch": (switch_library, False),
+         "add_instances": (add_instances, False),
+         "update_scene_poses": (update_scene_poses, False),
+         "update_blender_poses": (update_blender_poses, False),
+         "check_status": (check_status, False),
+         "out_of_bounds": (out_of_bounds, False),
+         "simulate_scene": (simulate_scene, True),
+         "synchronize": (synchronize, True),
+         "update_previews": (update_previews, False),
+         "update_area_size": (update_area_size, False),
+         "export_printout": (export_printout, False)}
+
+
+def run_case(mng, library_file, name, n_instances, repeat):
+    func, rebuild = CASES[name]
+    durations = []
+    setup_scene(mng, library_file, n_instances)
+    for _ in range(repeat):
+        if rebuild:
+            setup_scene(mng, library_file, n_instances)
+        start = time.perf_counter()
+        func(mng, library_file, n_instances)
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations)
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compares results with a baseline.
+
+    :return: List of regression descriptions
+    """
+
+    regressions = []
+    for name, timings in results["results"].items():
+        for n_instances, duration in timings.items():
+            reference = baseline.get("results", {}).get(name, {}).get(n_instances)
+            if reference and duration > reference * (1 + tolerance):
+                regressions.append(f"{name} [{n_instances}]: {duration * 1000:.1f} ms, "
+                                   f"baseline {reference * 1000:.1f} ms "
+                                   f"(+{(duration / reference - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main():
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    parser = argparse.ArgumentParser(description="Benchmarks the BURG SetupTool.")
+    parser.add_argument("--work-dir", default=os.path.join(tempfile.gettempdir(), 'burg_benchmark'),
+                        help="directory of the synthetic object library")
+    parser.add_argument("--objects", type=int, default=5,
+                        help="number of object types of the synthetic library")
+    parser.add_argument("--triangles", type=int, default=12,
+                        help="triangles per mesh of the synthetic library")
+    parser.add_argument("--instances", type=int, nargs="+", default=DEFAULT_INSTANCES,
+                        help="instance counts to sweep")
+    parser.add_argument("--cases", nargs="+", default=list(CASES), choices=list(CASES),
+                        help="cases to run")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="repetitions per case, the median is reported")
+    parser.add_argument("--output", help="json file for the results")
+    parser.add_argument("--baseline", help="json file of a previous run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="relative slowdown reported as regression")
+    parser.add_argument("--save-baseline", help="also write the results as new baseline")
+    args = parser.parse_args(argv)
+
+    # the add-on may already be enabled in the user preferences
+    if not hasattr(bpy.types.Scene, "burg_params"):
+        burg_setup_gui.register()
+    os.makedirs(args.work_dir, exist_ok=True)
+    library_file = create_synthetic_library(args.work_dir, args.objects, args.triangles)
+    global other_library_file
+    other_library_file = create_synthetic_library(args.work_dir, args.objects + 1, args.triangles)
+    mng = utils.SceneManager()
+
+    results = {"meta": {"blender": bpy.app.version_string,
+                        "python": platform.python_version(),
+                        "platform": platform.platform(),
+                        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+                        "repeat": args.repeat,
+                        "objects": args.objects,
+                        "triangles": args.triangles},
+               "results": {}}
+    for name in args.cases:
+        results["results"][name] = {}
+        for n_instances in args.instances:
+            duration = run_case(mng, library_file, name, n_instances, args.repeat)
+            # json keys are strings, keep them that way for comparisons
+            results["results"][name][str(n_instances)] = duration
+            print(f"{name:24s} {n_instances:5d} instances {duration * 1000:10.1f} ms")
+
+    for filename in (args.output, args.save_baseline):
+        if filename:
+            with open(filename, 'w') as f:
+                json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,13 +5,81 @@ import mathutils
 
 import burg_toolkit as burg
 import burg_setup_gui_utils as utils
+import burg_setup_gui_collection as collection
+import burg_setup_gui_io as io
+from burg_setup_gui_profiling import profiler
 
 import os
+import json
+import time
 import numpy as np
 import traceback
 
 # the one and only manager
 mng = utils.SceneManager()
+# reads and writes of the file operators, see get_io_worker
+io_worker = None
+
+
+def get_io_worker():
+    global io_worker
+    if io_worker is None:
+        io_worker = io.IOWorker()
+    return io_worker
+
+
+class BackgroundIO(object):
+    """
+    Mixin for operators waiting on a background read or write.
+
+    Operators invoked from the interface poll the future on a modal timer,
+    so blender stays responsive, operators called from scripts wait for it.
+    Operators declare a hidden background property, set in invoke.
+    """
+
+    # seconds between checks of the future
+    poll_interval = 0.1
+
+    def run_in_background(self, context, future, on_done, status, failure):
+        """
+        :param future: Future of a read or write, see IOWorker
+        :param on_done: Called on the main thread with the context and the result of the future
+        :param status: Status bar text while waiting
+        :param failure: Error message if the read or write fails
+        """
+
+        self._future = future
+        self._on_done = on_done
+        self._failure = failure
+        if not self.background or not context.window:
+            # blocking, e.g. when called from scripts
+            return self.complete(context)
+
+        wm = context.window_manager
+        self._timer = wm.event_timer_add(self.poll_interval, window=context.window)
+        wm.modal_handler_add(self)
+        context.workspace.status_text_set(status)
+        bpy.context.window.cursor_set("DEFAULT")
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type != 'TIMER' or not self._future.done():
+            return {'PASS_THROUGH'}
+        context.window_manager.event_timer_remove(self._timer)
+        context.workspace.status_text_set(None)
+        return self.complete(context)
+
+    def complete(self, context):
+        try:
+            return self._on_done(context, self._future.result())
+        except Exception as e:
+            tb = traceback.format_exc()
+            text = f"{self._failure}\n{e}\n{tb}"
+            print(text)
+            self.report({'ERROR'}, text)
+            if context.window:
+                bpy.context.window.cursor_set("DEFAULT")
+            return {'CANCELLED'}
 
 
 # SCENE OPERATORS
@@ -23,6 +91,7 @@ class BURG_OT_random_scene(bpy.types.Operator):
     bl_options = {"REGISTER", "UNDO"}
     bl_description = "Creates a Random Scene.\nOne could assume that we sample N objects in K instances of each object,\n leading to NxK total instances in the scene"
 
+    @profiler.operator("burg.random_scene")
     def execute(self, context):
         bpy.context.window.cursor_set("WAIT")
         burg_params = context.scene.burg_params
@@ -32,9 +101,15 @@ class BURG_OT_random_scene(bpy.types.Operator):
                          ground_area=utils.get_size(
                              burg_params.area_size),
                          n_instances_objects=burg_params.number_instances)
-        mng.simulate_scene(verbose=burg_params.view_simulation)
-        mng.check_status()
         mng.lock_transform(burg_params.lock_transform)
+        if burg_params.view_simulation and context.window:
+            mng.push_snapshot()
+            bpy.ops.burg.simulate_scene('INVOKE_DEFAULT')
+            bpy.context.window.cursor_set("DEFAULT")
+            return {'FINISHED'}
+        mng.simulate_scene(verbose=False)
+        mng.check_status()
+        mng.push_snapshot()
         utils.trigger_display_update(burg_params)
         bpy.context.window.cursor_set("DEFAULT")
         return {'FINISHED'}
@@ -47,6 +122,7 @@ class BURG_OT_empty_scene(bpy.types.Operator):
     bl_label = "Create Empty Scene"
     bl_options = {"REGISTER", "UNDO"}
 
+    @profiler.operator("burg.empty_scene")
     def execute(self, context):
         bpy.context.window.cursor_set("WAIT")
         burg_params = context.scene.burg_params
@@ -55,8 +131,9 @@ class BURG_OT_empty_scene(bpy.types.Operator):
         mng.empty_scene(burg_params.object_library_file,
                         ground_area=utils.get_size(
                             burg_params.area_size))
-        mng.simulate_scene(verbose=burg_params.view_simulation)
+        mng.simulate_scene(verbose=False)
         mng.check_status()
+        mng.push_snapshot()
         utils.trigger_display_update(burg_params)
         bpy.context.window.cursor_set("DEFAULT")
         return {'FINISHED'}
@@ -73,22 +150,120 @@ class BURG_OT_update_scene(bpy.types.Operator):
     def poll(self, context):
         return (context is not None and mng.is_valid_scene())
 
+    @profiler.operator("burg.update_scene")
     def execute(self, context):
+        burg_params = bpy.context.scene.burg_params
+        if burg_params.view_simulation and context.window:
+            # watch the simulation in the viewport, the modal operator does the validation
+            bpy.ops.burg.simulate_scene('INVOKE_DEFAULT')
+            return {'FINISHED'}
+
         bpy.context.window.cursor_set("WAIT")
         mng.synchronize()
         mng.update_scene_poses()
-        burg_params = bpy.context.scene.burg_params
         if(mng.check_status()):
-            mng.simulate_scene(verbose=burg_params.view_simulation)
+            mng.simulate_scene(verbose=False)
             mng.update_blender_poses()
             mng.check_status()
+        mng.push_snapshot()
 
         utils.trigger_display_update(burg_params)
         bpy.context.window.cursor_set("DEFAULT")
         return{'FINISHED'}
 
 
-class BURG_OT_load_object_library(bpy.types.Operator):
+class BURG_OT_simulate_scene(bpy.types.Operator):
+    """ Simulates the scene in the background and shows it settle in the viewport """
+
+    bl_idname = "burg.simulate_scene"
+    bl_label = "Simulate"
+    bl_options = {"REGISTER", "UNDO"}
+
+    # frequency of pose updates in the viewport
+    refresh_rate = 30
+
+    @classmethod
+    def poll(self, context):
+        return (context is not None and mng.is_valid_scene())
+
+    def prepare(self, context):
+        mng.synchronize()
+        mng.update_scene_poses()
+        if not mng.check_status():
+            utils.trigger_display_update(context.scene.burg_params)
+            self.report(
+                {'WARNING'}, "Some objects are obstructed or out of bounds, cannot simulate.")
+            return False
+        return True
+
+    def finish(self, context):
+        burg_params = context.scene.burg_params
+        simulator = self._simulator
+        if simulator.error:
+            print(f"Simulation failed.\n{simulator.error}")
+            self.report({'ERROR'}, f"Simulation failed.\n{simulator.error}")
+            mng.cancel_simulation()
+            return {'CANCELLED'}
+
+        mng.finish_simulation(self._keys, simulator.poses, simulator.steps, simulator.converged)
+        mng.check_status()
+        mng.push_snapshot()
+        utils.trigger_display_update(burg_params)
+        if simulator.converged:
+            self.report({'INFO'}, f"Scene at rest after {simulator.steps} steps.")
+        else:
+            self.report({'INFO'}, f"Simulated {simulator.steps} steps.")
+        return {'FINISHED'}
+
+    @profiler.operator("burg.simulate_scene")
+    def execute(self, context):
+        # blocking, e.g. when called from scripts
+        if not self.prepare(context):
+            return {'CANCELLED'}
+        self._keys, self._simulator = mng.start_simulation()
+        self._simulator.wait()
+        return self.finish(context)
+
+    def invoke(self, context, event):
+        if not self.prepare(context):
+            return {'CANCELLED'}
+        self._keys, self._simulator = mng.start_simulation()
+        wm = context.window_manager
+        self._timer = wm.event_timer_add(
+            1.0 / self.refresh_rate, window=context.window)
+        wm.modal_handler_add(self)
+        context.workspace.status_text_set("Simulating, press Esc to cancel.")
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type == 'ESC':
+            self._simulator.cancel()
+            self._simulator.wait()
+            self.stop(context)
+            # back to the poses before the simulation, objects moved meanwhile stay where they are
+            mng.cancel_simulation()
+            self.report({'INFO'}, "Simulation cancelled.")
+            return {'CANCELLED'}
+
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+
+        latest = self._simulator.latest()
+        if latest:
+            _, poses = latest
+            mng.apply_simulation_poses(self._keys, poses)
+
+        if self._simulator.done:
+            self.stop(context)
+            return self.finish(context)
+        return {'PASS_THROUGH'}
+
+    def stop(self, context):
+        context.window_manager.event_timer_remove(self._timer)
+        context.workspace.status_text_set(None)
+
+
+class BURG_OT_load_object_library(BackgroundIO, bpy.types.Operator):
     """ Loading object library information """
 
     bl_idname = "burg.load_object_library"
@@ -97,33 +272,16 @@ class BURG_OT_load_object_library(bpy.types.Operator):
 
     filepath: bpy.props.StringProperty(subtype="FILE_PATH", default="*.yaml")
     filter_glob: bpy.props.StringProperty(name="Filter", default="*.yaml")
+    background: bpy.props.BoolProperty(default=False, options={'HIDDEN', 'SKIP_SAVE'})
 
+    @profiler.operator("burg.load_object_library")
     def execute(self, context):
         try:
             bpy.context.window.cursor_set("WAIT")
-            # Try to load the library and check if complete
-            object_library = burg.ObjectLibrary.from_yaml(self.filepath)
-            if object_library and object_library.objects_have_all_attributes():
-                burg_params = context.scene.burg_params
-                mng.remove_blender_objects()
-                mng.empty_scene(self.filepath,
-                                ground_area=utils.get_size(burg_params.area_size))
-                burg_params.object_library_file = self.filepath
-                update_previews(self, context)
-                burg_params.area_size = utils.BURG_TO_BLENDER_SIZES[mng.scene.ground_area]
-                utils.tag_redraw(
-                    context, space_type='VIEW_3D', region_type='UI')
-                bpy.context.window.cursor_set("DEFAULT")
-            elif object_library and not object_library.objects_have_all_attributes():
-                # parameterize and call confirmation dialog
-                bpy.ops.burg.library_completion_confirm(
-                    'INVOKE_DEFAULT', filepath=self.filepath, currentpath=self.filepath)
-            else:
-                self.report(
-                    {'ERROR'}, f"Could not open object library: {self.filepath}")
-                bpy.context.window.cursor_set("DEFAULT")
-                return {'CANCELLED'}
-            return {'FINISHED'}
+            future = get_io_worker().read(burg.ObjectLibrary.from_yaml, self.filepath)
+            return self.run_in_background(
+                context, future, self.library_loaded, f"Loading object library {self.filepath}",
+                f"Could not open burg object library: {self.filepath}")
         except Exception as e:
             tb = traceback.format_exc()
             text = str(
@@ -133,9 +291,41 @@ class BURG_OT_load_object_library(bpy.types.Operator):
             bpy.context.window.cursor_set("DEFAULT")
             return {'CANCELLED'}
 
+    def library_loaded(self, context, object_library):
+        # check if the library is complete
+        if object_library and object_library.objects_have_all_attributes():
+            burg_params = context.scene.burg_params
+            mng.remove_blender_objects()
+            mng.empty_scene(self.filepath,
+                            ground_area=utils.get_size(burg_params.area_size),
+                            object_library=object_library)
+            burg_params.object_library_file = self.filepath
+            update_previews(self, context)
+            burg_params.area_size = utils.BURG_TO_BLENDER_SIZES[mng.scene.ground_area]
+            mng.push_snapshot()
+            utils.tag_redraw(
+                context, space_type='VIEW_3D', region_type='UI')
+            bpy.context.window.cursor_set("DEFAULT")
+        elif object_library and not object_library.objects_have_all_attributes():
+            # parameterize and call confirmation dialog
+            bpy.ops.burg.library_completion_confirm(
+                'INVOKE_DEFAULT', filepath=self.filepath, currentpath=self.filepath)
+        else:
+            self.report(
+                {'ERROR'}, f"Could not open object library: {self.filepath}")
+            bpy.context.window.cursor_set("DEFAULT")
+            return {'CANCELLED'}
+        return {'FINISHED'}
+
+    def check(self, context):
+        # start reading as soon as a file is picked in the file browser
+        get_io_worker().prefetch(burg.ObjectLibrary.from_yaml, self.filepath)
+        return False
+
     def invoke(self, context, event):
         # set filepath with default value of property
         self.filepath = self.filepath
+        self.background = True
         context.window_manager.fileselect_add(self)
         return {'RUNNING_MODAL'}
 
@@ -163,6 +353,7 @@ class BURG_OT_library_completion_confirm(bpy.types.Operator):
     def poll(cls, context):
         return True
 
+    @profiler.operator("burg.library_completion_confirm")
     def execute(self, context):
         if self.save_to == "A_New_File":
             bpy.ops.burg.library_completion('INVOKE_DEFAULT',
@@ -217,6 +408,7 @@ class BURG_OT_library_completion(bpy.types.Operator):
     def poll(cls, context):
         return True
 
+    @profiler.operator("burg.library_completion")
     def execute(self, context):
         try:
             bpy.context.window.cursor_set("WAIT")
@@ -229,6 +421,7 @@ class BURG_OT_library_completion(bpy.types.Operator):
                 utils.update_display_colors()
                 mng.lock_transform(burg_params.lock_transform)
                 burg_params.area_size = utils.BURG_TO_BLENDER_SIZES[mng.scene.ground_area]
+                mng.push_snapshot()
                 utils.tag_redraw(
                     context, space_type='VIEW_3D', region_type='UI')
                 bpy.context.window.cursor_set("DEFAULT")
@@ -242,6 +435,7 @@ class BURG_OT_library_completion(bpy.types.Operator):
                 burg_params.object_library_file = self.filepath
                 update_previews(self, context)
                 burg_params.area_size = utils.BURG_TO_BLENDER_SIZES[mng.scene.ground_area]
+                mng.push_snapshot()
                 utils.tag_redraw(
                     context, space_type='VIEW_3D', region_type='UI')
             bpy.context.window.cursor_set("DEFAULT")
@@ -262,18 +456,20 @@ class BURG_OT_library_completion(bpy.types.Operator):
         return {'RUNNING_MODAL'}
 
 
-class BURG_OT_save_printout(bpy.types.Operator):
+class BURG_OT_save_printout(BackgroundIO, bpy.types.Operator):
     """ Saving setup printout to file """
 
     bl_idname = "burg.save_printout"
     bl_label = "Save Printout"
     filepath: bpy.props.StringProperty(
         subtype="FILE_PATH", default="printout.pdf")
+    background: bpy.props.BoolProperty(default=False, options={'HIDDEN', 'SKIP_SAVE'})
 
     @classmethod
     def poll(self, context):
         return (context is not None and mng.is_valid_scene())
 
+    @profiler.operator("burg.save_printout")
     def execute(self, context):
         try:
             bpy.context.window.cursor_set("WAIT")
@@ -287,11 +483,16 @@ class BURG_OT_save_printout(bpy.types.Operator):
                 mng.update_blender_poses()
                 if(mng.check_status()):
                     print_size = utils.get_size(burg_params.printout_size)
-                    printout = burg.printout.Printout(
-                        size=mng.scene.ground_area)
-                    printout.add_scene(mng.scene)
-                    printout.save_pdf(self.filepath, page_size=print_size,
-                                      margin_mm=burg_params.printout_margin)
+                    with profiler.stage("printout render"):
+                        printout = mng.get_printout(vector=burg_params.printout_vector)
+                    # the printout holds its own copy of the instances, the pdf is written from it
+                    future = get_io_worker().write(self.filepath, printout.save_pdf,
+                                                   page_size=print_size,
+                                                   margin_mm=burg_params.printout_margin)
+                    utils.trigger_display_update(burg_params)
+                    return self.run_in_background(
+                        context, future, self.printout_saved, f"Saving printout {self.filepath}",
+                        f"Could not save template file: {self.filepath}")
                 else:
                     invalid = True
             else:
@@ -313,25 +514,32 @@ class BURG_OT_save_printout(bpy.types.Operator):
             bpy.context.window.cursor_set("DEFAULT")
             return {'CANCELLED'}
 
+    def printout_saved(self, context, _):
+        bpy.context.window.cursor_set("DEFAULT")
+        return {'FINISHED'}
+
     def invoke(self, context, event):
         # set filepath with default value of property
         self.filepath = self.filepath
+        self.background = True
         context.window_manager.fileselect_add(self)
         return {'RUNNING_MODAL'}
 
 
-class BURG_OT_save_scene(bpy.types.Operator):
+class BURG_OT_save_scene(BackgroundIO, bpy.types.Operator):
     """ Saving scene setup to file """
 
     bl_idname = "burg.save_scene"
     bl_label = "Save Scene"
     filepath: bpy.props.StringProperty(
         subtype="FILE_PATH", default="scene.yaml")
+    background: bpy.props.BoolProperty(default=False, options={'HIDDEN', 'SKIP_SAVE'})
 
     @classmethod
     def poll(self, context):
         return (context is not None and mng.is_valid_scene())
 
+    @profiler.operator("burg.save_scene")
     def execute(self, context):
         try:
             bpy.context.window.cursor_set("WAIT")
@@ -347,9 +555,11 @@ class BURG_OT_save_scene(bpy.types.Operator):
             utils.trigger_display_update(burg_params)
 
             # printout parameter necessary?
-            mng.save_scene(self.filepath)
-            bpy.context.window.cursor_set("DEFAULT")
-            return {'FINISHED'}
+            future = get_io_worker().write(self.filepath, utils.write_scene,
+                                           mng.copy_scene(), mng.object_library)
+            return self.run_in_background(
+                context, future, self.scene_saved, f"Saving scene {self.filepath}",
+                f"Could not save scene file: {self.filepath}:")
         except Exception as e:
             tb = traceback.format_exc()
             text = str(
@@ -359,14 +569,20 @@ class BURG_OT_save_scene(bpy.types.Operator):
             bpy.context.window.cursor_set("DEFAULT")
             return {'CANCELLED'}
 
+    def scene_saved(self, context, _):
+        mng.scene_file = self.filepath
+        bpy.context.window.cursor_set("DEFAULT")
+        return {'FINISHED'}
+
     def invoke(self, context, event):
        # set filepath with default value of property
         self.filepath = self.filepath
+        self.background = True
         context.window_manager.fileselect_add(self)
         return {'RUNNING_MODAL'}
 
 
-class BURG_OT_load_scene(bpy.types.Operator):
+class BURG_OT_load_scene(BackgroundIO, bpy.types.Operator):
     """ Loading scene setup from file """
 
     bl_idname = "burg.load_scene"
@@ -375,40 +591,114 @@ class BURG_OT_load_scene(bpy.types.Operator):
 
     filepath: bpy.props.StringProperty(subtype="FILE_PATH", default="*.yaml")
     filter_glob: bpy.props.StringProperty(name="Filter", default="*.yaml")
+    background: bpy.props.BoolProperty(default=False, options={'HIDDEN', 'SKIP_SAVE'})
 
+    @profiler.operator("burg.load_scene")
     def execute(self, context):
         try:
             bpy.context.window.cursor_set("WAIT")
-            # We have to load the scene and check if the object library is complete
-            scene, object_library, _ = burg.Scene.from_yaml(self.filepath)
-            if object_library and object_library.objects_have_all_attributes():
-                mng.load_scene(self.filepath)
-                burg_params = context.scene.burg_params
-                burg_params.object_library_file = mng.object_library_file
-                update_previews(self, context)
-                utils.update_display_colors()
-                mng.lock_transform(burg_params.lock_transform)
-                burg_params.area_size = utils.BURG_TO_BLENDER_SIZES[mng.scene.ground_area]
-                utils.tag_redraw(
-                    context, space_type='VIEW_3D', region_type='UI')
+            future = get_io_worker().read(burg.Scene.from_yaml, self.filepath)
+            return self.run_in_background(
+                context, future, self.scene_loaded, f"Loading scene {self.filepath}",
+                f"Could not load scene file: {self.filepath}")
+        except Exception as e:
+            tb = traceback.format_exc()
+            text = str(
+                f"Could not load scene file: {self.filepath}\n{e}\n{tb}")
+            print(text)
+            self.report({'ERROR'}, text)
+            bpy.context.window.cursor_set("DEFAULT")
+            return {'CANCELLED'}
+
+    def scene_loaded(self, context, result):
+        # check if the object library of the scene is complete
+        scene, object_library, _ = result
+        if object_library and object_library.objects_have_all_attributes():
+            mng.load_scene(self.filepath, prefetched=(scene, object_library))
+            burg_params = context.scene.burg_params
+            burg_params.object_library_file = mng.object_library_file
+            update_previews(self, context)
+            utils.update_display_colors()
+            mng.lock_transform(burg_params.lock_transform)
+            burg_params.area_size = utils.BURG_TO_BLENDER_SIZES[mng.scene.ground_area]
+            mng.push_snapshot()
+            utils.tag_redraw(
+                context, space_type='VIEW_3D', region_type='UI')
+            bpy.context.window.cursor_set("DEFAULT")
+        elif object_library and not object_library.objects_have_all_attributes():
+            # parameterize and call confirmation dialog
+            bpy.ops.burg.library_completion_confirm('INVOKE_DEFAULT',
+                                                    filepath=object_library.filename,
+                                                    currentpath=os.path.normpath(
+                                                        object_library.filename),
+                                                    scenepath=self.filepath)
+        else:
+            self.report(
+                {'ERROR'}, f"Could not load scene file: {self.filepath}. Object Library not available.")
+            bpy.context.window.cursor_set("DEFAULT")
+            return {'CANCELLED'}
+        return {'FINISHED'}
+
+    def check(self, context):
+        # start reading as soon as a file is picked in the file browser
+        get_io_worker().prefetch(burg.Scene.from_yaml, self.filepath)
+        return False
+
+    def invoke(self, context, event):
+       # set filepath with default value of property
+        self.filepath = self.filepath
+        self.background = True
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+
+class BURG_OT_load_collection_scene(bpy.types.Operator):
+    """ Loading a scene from a scene collection file """
+
+    bl_idname = "burg.load_collection_scene"
+    bl_label = "Load Scene from Collection"
+    bl_options = {"REGISTER", "UNDO"}
+
+    filepath: bpy.props.StringProperty(subtype="FILE_PATH", default="*.jsonl")
+    filter_glob: bpy.props.StringProperty(name="Filter", default="*.jsonl")
+    scene_index: bpy.props.IntProperty(name="Scene Index", default=0, min=0)
+
+    @profiler.operator("burg.load_collection_scene")
+    def execute(self, context):
+        try:
+            bpy.context.window.cursor_set("WAIT")
+            with collection.SceneCollectionReader(self.filepath) as reader:
+                library_file = reader.object_library_file
+                n_scenes = len(reader)
+            if self.scene_index >= n_scenes:
+                self.report(
+                    {'ERROR'}, f"Collection {self.filepath} only holds {n_scenes} scenes.")
                 bpy.context.window.cursor_set("DEFAULT")
-            elif object_library and not object_library.objects_have_all_attributes():
-                # parameterize and call confirmation dialog
-                bpy.ops.burg.library_completion_confirm('INVOKE_DEFAULT',
-                                                        filepath=object_library.filename,
-                                                        currentpath=os.path.normpath(
-                                                            object_library.filename),
-                                                        scenepath=self.filepath)
-            else:
+                return {'CANCELLED'}
+
+            object_library = burg.ObjectLibrary.from_yaml(library_file)
+            if not object_library.objects_have_all_attributes():
                 self.report(
-                    {'ERROR'}, f"Could not load scene file: {self.filepath}. Object Library not available.")
+                    {'ERROR'}, f"The object library {library_file} of this collection is incomplete. Load and complete it first.")
                 bpy.context.window.cursor_set("DEFAULT")
                 return {'CANCELLED'}
+
+            mng.load_scene_from_collection(self.filepath, self.scene_index)
+            burg_params = context.scene.burg_params
+            burg_params.object_library_file = mng.object_library_file
+            update_previews(self, context)
+            utils.update_display_colors()
+            mng.lock_transform(burg_params.lock_transform)
+            burg_params.area_size = utils.BURG_TO_BLENDER_SIZES[mng.scene.ground_area]
+            mng.push_snapshot()
+            utils.tag_redraw(
+                context, space_type='VIEW_3D', region_type='UI')
+            bpy.context.window.cursor_set("DEFAULT")
             return {'FINISHED'}
         except Exception as e:
             tb = traceback.format_exc()
             text = str(
-                f"Could not load scene file: {self.filepath}\n{e}\n{tb}")
+                f"Could not load scene {self.scene_index} of collection: {self.filepath}\n{e}\n{tb}")
             print(text)
             self.report({'ERROR'}, text)
             bpy.context.window.cursor_set("DEFAULT")
@@ -421,6 +711,147 @@ class BURG_OT_load_scene(bpy.types.Operator):
         return {'RUNNING_MODAL'}
 
 
+class BURG_OT_save_collection_scene(bpy.types.Operator):
+    """ Appending current scene to a scene collection file """
+
+    bl_idname = "burg.save_collection_scene"
+    bl_label = "Add Scene to Collection"
+    filepath: bpy.props.StringProperty(
+        subtype="FILE_PATH", default="scenes.jsonl")
+    filter_glob: bpy.props.StringProperty(name="Filter", default="*.jsonl")
+
+    @classmethod
+    def poll(self, context):
+        return (context is not None and mng.is_valid_scene())
+
+    @profiler.operator("burg.save_collection_scene")
+    def execute(self, context):
+        try:
+            bpy.context.window.cursor_set("WAIT")
+            mng.synchronize()
+            mng.update_scene_poses()
+            index = mng.save_scene_to_collection(self.filepath)
+            self.report({'INFO'}, f"Saved scene {index} to collection {self.filepath}")
+            bpy.context.window.cursor_set("DEFAULT")
+            return {'FINISHED'}
+        except Exception as e:
+            tb = traceback.format_exc()
+            text = str(
+                f"Could not save scene to collection: {self.filepath}:\n{e}\n{tb}")
+            print(text)
+            self.report({'ERROR'}, text)
+            bpy.context.window.cursor_set("DEFAULT")
+            return {'CANCELLED'}
+
+    def invoke(self, context, event):
+       # set filepath with default value of property
+        self.filepath = self.filepath
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+
+# WORKSPACE OPERATORS
+def workspace_switched(context):
+    """
+    Updates the interface after another library or scene of the workspace is shown.
+    """
+
+    burg_params = context.scene.burg_params
+    burg_params.object_library_file = mng.object_library_file
+    update_previews(None, context)
+    mng.lock_transform(burg_params.lock_transform)
+    area_size = utils.BURG_TO_BLENDER_SIZES[mng.scene.ground_area]
+    if burg_params.area_size != area_size:
+        burg_params.area_size = area_size
+    # statuses of scenes which were validated are kept in the workspace
+    if not mng.is_validated():
+        mng.check_status()
+    utils.update_display_colors()
+    mng.push_snapshot()
+    utils.tag_redraw(context, space_type='VIEW_3D', region_type='UI')
+
+
+class BURG_OT_switch_library(bpy.types.Operator):
+    """ Shows an object library of the workspace with its current scene """
+
+    bl_idname = "burg.switch_library"
+    bl_label = "Switch Object Library"
+    bl_options = {"REGISTER", "UNDO"}
+
+    library_file: bpy.props.StringProperty(options={'HIDDEN'})
+
+    @profiler.operator("burg.switch_library")
+    def execute(self, context):
+        try:
+            mng.synchronize()
+            if not mng.switch_library(self.library_file):
+                self.report({'ERROR'}, f"The object library {self.library_file} is no longer loaded.")
+                return {'CANCELLED'}
+            workspace_switched(context)
+            return {'FINISHED'}
+        except Exception as e:
+            tb = traceback.format_exc()
+            text = str(
+                f"Could not switch to object library: {self.library_file}\n{e}\n{tb}")
+            print(text)
+            self.report({'ERROR'}, text)
+            return {'CANCELLED'}
+
+
+class BURG_OT_switch_scene(bpy.types.Operator):
+    """ Shows another scene of the current object library """
+
+    bl_idname = "burg.switch_scene"
+    bl_label = "Switch Scene"
+    bl_options = {"REGISTER", "UNDO"}
+
+    scene_name: bpy.props.StringProperty(options={'HIDDEN'})
+
+    @classmethod
+    def poll(self, context):
+        return (context is not None and mng.is_valid_object_library())
+
+    @profiler.operator("burg.switch_scene")
+    def execute(self, context):
+        try:
+            mng.synchronize()
+            mng.switch_scene(self.scene_name)
+            workspace_switched(context)
+            return {'FINISHED'}
+        except Exception as e:
+            tb = traceback.format_exc()
+            text = str(f"Could not switch to scene: {self.scene_name}\n{e}\n{tb}")
+            print(text)
+            self.report({'ERROR'}, text)
+            return {'CANCELLED'}
+
+
+class BURG_OT_new_workspace_scene(bpy.types.Operator):
+    """ Adds an empty scene to the current object library, the current scene is kept """
+
+    bl_idname = "burg.new_workspace_scene"
+    bl_label = "New Scene"
+    bl_options = {"REGISTER", "UNDO"}
+
+    @classmethod
+    def poll(self, context):
+        return (context is not None and mng.is_valid_object_library())
+
+    @profiler.operator("burg.new_workspace_scene")
+    def execute(self, context):
+        try:
+            mng.synchronize()
+            mng.new_scene()
+            workspace_switched(context)
+            return {'FINISHED'}
+        except Exception as e:
+            tb = traceback.format_exc()
+            text = str(f"Could not create a new scene.\n{e}\n{tb}")
+            print(text)
+            self.report({'ERROR'}, text)
+            return {'CANCELLED'}
+
+
 # SCENE PANELS
 class BURG_PT_get_started(bpy.types.Panel):
     bl_label = "Get Started..."
@@ -453,6 +884,9 @@ class BURG_PT_get_started(bpy.types.Panel):
             row = layout.row()
             row.operator("burg.load_scene", text="Load Scene")
             row = layout.row()
+            row.operator("burg.load_collection_scene",
+                         text="Load Scene from Collection")
+            row = layout.row()
             row.enabled = False
             row.prop(burg_params, "object_library_file")
         else:
@@ -490,6 +924,84 @@ class BURG_PT_settings(bpy.types.Panel):
         row.prop(burg_params, "lock_transform", text="Restrict Movement")
         row = layout.row()
         row.prop(burg_params, "view_simulation", text="Show Simulation")
+        row = layout.row()
+        row.prop(burg_params, "display_lod", text="Display Detail")
+        row = layout.row()
+        row.prop(burg_params, "live_validation", text="Live Validation")
+        row = layout.row()
+        row.prop(burg_params, "library_warmup", text="Warm Up Library")
+
+        row = layout.row()
+        row.prop(burg_params, "simulation_mode", text="Simulate")
+        row = layout.row()
+        row.prop(burg_params, "simulation_duration", text="Max. Duration")
+        row = layout.row()
+        row.prop(burg_params, "local_simulation", text="Changes Only")
+        if burg_params.simulation_mode == 'CONVERGE':
+            row = layout.row()
+            row.prop(burg_params, "rest_linear_velocity", text="Linear Velocity")
+            row = layout.row()
+            row.prop(burg_params, "rest_angular_velocity", text="Angular Velocity")
+            row = layout.row()
+            row.prop(burg_params, "rest_steps", text="Steps at Rest")
+        last_simulation = utils.SceneManager().last_simulation
+        if last_simulation:
+            steps, converged = last_simulation
+            row = layout.row()
+            row.label(text=f"Last simulation: {steps} steps"
+                      f"{', at rest' if converged else ''}")
+        row = layout.row()
+        row.prop(burg_params, "undo_memory", text="Undo Memory (MB)")
+        row = layout.row()
+        row.prop(burg_params, "workspace_memory", text="Library Memory (MB)")
+
+
+class BURG_PT_performance(bpy.types.Panel):
+    """Rolling summary of recorded timings"""
+
+    bl_label = "Performance"
+    bl_idname = "BURG_PT_performance"
+    bl_space_type = "VIEW_3D"
+    bl_region_type = "UI"
+    bl_category = "BURG-SetupTool"
+    bl_options = {'DEFAULT_CLOSED'}
+
+    # number of slowest stages listed in the panel
+    max_rows = 12
+
+    @classmethod
+    def poll(self, context):
+        return (context is not None and is_burg_available())
+
+    def draw(self, context):
+        layout = self.layout
+        summary = profiler.summary()
+
+        if not summary:
+            row = layout.row()
+            row.label(text="No timings recorded yet.")
+        else:
+            row = layout.row()
+            row.label(text="Stage")
+            row.label(text="Calls")
+            row.label(text="Last (ms)")
+            row.label(text="Mean (ms)")
+            for name, stats in list(summary.items())[:self.max_rows]:
+                row = layout.row()
+                row.label(text=name)
+                row.label(text=f"{stats['count']}")
+                row.label(text=f"{stats['last_s'] * 1000:.1f}")
+                row.label(text=f"{stats['mean_s'] * 1000:.1f}")
+
+        row = layout.row()
+        row.operator("burg.export_timings", text="Export")
+        row.operator("burg.reset_timings", text="Reset")
+        row = layout.row()
+        if profiler.capture_remaining > 0:
+            row.label(
+                text=f"Capturing next {profiler.capture_remaining} operator calls")
+        else:
+            row.operator("burg.capture_profiles", text="Capture Profiles")
 
 
 class BURG_PT_scene(bpy.types.Panel):
@@ -512,6 +1024,23 @@ class BURG_PT_scene(bpy.types.Panel):
         scene = context.scene
         burg_params = scene.burg_params
 
+        library_files = mng.workspace.library_files()
+        if len(library_files) > 1:
+            row = layout.row()
+            row.label(text="Libraries")
+            col = layout.column(align=True)
+            for library_file in sorted(library_files):
+                op = col.operator("burg.switch_library", depress=mng.same_object_library(library_file),
+                                  text=os.path.join(os.path.basename(os.path.dirname(library_file)),
+                                                    os.path.basename(library_file)))
+                op.library_file = library_file
+        row = layout.row(align=True)
+        for scene_name in mng.scene_names():
+            op = row.operator("burg.switch_scene", text=scene_name,
+                              depress=scene_name == mng.scene_name)
+            op.scene_name = scene_name
+        row.operator("burg.new_workspace_scene", text="", icon='ADD')
+
         row = layout.row()
         row.prop(burg_params, "area_size", text='Size')
         row = layout.row()
@@ -519,12 +1048,16 @@ class BURG_PT_scene(bpy.types.Panel):
         row = layout.row()
         row.operator("burg.save_scene", text="Save Scene")
         row = layout.row()
+        row.operator("burg.save_collection_scene", text="Add Scene to Collection")
+        row = layout.row()
         row.operator("burg.save_printout", text='Save Printout')
         row = layout.row()
         row.prop(burg_params, "printout_size", text='Page Size')
         row = layout.row()
         row.prop(burg_params, "printout_margin", text='Margin (mm)')
         row = layout.row()
+        row.prop(burg_params, "printout_vector")
+        row = layout.row()
         row.operator("burg.update_scene", text="Validate & Simulate")
 
 
@@ -562,6 +1095,12 @@ class BURG_PT_object_selection(bpy.types.Panel):
                           "burg_objects", scene, "burg_object_index", rows=5)
         row = layout.row()
         row.operator("burg.add_object", text="Add Object")
+        library_warmup = mng.warmup
+        if library_warmup and not library_warmup.done:
+            row = layout.row()
+            row.label(
+                text=f"Preparing objects {library_warmup.finished}/{library_warmup.total}")
+            row.operator("burg.cancel_warmup", text="", icon='CANCEL')
 
         if obj and mng.has_stable_poses(obj) and obj.select_get():
             row = layout.row()
@@ -584,9 +1123,85 @@ class BURG_PT_object_preview(bpy.types.Panel):
 
         layout = self.layout
         scene = context.scene
-        if scene.burg_objects and scene.burg_object_index >= 0 and burg_object_previews:
+        if scene.burg_objects and scene.burg_object_index >= 0:
             key = scene.burg_objects[scene.burg_object_index]
-            layout.template_icon(burg_object_previews[key.id].icon_id, scale=7)
+            preview = get_object_preview(key.id)
+            if preview:
+                layout.template_icon(preview.icon_id, scale=7)
+
+
+# PERFORMANCE OPERATORS
+class BURG_OT_export_timings(bpy.types.Operator):
+    """ Exports recorded timings to a json or csv file """
+
+    bl_idname = "burg.export_timings"
+    bl_label = "Export Timings"
+    filepath: bpy.props.StringProperty(
+        subtype="FILE_PATH", default="timings.json")
+    filter_glob: bpy.props.StringProperty(name="Filter", default="*.json;*.csv")
+
+    def execute(self, context):
+        try:
+            profiler.export(self.filepath)
+            return {'FINISHED'}
+        except Exception as e:
+            tb = traceback.format_exc()
+            text = f"Could not export timings: {self.filepath}\n{e}\n{tb}"
+            print(text)
+            self.report({'ERROR'}, text)
+            return {'CANCELLED'}
+
+    def invoke(self, context, event):
+        # set filepath with default value of property
+        self.filepath = self.filepath
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+
+class BURG_OT_reset_timings(bpy.types.Operator):
+    """ Clears all recorded timings """
+
+    bl_idname = "burg.reset_timings"
+    bl_label = "Reset Timings"
+
+    def execute(self, context):
+        profiler.reset()
+        utils.tag_redraw(context, space_type='VIEW_3D', region_type='UI')
+        return {'FINISHED'}
+
+
+class BURG_OT_cancel_warmup(bpy.types.Operator):
+    """ Stops preparing the objects of the library """
+
+    bl_idname = "burg.cancel_warmup"
+    bl_label = "Cancel Warm Up"
+
+    def execute(self, context):
+        mng.cancel_warmup()
+        utils.tag_redraw(context, space_type='VIEW_3D', region_type='UI')
+        return {'FINISHED'}
+
+
+class BURG_OT_capture_profiles(bpy.types.Operator):
+    """ Captures cProfile and tracemalloc profiles of the next operator calls """
+
+    bl_idname = "burg.capture_profiles"
+    bl_label = "Capture Profiles"
+    bl_description = "Profiles the next BURG operator calls. Profiles are written " \
+        "next to the scene file, or the blend file if no scene file was used"
+
+    count: bpy.props.IntProperty(
+        name="Operator Calls", default=3, min=1, max=100)
+
+    def execute(self, context):
+        profiler.capture(self.count, capture_dir=mng.profile_dir,
+                         capture_info=mng.profile_info)
+        self.report({'INFO'}, f"Capturing profiles of the next {self.count} operator calls.")
+        utils.tag_redraw(context, space_type='VIEW_3D', region_type='UI')
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        return context.window_manager.invoke_props_dialog(self)
 
 
 # OBJECT BROWSER OPERATORS
@@ -604,6 +1219,7 @@ class BURG_OT_add_object(bpy.types.Operator):
         return (context is not None and mng.is_valid_scene()
                 and is_burg_available())
 
+    @profiler.operator("burg.add_object")
     def execute(self, context):
         scene = context.scene
         burg_params = context.scene.burg_params
@@ -613,33 +1229,200 @@ class BURG_OT_add_object(bpy.types.Operator):
             utils.set_active_and_select(obj)
             bpy.ops.burg.update_scene()
             mng.lock_transform(burg_params.lock_transform)
+            mng.push_snapshot()
             return {'FINISHED'}
         else:
             return {'CANCELLED'}
 
 
 # OBJECT BROWSER PANELS
+# previews of all libraries of the workspace, by mesh cache key, see load_object_previews
 burg_object_previews = None
+MISSING_PREVIEW = "burg_missing_preview"
+# library hash -> (first index, number of items) of its objects in the object list,
+# see object_list_block
+object_list_blocks = {}
+
+
+def object_list_block(scene, library_hash=None):
+    """
+    Position of the objects of a library in the object list. The list holds the objects
+    of all libraries of the workspace one after another, so switching libraries only
+    changes which items are shown. The list is only scanned again after it changed.
+
+    :param scene: The blender scene
+    :param library_hash: Hash of the object library file, defaults to the current library
+    :return: Tuple of the first index and the number of items, None if the library is not listed
+    """
+
+    library_hash = library_hash or mng.object_library_hash
+    items = scene.burg_objects
+    block = object_list_blocks.get(library_hash)
+    if block is not None:
+        start, count = block
+        if (start + count <= len(items) and items[start].library == library_hash
+                and items[start + count - 1].library == library_hash):
+            return block
+    object_list_blocks.clear()
+    start = 0
+    libraries = [item.library for item in items]
+    for i in range(1, len(libraries) + 1):
+        if i == len(libraries) or libraries[i] != libraries[start]:
+            object_list_blocks.setdefault(libraries[start], (start, i - start))
+            start = i
+    return object_list_blocks.get(library_hash)
+
+
+def remove_object_list_block(scene, library_hash):
+    block = object_list_block(scene, library_hash)
+    if block is None:
+        return
+    start, count = block
+    for i in reversed(range(start, start + count)):
+        scene.burg_objects.remove(i)
+    object_list_blocks.clear()
+
+
+def release_library_ui(evicted=()):
+    """
+    Removes the object list items and previews of libraries which are no longer
+    in the workspace, e.g. after they were dropped above its memory cap.
+
+    :param evicted: List of dropped workspace.LibraryEntry, everything of libraries
+                    which are not in the workspace is released
+    """
+
+    scene = bpy.context.scene
+    entries = list(mng.workspace.entries.values())
+    library_hashes = {entry.fields.get("object_library_hash") for entry in entries}
+    library_hashes.add(mng.object_library_hash)
+    if scene:
+        object_list_block(scene)
+        for library_hash in [h for h in object_list_blocks if h not in library_hashes]:
+            remove_object_list_block(scene, library_hash)
+
+    if burg_object_previews:
+        mesh_keys = set(mng.mesh_keys.values())
+        for entry in entries:
+            mesh_keys.update(entry.fields.get("mesh_keys", {}).values())
+        for key in list(burg_object_previews.keys()):
+            if key == MISSING_PREVIEW or key in mesh_keys:
+                continue
+            # previews of object types without mesh key, see type_preview_key
+            if key.split(":", 1)[0] in library_hashes:
+                continue
+            del burg_object_previews[key]
+
+
+def type_preview_key(identifier):
+    """
+    Preview name of an object type whose mesh key is not known yet, unique across libraries.
+    """
+
+    return f"{mng.object_library_hash}:{identifier}"
+
+
+def get_object_preview(identifier):
+    """
+    Preview of an object type of the current library, shared by all object types
+    with the same mesh once the mesh key is known, see load_object_previews.
+    """
+
+    if not burg_object_previews:
+        return None
+    mesh_key = mng.mesh_keys.get(identifier)
+    preview = burg_object_previews.get(mesh_key) if mesh_key else None
+    return (preview or burg_object_previews.get(type_preview_key(identifier))
+            or burg_object_previews.get(MISSING_PREVIEW))
 
 
 class BURG_UL_objects(bpy.types.UIList):
     """
-    List of available objects
+    List of available objects, filtered and sorted with the search index of the library
     """
 
     first_run: bpy.props.BoolProperty(name="first_run", default=True)
+    sort_by: bpy.props.EnumProperty(
+        name="Sort By",
+        items=[('NAME', 'Name', 'Sort by name'),
+               ('SIZE', 'Size', 'Sort by the largest dimension'),
+               ('MASS', 'Mass', 'Sort by mass'),
+               ('STABLE_POSES', 'Stable Poses', 'Sort by the number of stable poses')],
+        default='NAME')
+    filter_min_size: bpy.props.FloatProperty(
+        name="Min. Size", default=0.0, min=0.0, unit='LENGTH',
+        description="Minimum of the largest dimension")
+    filter_max_size: bpy.props.FloatProperty(
+        name="Max. Size", default=0.0, min=0.0, unit='LENGTH',
+        description="Maximum of the largest dimension, 0 for no limit")
+    filter_min_mass: bpy.props.FloatProperty(
+        name="Min. Mass", default=0.0, min=0.0, unit='MASS')
+    filter_max_mass: bpy.props.FloatProperty(
+        name="Max. Mass", default=0.0, min=0.0, unit='MASS',
+        description="Maximum mass, 0 for no limit")
+    filter_min_stable_poses: bpy.props.IntProperty(
+        name="Min. Stable Poses", default=0, min=0)
 
     def draw_item(self, context, layout, data, item, icon, active_data, active_propname, index):
         global burg_object_previews
 
         if self.first_run:
             self.use_filter_show = True
-            self.use_filter_sort_alpha = True
             self.first_run = False
 
-        if item and burg_object_previews:
-            layout.label(text=item.name,
-                         icon_value=burg_object_previews[item.id].icon_id)
+        preview = get_object_preview(item.id) if item else None
+        if preview:
+            layout.label(text=item.name, icon_value=preview.icon_id)
+
+    def draw_filter(self, context, layout):
+        row = layout.row(align=True)
+        row.prop(self, "filter_name", text="")
+        row.prop(self, "use_filter_invert", text="", icon='ARROW_LEFTRIGHT')
+        row = layout.row(align=True)
+        row.prop(self, "sort_by", text="")
+        row.prop(self, "use_filter_sort_reverse", text="", icon='SORT_DESC')
+        col = layout.column(align=True)
+        row = col.row(align=True)
+        row.prop(self, "filter_min_size", text="Size")
+        row.prop(self, "filter_max_size", text="")
+        row = col.row(align=True)
+        row.prop(self, "filter_min_mass", text="Mass")
+        row.prop(self, "filter_max_mass", text="")
+        col.prop(self, "filter_min_stable_poses", text="Stable Poses")
+
+    def filter_items(self, context, data, propname):
+        items = getattr(data, propname)
+        block = object_list_block(context.scene)
+        if block is None:
+            return [], []
+
+        # only the objects of the current library are shown, see update_previews
+        start, count = block
+        flags = [0] * len(items)
+        order = list(range(len(items)))
+        # never read meshes while drawing, the index is prepared on library load or by
+        # the warm up, until then the list is filtered and sorted by name only
+        index = mng.get_search_index(build=False)
+        # the objects of a library are listed in library order
+        if index is None or len(index) != count:
+            helper = bpy.types.UI_UL_list
+            block_items = items[start:start + count]
+            flags[start:start + count] = (
+                helper.filter_items_by_name(self.filter_name, self.bitflag_filter_item,
+                                            block_items, "name")
+                or [self.bitflag_filter_item] * count)
+            if self.sort_by == 'NAME':
+                order[start:start + count] = [
+                    start + i for i in helper.sort_items_by_name(block_items, "name")]
+            return flags, order
+
+        with profiler.stage("object filter"):
+            visible = index.filter(self.filter_name, self.filter_min_size, self.filter_max_size,
+                                   self.filter_min_mass, self.filter_max_mass,
+                                   self.filter_min_stable_poses)
+            flags[start:start + count] = np.where(visible, self.bitflag_filter_item, 0).tolist()
+            order[start:start + count] = (index.order(self.sort_by) + start).tolist()
+        return flags, order
 
 
 # OBJECT BROWSER PROPERTIES
@@ -650,8 +1433,6 @@ def update_burg_object_index(self, context):
 
 
 def update_previews(self, context):
-    global burg_object_previews
-
     scene = context.scene
     try:
         mng = utils.SceneManager()
@@ -659,32 +1440,66 @@ def update_previews(self, context):
         if not mng.is_valid_object_library():
             return
 
-        if burg_object_previews:
-            bpy.utils.previews.remove(burg_object_previews)
-            burg_object_previews = None
+        # the list keeps the objects of all libraries of the workspace, it can hold
+        # thousands of objects, only a library which is not listed yet is added
+        release_library_ui()
+        block = object_list_block(scene)
+        if block is None or block[1] != len(bol):
+            remove_object_list_block(scene, mng.object_library_hash)
+            block = (len(scene.burg_objects), len(bol))
+            for o in mng.object_library:
+                item = scene.burg_objects.add()
+                item.id = o
+                item.name = bol[o].name
+                item.library = mng.object_library_hash
+            object_list_blocks[mng.object_library_hash] = block
+
+        load_object_previews(context)
+        start, count = block
+        if not start <= scene.burg_object_index < start + count:
+            scene.burg_object_index = start
+        start_library_warmup()
+    except Exception as e:
+        print(f"An error occurred creating previews.")
+        print(e)
+
 
-        scene.burg_objects.clear()
+def load_object_previews(context):
+    """
+    Loads the previews of the object list, which is stored in the blend file
+    while previews are not. Previews are kept for all libraries of the workspace,
+    object types with the same mesh share one preview, so only new meshes are loaded.
+    Mesh files are not hashed here, object types whose mesh key is not known yet,
+    see SceneManager.finish_warmup, get a preview of their own.
+    """
 
+    global burg_object_previews
+
+    mng = utils.SceneManager()
+    bol = mng.object_library
+    if burg_object_previews is None:
         burg_object_previews = bpy.utils.previews.new()
+    if MISSING_PREVIEW not in burg_object_previews:
+        resources_folder = utils.get_resources_folder()
+        burg_object_previews.load(
+            MISSING_PREVIEW, os.path.join(resources_folder, 'missing_image.png'), 'IMAGE')
 
-        for o in mng.object_library:
-            item = scene.burg_objects.add()
-            item.id = o
-            item.name = bol[o].name
+    block = object_list_block(context.scene)
+    if block is None:
+        return
+    start, count = block
+    with profiler.stage("previews"):
+        for item in context.scene.burg_objects[start:start + count]:
+            if item.id not in bol:
+                continue
             # add the preview to the collection
-            thumb_file = bol[o].thumbnail_fn
-            if thumb_file and os.path.isfile(thumb_file):
+            object_type = bol[item.id]
+            preview_key = mng.mesh_keys.get(item.id) or type_preview_key(item.id)
+            thumb_file = object_type.thumbnail_fn
+            if (preview_key not in burg_object_previews
+                    and thumb_file and os.path.isfile(thumb_file)):
                 burg_object_previews.load(
-                    item.id, bol[o].thumbnail_fn, 'IMAGE')
-            else:
-                resources_folder = utils.get_resources_folder()
-                burg_object_previews.load(
-                    item.id, os.path.join(resources_folder, 'missing_image.png'), 'IMAGE')
-
-        scene.burg_object_index = 0
-    except Exception as e:
-        print(f"An error occurred creating previews.")
-        print(e)
+                    preview_key, thumb_file, 'IMAGE')
 
 
 def update_stable_poses(self, context):
@@ -697,8 +1512,7 @@ def set_stable_poses(self, value):
         n = len(mng.get_stable_poses(active))
         self["burg_stable_poses"] = (value) % n
 
-    for area in bpy.context.screen.areas:
-        area.tag_redraw()
+    utils.request_redraw(region_types=("UI",))
 
 
 def get_stable_poses(self):
@@ -708,6 +1522,8 @@ def get_stable_poses(self):
 class BURG_PG_object(bpy.types.PropertyGroup):
     id: bpy.props.StringProperty(name="Id")
     name: bpy.props.StringProperty(name="Name")
+    # hash of the object library file, the list holds the objects of all libraries
+    library: bpy.props.StringProperty(name="Library")
 
 
 # SCENE PROPERTIES
@@ -718,7 +1534,9 @@ def update_lock_transform(self, context):
 
 
 def update_area_size(self, context):
-    bpy.context.window.cursor_set("WAIT")
+    # there is no window in background mode
+    if bpy.context.window:
+        bpy.context.window.cursor_set("WAIT")
     burg_params = context.scene.burg_params
     plane = bpy.context.scene.objects["Plane"]
     size = utils.get_size(burg_params.area_size)
@@ -726,7 +1544,8 @@ def update_area_size(self, context):
     plane.location = [size[0]/2, size[1]/2, 0]
     material = plane.active_material
     img = bpy.data.images["layout_empty_printout.png"]
-    np_image = burg.printout.Printout(size).get_image()
+    with profiler.stage("printout render"):
+        np_image = burg.printout.Printout(size).get_image()
     h, w = np_image.shape
     img.scale(w, h)
 
@@ -737,16 +1556,148 @@ def update_area_size(self, context):
     if mng.is_valid_scene():
         mng.set_area_size(burg_params.area_size)
         if mng.check_status():
-            mng.simulate_scene(verbose=burg_params.view_simulation)
+            mng.simulate_scene(verbose=False)
             mng.check_status()
 
     utils.trigger_display_update(burg_params)
-    bpy.context.window.cursor_set("DEFAULT")
+    if bpy.context.window:
+        bpy.context.window.cursor_set("DEFAULT")
 
 
 def update_display_colors(self, context):
     utils.update_display_colors()
 
+
+def update_display_lod(self, context):
+    burg_params = context.scene.burg_params
+    mng.set_display_lod(utils.BLENDER_TO_BURG_LODS[burg_params.display_lod])
+
+
+def update_live_validation(self, context):
+    if context.scene.burg_params.live_validation and mng.is_valid_scene():
+        queue_live_validation(mng.blender_to_burg.keys())
+
+
+# LIVE VALIDATION
+# seconds after the last change, and at most after the first change, until objects are validated
+LIVE_VALIDATION_DELAY = 0.15
+LIVE_VALIDATION_MAX_DELAY = 0.5
+
+live_changed_objects = set()
+live_first_change = 0.0
+live_last_change = 0.0
+
+
+def queue_live_validation(keys):
+    """
+    Schedules validation of changed objects. Objects changed within the delay
+    are validated together, once changes pause or the maximum delay passed.
+
+    :param keys: Names of changed blender objects
+    """
+
+    global live_first_change, live_last_change
+
+    now = time.perf_counter()
+    if not live_changed_objects:
+        live_first_change = now
+    live_last_change = now
+    live_changed_objects.update(keys)
+    if not bpy.app.timers.is_registered(run_live_validation):
+        bpy.app.timers.register(run_live_validation, first_interval=LIVE_VALIDATION_DELAY)
+
+
+def run_live_validation():
+    if not live_changed_objects:
+        return None
+    wait = min(live_last_change + LIVE_VALIDATION_DELAY,
+               live_first_change + LIVE_VALIDATION_MAX_DELAY) - time.perf_counter()
+    if wait > 0:
+        return wait
+
+    keys = set(live_changed_objects)
+    live_changed_objects.clear()
+    try:
+        if bpy.context.scene.burg_params.live_validation and mng.is_valid_scene():
+            with profiler.stage("live validation"):
+                objects = mng.validate_objects(keys)
+                utils.update_display_colors(objects)
+            utils.request_redraw(region_types=("WINDOW",))
+    except Exception as e:
+        print("Error during live validation.")
+        print(e)
+    return None
+
+# seconds between warm up steps and time per step spent on the main thread
+LIBRARY_WARMUP_INTERVAL = 0.05
+LIBRARY_WARMUP_STEP = 0.02
+
+
+def update_library_warmup(self, context):
+    if self.library_warmup:
+        start_library_warmup()
+    else:
+        mng.cancel_warmup()
+        build_search_index()
+
+
+def build_search_index():
+    """
+    Builds the search index of the object list on the main thread, if the warm up
+    does not prepare it because it is disabled, cancelled or failed.
+    """
+
+    try:
+        mng.get_search_index()
+    except Exception as e:
+        print("Could not create the search index of the object library.")
+        print(e)
+    utils.request_redraw(region_types=("UI",))
+
+
+def start_library_warmup():
+    """
+    Prepares all objects of the library in the background, see SceneManager.start_warmup.
+    """
+
+    if not bpy.context.scene.burg_params.library_warmup or not mng.is_valid_object_library():
+        return
+    library_warmup = mng.start_warmup()
+    if not library_warmup.done and not bpy.app.timers.is_registered(run_library_warmup):
+        bpy.app.timers.register(run_library_warmup, first_interval=LIBRARY_WARMUP_INTERVAL)
+
+
+def finish_warmup(identifier, mesh_key, stable_poses):
+    mng.finish_warmup(identifier, mesh_key, stable_poses)
+    preview = get_object_preview(identifier)
+    if preview:
+        # reading the size loads the icon, which blender otherwise defers to the first draw
+        preview.icon_size[:]
+
+
+def run_library_warmup():
+    library_warmup = mng.warmup
+    if library_warmup is None:
+        return None
+    try:
+        with profiler.stage("library warm up"):
+            library_warmup.step(finish_warmup, max_seconds=LIBRARY_WARMUP_STEP)
+    except Exception as e:
+        print("Error during library warm up.")
+        print(e)
+        library_warmup.cancel()
+    if library_warmup.error:
+        print(f"Library warm up failed.\n{library_warmup.error}")
+    utils.request_redraw(region_types=("UI",))
+    if library_warmup.done:
+        # a warm up of a library which is still loaded ended without a search index
+        if (library_warmup.object_library is mng.object_library
+                and library_warmup.search_index is None):
+            build_search_index()
+        return None
+    return LIBRARY_WARMUP_INTERVAL
+
+
 def is_burg_available():
     return "burg_version" in bpy.context.scene
 
@@ -757,8 +1708,8 @@ class BURG_PG_params(bpy.types.PropertyGroup):
         name="#Instances used for Random Scene.", default=1, min=1)
     view_simulation: bpy.props.BoolProperty(
         name="View Simulation", default=False,
-        description="Enables viewing realtime simulation. Do not "
-        "close the window, instead wait until the simulation has finished")
+        description="Shows the objects settle in the viewport while simulating. "
+        "Press Esc to cancel the simulation")
     object_library_file: bpy.props.StringProperty(
         name="Object Library", default="")
     lock_transform: bpy.props.BoolProperty(
@@ -780,13 +1731,67 @@ class BURG_PG_params(bpy.types.PropertyGroup):
         update=update_area_size)
     printout_margin: bpy.props.FloatProperty(
         name="Printout Margin", default=0.0, min=0.0)
+    printout_vector: bpy.props.BoolProperty(
+        name="Vector Printout", default=False,
+        description="Write printouts as vector graphics with the setup tool's own pdf writer "
+        "instead of the burg toolkit printout")
+    display_lod: bpy.props.EnumProperty(
+        name="Display Detail",
+        description="Level of detail of displayed objects. Validation, simulation "
+        "and printouts always use the full resolution",
+        items=[('LOD_FULL', 'Full', 'Full resolution meshes', '', 0),
+               ('LOD_MEDIUM', 'Medium', 'Decimated meshes', '', 1),
+               ('LOD_LOW', 'Low', 'Strongly decimated meshes', '', 2)],
+        default=0,
+        update=update_display_lod)
+    simulation_mode: bpy.props.EnumProperty(
+        name="Simulation Mode",
+        items=[('CONVERGE', 'Until at Rest', 'Stop as soon as all objects are at rest', '', 0),
+               ('FIXED', 'Fixed Duration', 'Always simulate the maximum duration', '', 1)],
+        default=1)
+    simulation_duration: bpy.props.FloatProperty(
+        name="Maximum Duration", default=10.0, min=0.1, unit='TIME_ABSOLUTE',
+        description="Simulated time after which the simulation stops")
+    rest_linear_velocity: bpy.props.FloatProperty(
+        name="Linear Velocity at Rest", default=0.002, min=0.0, precision=4,
+        description="Linear velocity in m/s below which an object is at rest")
+    rest_angular_velocity: bpy.props.FloatProperty(
+        name="Angular Velocity at Rest", default=0.02, min=0.0, precision=4,
+        description="Angular velocity in rad/s below which an object is at rest")
+    rest_steps: bpy.props.IntProperty(
+        name="Steps at Rest", default=48, min=1,
+        description="Number of simulation steps all objects need to stay at rest")
+    local_simulation: bpy.props.BoolProperty(
+        name="Simulate Changes Only", default=True,
+        description="Only simulate objects moved since the last simulation and the "
+        "objects touching them, all other objects stay in place")
+    undo_memory: bpy.props.IntProperty(
+        name="Undo Memory", default=32, min=1, max=1024,
+        description="Memory in MB for scene snapshots, undo and redo restore "
+        "them instead of rebuilding the scene")
+    workspace_memory: bpy.props.IntProperty(
+        name="Library Memory", default=256, min=16, max=16384,
+        description="Memory in MB for object libraries kept loaded with their scenes, meshes "
+        "and collision shapes, so switching between them reads nothing from disk. "
+        "Least recently used libraries are dropped first")
+    live_validation: bpy.props.BoolProperty(
+        name="Live Validation", default=False, update=update_live_validation,
+        description="Checks collisions and bounds of moved objects while transforming them. "
+        "Objects are only simulated on Update")
+    library_warmup: bpy.props.BoolProperty(
+        name="Warm Up Library", default=True, update=update_library_warmup,
+        description="Prepares meshes, collision shapes and previews of all objects in the "
+        "background after a library is loaded, most used objects first, so adding objects is instant")
 
 
 # APP HANDLER
 @persistent
+@profiler.timed("handler load_post")
 def load_handler(scene):
-    # Blender does not allow to store persistent data over several blend files.
-    # Thus removing current scene and starting from scratch is the only way
+    # The scene manager is stored in a text datablock of the blend file, see save_handler.
+    # Without it, or if the object library changed, the scene is rebuilt from scratch
+    if restore_scene_state():
+        return
     sync_handler(scene)
     mng.update_scene_poses()
     mng.check_status()
@@ -794,6 +1799,78 @@ def load_handler(scene):
 
 
 @persistent
+@profiler.timed("handler depsgraph_update_post")
+def live_validation_handler(scene, depsgraph=None):
+    # only collects the moved objects, validation runs in a timer, see queue_live_validation
+    if not scene.get("burg_params") or not scene.burg_params.live_validation:
+        return
+    if not mng.is_valid_scene() or mng.is_simulating():
+        return
+    if depsgraph is None:
+        depsgraph = bpy.context.evaluated_depsgraph_get()
+
+    keys = [update.id.name for update in depsgraph.updates
+            if update.is_updated_transform and isinstance(update.id, bpy.types.Object)
+            and update.id.name in mng.blender_to_burg]
+    if keys:
+        queue_live_validation(keys)
+
+
+@persistent
+@profiler.timed("handler save_pre")
+def save_handler(scene):
+    text = bpy.data.texts.get(utils.SCENE_STATE_TEXT)
+    state = mng.get_state() if bpy.context.scene.get("burg_params") else None
+    if state is None:
+        if text:
+            bpy.data.texts.remove(text)
+        return
+
+    if not text:
+        text = bpy.data.texts.new(utils.SCENE_STATE_TEXT)
+    text.from_string(json.dumps(state))
+
+
+def restore_scene_state():
+    """
+    Restores the scene manager from the state stored by save_handler.
+
+    :return: True if the state was restored
+    """
+
+    text = bpy.data.texts.get(utils.SCENE_STATE_TEXT)
+    burg_params = bpy.context.scene.burg_params if bpy.context.scene.get("burg_params") else None
+    if not text or not burg_params:
+        return False
+
+    try:
+        state = json.loads(text.as_string())
+        if state.get("object_library_file") != burg_params.object_library_file:
+            return False
+        if not mng.restore_state(state):
+            return False
+
+        block = object_list_block(bpy.context.scene)
+        if block is not None and block[1] == len(mng.object_library):
+            load_object_previews(bpy.context)
+            start_library_warmup()
+        else:
+            update_previews(None, bpy.context)
+        # objects added or removed outside of the scene manager
+        mng.synchronize()
+        if not mng.is_validated():
+            mng.update_scene_poses()
+            mng.check_status()
+        utils.update_display_colors()
+        return True
+    except Exception as e:
+        print("Could not restore the burg scene state, rebuilding the scene.")
+        print(e)
+        return False
+
+
+@persistent
+@profiler.timed("handler undo/redo")
 def sync_handler(scene):
     global burg_object_previews
 
@@ -801,11 +1878,15 @@ def sync_handler(scene):
     if not bpy.context.scene or not bpy.context.scene.get("burg_params"):
        # starting fresh
         if mng.is_valid_scene():
+            mng.cancel_warmup()
             mng.scene.objects.clear()
             mng.scene = None
             mng.object_library = None
             mng.object_library_file = None
             mng.blender_to_burg.clear()
+            mng.settled_poses.clear()
+            mng.snapshots.clear()
+            mng.clear_workspace()
             if burg_object_previews:
                 bpy.utils.previews.remove(burg_object_previews)
                 burg_object_previews = None
@@ -813,6 +1894,14 @@ def sync_handler(scene):
                 burg_objects.clear()
         return
 
+    # undo and redo steps of burg operators restore their snapshot, nothing is read from disk
+    library_file = mng.object_library_file
+    if mng.restore_snapshot(bpy.context.scene.get("burg_snapshot_id")):
+        if mng.object_library_file != library_file:
+            update_previews(None, bpy.context)
+        mng.synchronize()
+        return
+
     current_library_file = bpy.context.scene.burg_params.object_library_file
     mng_library_file = None
     if mng.object_library:
@@ -841,10 +1930,12 @@ def sync_handler(scene):
             if bpy.context.scene.burg_objects:
                 burg_objects.clear()
         else:
-            for area in bpy.context.screen.areas:
-                area.tag_redraw()
+            utils.request_redraw()
 
     mng.synchronize()
+    # undo and redo may move any object without reporting it as transform update
+    if bpy.context.scene.burg_params.live_validation:
+        queue_live_validation(mng.blender_to_burg.keys())
 
 
 classes = (
@@ -853,14 +1944,21 @@ classes = (
     BURG_PT_object_selection,
     BURG_PT_object_preview,
     BURG_PT_settings,
+    BURG_PT_performance,
 
     BURG_OT_update_scene,
+    BURG_OT_simulate_scene,
     BURG_OT_empty_scene,
     BURG_OT_save_scene,
     BURG_OT_load_scene,
+    BURG_OT_load_collection_scene,
+    BURG_OT_save_collection_scene,
     BURG_OT_random_scene,
     BURG_OT_load_object_library,
     BURG_OT_save_printout,
+    BURG_OT_switch_library,
+    BURG_OT_switch_scene,
+    BURG_OT_new_workspace_scene,
 
     BURG_PG_params,
     BURG_OT_add_object,
@@ -868,6 +1966,10 @@ classes = (
     BURG_PG_object,
     BURG_OT_library_completion,
     BURG_OT_library_completion_confirm,
+    BURG_OT_export_timings,
+    BURG_OT_reset_timings,
+    BURG_OT_capture_profiles,
+    BURG_OT_cancel_warmup,
 )
 
 # KEYMAPS
@@ -920,12 +2022,15 @@ def register():
     bpy.app.handlers.undo_post.append(sync_handler)
     bpy.app.handlers.redo_post.append(sync_handler)
     bpy.app.handlers.load_post.append(load_handler)
+    bpy.app.handlers.save_pre.append(save_handler)
+    bpy.app.handlers.depsgraph_update_post.append(live_validation_handler)
 
     add_keymap()
+    mng.eviction_callback = release_library_ui
 
 
 def unregister():
-    global burg_object_previews
+    global burg_object_previews, io_worker
 
     for km, kmi in addon_keymaps:
         km.keymap_items.remove(kmi)
@@ -946,6 +2051,21 @@ def unregister():
     bpy.app.handlers.undo_post.remove(sync_handler)
     bpy.app.handlers.redo_post.remove(sync_handler)
     bpy.app.handlers.load_post.remove(load_handler)
+    bpy.app.handlers.save_pre.remove(save_handler)
+    bpy.app.handlers.depsgraph_update_post.remove(live_validation_handler)
+    if bpy.app.timers.is_registered(run_live_validation):
+        bpy.app.timers.unregister(run_live_validation)
+    if bpy.app.timers.is_registered(run_library_warmup):
+        bpy.app.timers.unregister(run_library_warmup)
+    mng.cancel_warmup()
+    mng.reset_collision_world()
+
+    if bpy.app.timers.is_registered(utils.flush_redraws):
+        bpy.app.timers.unregister(utils.flush_redraws)
+
+    if io_worker:
+        io_worker.shutdown()
+        io_worker = None
 
 
 if __name__ == "__main__":
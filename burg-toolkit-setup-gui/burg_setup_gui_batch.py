@@ -0,0 +1,251 @@
+import argparse
+import hashlib
+import json
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import burg_toolkit as burg
+import burg_setup_gui_cache as cache
+import burg_setup_gui_io as io
+import burg_setup_gui_printout as printout
+
+
+PAGE_SIZES = {"A2": burg.constants.SIZE_A2,
+              "A3": burg.constants.SIZE_A3,
+              "A4": burg.constants.SIZE_A4}
+
+MANIFEST_FILE = "printout_manifest.json"
+MANIFEST_VERSION = 3
+
+# (object library file, resolution) -> FootprintCache, kept per worker process
+footprint_caches = {}
+
+
+def file_hash(filename, chunk_size=1 << 20):
+    """
+    Computes the sha1 hash of a file.
+
+    :param filename: Path to the file
+    :param chunk_size: Number of bytes read at once
+    :return: Hex digest of the file content
+    """
+
+    sha1 = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def collect_scene_files(paths):
+    """
+    Collects scene yaml files from a list of files and directories.
+
+    :param paths: List of scene files or directories containing scene files
+    :return: Sorted list of absolute scene file paths
+    """
+
+    scene_files = set()
+    for path in paths:
+        if os.path.isdir(path):
+            for name in os.listdir(path):
+                if name.endswith('.yaml') or name.endswith('.yml'):
+                    scene_files.add(os.path.abspath(os.path.join(path, name)))
+        elif os.path.isfile(path):
+            scene_files.add(os.path.abspath(path))
+        else:
+            print(f"Skipping {path}, no such file or directory.")
+    return sorted(scene_files)
+
+
+def load_manifest(output_dir):
+    manifest_file = os.path.join(output_dir, MANIFEST_FILE)
+    if os.path.isfile(manifest_file):
+        try:
+            with open(manifest_file, 'r') as f:
+                manifest = json.load(f)
+            if manifest.get("version") == MANIFEST_VERSION:
+                return manifest
+        except (OSError, ValueError) as e:
+            print(f"Could not read manifest {manifest_file}, rebuilding it.")
+            print(e)
+    return {"version": MANIFEST_VERSION, "scenes": {}}
+
+
+def save_manifest(output_dir, manifest):
+    # write to a temporary file first, so an interrupted run never leaves a broken manifest
+    manifest_file = os.path.join(output_dir, MANIFEST_FILE)
+    tmp_file = manifest_file + ".tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_file, manifest_file)
+
+
+def output_name(scene_file):
+    """
+    Base name of the pdf files of a scene. A short hash of the scene path keeps
+    scenes of the same name in different directories apart.
+
+    :param scene_file: Absolute path to a scene yaml file
+    """
+
+    name = os.path.splitext(os.path.basename(scene_file))[0]
+    path_hash = hashlib.sha1(os.path.abspath(scene_file).encode()).hexdigest()[:8]
+    return f"{name}_{path_hash}"
+
+
+def is_up_to_date(entry, scene_hash, page_sizes, margin_mm, vector=False):
+    """
+    Checks if the manifest entry of a scene still matches its inputs and outputs.
+    """
+
+    if not entry or entry.get("error"):
+        return False
+    if (entry.get("scene_sha1") != scene_hash or entry.get("margin_mm") != margin_mm
+            or entry.get("vector", False) != vector):
+        return False
+
+    library_file = entry.get("library_file")
+    if not library_file or not os.path.isfile(library_file):
+        return False
+    if file_hash(library_file) != entry.get("library_sha1"):
+        return False
+
+    outputs = {o["page_size"]: o for o in entry.get("outputs", [])}
+    for page_size in page_sizes:
+        output = outputs.get(page_size)
+        if not output or not os.path.isfile(output["file"]):
+            return False
+        if file_hash(output["file"]) != output["sha1"]:
+            return False
+    return True
+
+
+def export_scene_printouts(scene_file, output_dir, page_sizes, margin_mm=0.0, vector=False):
+    """
+    Exports printouts of one scene for several page sizes.
+    The scene is loaded and rendered into a single printout, which is then
+    reused for every page size (and the page splits each size implies).
+
+    :param scene_file: Path to a scene yaml file
+    :param output_dir: Directory the pdf files are written to
+    :param page_sizes: List of page size names, see PAGE_SIZES
+    :param margin_mm: Printout margin in mm
+    :param vector: Use the vector printout of the setup tool instead of the burg toolkit printout
+    :return: Manifest entry of the scene
+    """
+
+    entry = {"scene_sha1": file_hash(scene_file),
+             "margin_mm": margin_mm,
+             "vector": vector,
+             "outputs": []}
+    try:
+        scene, library, _ = burg.Scene.from_yaml(scene_file)
+        entry["library_file"] = os.path.abspath(library.filename)
+        entry["library_sha1"] = file_hash(library.filename)
+
+        if vector:
+            px_per_m = printout.FastPrintout.resolution(scene.ground_area)
+            key = (entry["library_file"], px_per_m)
+            if key not in footprint_caches:
+                mesh_cache = cache.MeshCache.for_library(library.filename)
+                footprint_caches[key] = printout.FootprintCache(mesh_cache.get_arrays, px_per_m)
+            scene_printout = printout.FastPrintout(scene.ground_area, footprint_caches[key])
+        else:
+            scene_printout = burg.printout.Printout(size=scene.ground_area)
+        scene_printout.add_scene(scene)
+
+        name = output_name(scene_file)
+        for page_size in page_sizes:
+            pdf_file = os.path.join(output_dir, f"{name}_{page_size}.pdf")
+            # written to a temporary file first, so the manifest never hashes a half written pdf
+            io.atomic_write(pdf_file, scene_printout.save_pdf,
+                            page_size=PAGE_SIZES[page_size], margin_mm=margin_mm)
+            entry["outputs"].append({"page_size": page_size,
+                                     "file": pdf_file,
+                                     "sha1": file_hash(pdf_file)})
+    except Exception as e:
+        entry["error"] = f"{e}\n{traceback.format_exc()}"
+    return entry
+
+
+def export_printouts(paths, output_dir, page_sizes=("A2", "A3", "A4"),
+                     margin_mm=0.0, processes=None, force=False, vector=False):
+    """
+    Exports printouts for many scenes in parallel.
+    A manifest with hashes of all inputs and outputs is kept in the output
+    directory. Scenes whose scene file, object library and outputs did not
+    change since the last run are skipped.
+
+    :param paths: List of scene files or directories containing scene files
+    :param output_dir: Directory the pdf files and manifest are written to
+    :param page_sizes: List of page size names, see PAGE_SIZES
+    :param margin_mm: Printout margin in mm
+    :param processes: Number of worker processes, defaults to the number of cpus
+    :param force: Export all scenes, even if they are up to date
+    :param vector: Use the vector printout of the setup tool instead of the burg toolkit printout
+    :return: The updated manifest
+    """
+
+    for page_size in page_sizes:
+        if page_size not in PAGE_SIZES:
+            raise ValueError(
+                f"Unknown page size {page_size}, use one of {list(PAGE_SIZES)}.")
+
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = load_manifest(output_dir)
+    scenes = manifest["scenes"]
+
+    pending = []
+    for scene_file in collect_scene_files(paths):
+        if not force and is_up_to_date(scenes.get(scene_file), file_hash(scene_file),
+                                       page_sizes, margin_mm, vector):
+            continue
+        pending.append(scene_file)
+
+    print(f"Exporting printouts for {len(pending)} scenes "
+          f"({len(scenes)} in manifest).")
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = {executor.submit(export_scene_printouts, scene_file, output_dir,
+                                   list(page_sizes), margin_mm, vector): scene_file
+                   for scene_file in pending}
+        for future in as_completed(futures):
+            scene_file = futures[future]
+            entry = future.result()
+            scenes[scene_file] = entry
+            if entry.get("error"):
+                print(f"Could not export printout for scene: {scene_file}")
+                print(entry["error"])
+            save_manifest(output_dir, manifest)
+
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Exports printouts for many BURG scene files.")
+    parser.add_argument("paths", nargs="+",
+                        help="scene yaml files or directories containing them")
+    parser.add_argument("-o", "--output-dir", required=True,
+                        help="directory for pdf files and manifest")
+    parser.add_argument("-s", "--page-sizes", nargs="+", default=["A2", "A3", "A4"],
+                        choices=list(PAGE_SIZES), help="page sizes to export")
+    parser.add_argument("-m", "--margin", type=float, default=0.0,
+                        help="printout margin in mm")
+    parser.add_argument("-j", "--processes", type=int, default=None,
+                        help="number of worker processes")
+    parser.add_argument("-f", "--force", action="store_true",
+                        help="export all scenes, even unchanged ones")
+    parser.add_argument("--vector", action="store_true",
+                        help="write vector pdf files with the setup tool's own pdf writer")
+    args = parser.parse_args()
+
+    export_printouts(args.paths, args.output_dir, page_sizes=args.page_sizes,
+                     margin_mm=args.margin, processes=args.processes,
+                     force=args.force, vector=args.vector)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+import open3d as o3d
+
+import burg_setup_gui_io as io
+
+
+MESH_CACHE_DIR = "mesh_cache"
+MESH_CACHE_INDEX = "index.json"
+
+# fraction of triangles kept for each display level of detail
+DISPLAY_LODS = {1: 0.2, 2: 0.05}
+MIN_LOD_TRIANGLES = 500
+
+
+def file_hash(filename, chunk_size=1 << 20):
+    sha1 = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def decimate(vertices, triangles, ratio):
+    """
+    Reduces the number of triangles of a mesh using quadric decimation.
+
+    :param vertices: (V, 3) array of vertices
+    :param triangles: (T, 3) array of vertex indices
+    :param ratio: Fraction of triangles to keep
+    :return: Tuple of decimated vertices and triangles
+    """
+
+    target = max(MIN_LOD_TRIANGLES, int(len(triangles) * ratio))
+    if target >= len(triangles):
+        return vertices, triangles
+    mesh = to_o3d_mesh(vertices, triangles).simplify_quadric_decimation(
+        target_number_of_triangles=target)
+    mesh.remove_unreferenced_vertices()
+    return np.asarray(mesh.vertices), np.asarray(mesh.triangles)
+
+
+def to_o3d_mesh(vertices, triangles):
+    """
+    Creates an open3d mesh from vertex and triangle arrays.
+    """
+
+    return o3d.geometry.TriangleMesh(
+        o3d.utility.Vector3dVector(np.asarray(vertices, dtype=np.float64)),
+        o3d.utility.Vector3iVector(np.asarray(triangles, dtype=np.int32)))
+
+
+class MeshCache(object):
+    """
+    Binary cache for the meshes of an object library.
+
+    Vertices and triangles of every mesh are stored as .npy files, named by
+    the sha1 hash of the source mesh file. Reading a cached mesh is a memory
+    mapped read instead of parsing the mesh file. Size and modification time
+    of each source file are recorded, so source files are only hashed again
+    after they changed. Meshes may be read from several threads, the lock is
+    only held for index lookups and updates, so a thread parsing or decimating
+    a large mesh does not block threads reading other meshes.
+
+    The directory is only created on the first write. If it cannot be written,
+    e.g. for a library on a read-only share, meshes missing from the cache are
+    read from their source files each time instead.
+    """
+
+    def __init__(self, cache_dir):
+        """
+        :param cache_dir: Directory of the cache, created on the first write
+        """
+
+        self.cache_dir = cache_dir
+        # cleared after a failed write, nothing is written afterwards
+        self.writable = True
+        self._index_file = os.path.join(cache_dir, MESH_CACHE_INDEX)
+        self._index = {}
+        self._index_changed = False
+        self._lock = threading.RLock()
+        # (key, lod) -> Event set once the thread creating these arrays is done
+        self._pending = {}
+        if os.path.isfile(self._index_file):
+            try:
+                with open(self._index_file, 'r') as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Could not read mesh cache index {self._index_file}, rebuilding it.")
+                print(e)
+
+    @classmethod
+    def for_library(cls, object_library_file):
+        """
+        Opens the cache stored next to an object library file.
+
+        :param object_library_file: Path to the object library yaml file
+        """
+
+        return cls(os.path.join(os.path.dirname(os.path.abspath(object_library_file)),
+                                MESH_CACHE_DIR))
+
+    def key(self, mesh_fn):
+        """
+        Returns the cache key, the sha1 hash of the mesh file content.
+
+        :param mesh_fn: Path to the source mesh file
+        """
+
+        mesh_fn = os.path.abspath(mesh_fn)
+        stat = os.stat(mesh_fn)
+        with self._lock:
+            entry = self._index.get(mesh_fn)
+            if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime_ns:
+                return entry["sha1"]
+
+        sha1 = file_hash(mesh_fn)
+        with self._lock:
+            self._index[mesh_fn] = {"size": stat.st_size,
+                                    "mtime": stat.st_mtime_ns,
+                                    "sha1": sha1}
+            self._index_changed = True
+        return sha1
+
+    def _filenames(self, key, lod=0):
+        prefix = os.path.join(self.cache_dir, key if lod == 0 else f"{key}.lod{lod}")
+        return prefix + ".vertices.npy", prefix + ".triangles.npy"
+
+    def contains(self, key, lod=0):
+        return all(os.path.isfile(f) for f in self._filenames(key, lod))
+
+    def load(self, key, lod=0):
+        """
+        Reads cached arrays as memory maps.
+
+        :param key: Cache key of the mesh
+        :param lod: Level of detail, 0 is the full resolution mesh
+        :return: Tuple of (V, 3) float64 vertices and (T, 3) int32 triangles
+        """
+
+        vertices_fn, triangles_fn = self._filenames(key, lod)
+        return np.load(vertices_fn, mmap_mode='r'), np.load(triangles_fn, mmap_mode='r')
+
+    def make_dir(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def disable_writes(self, error):
+        if self.writable:
+            print(f"Could not write mesh cache {self.cache_dir}, reading meshes without it.")
+            print(error)
+        self.writable = False
+
+    def store(self, key, vertices, triangles, lod=0):
+        self.make_dir()
+        # write to uniquely named temporary files first, so readers never see half written
+        # arrays and processes sharing the cache directory do not write to the same file
+        for filename, array in zip(self._filenames(key, lod),
+                                   (np.asarray(vertices, dtype=np.float64),
+                                    np.asarray(triangles, dtype=np.int32))):
+            io.atomic_write(filename, np.save, array)
+
+    def get_arrays(self, object_type, lod=0):
+        """
+        Returns the mesh arrays of an object type, caching them on first use.
+
+        :param object_type: A burg ObjectType
+        :param lod: Level of detail, 0 is the full resolution mesh
+        :return: Tuple of (V, 3) float64 vertices and (T, 3) int32 triangles
+        """
+
+        key = self.key(object_type.mesh_fn)
+        while True:
+            with self._lock:
+                if self.contains(key, lod):
+                    break
+                pending = self._pending.get((key, lod))
+                creating = pending is None
+                if creating:
+                    pending = self._pending[(key, lod)] = threading.Event()
+            if not creating:
+                # another thread creates the same arrays, they are read once it is done,
+                # or created here if it failed
+                pending.wait()
+                continue
+
+            try:
+                if lod != 0:
+                    vertices, triangles = decimate(*self.get_arrays(object_type),
+                                                   DISPLAY_LODS[lod])
+                else:
+                    mesh = object_type.mesh
+                    vertices, triangles = np.asarray(mesh.vertices), np.asarray(mesh.triangles)
+                if not self.writable:
+                    return vertices, triangles
+                try:
+                    self.store(key, vertices, triangles, lod)
+                except OSError as e:
+                    self.disable_writes(e)
+                    return vertices, triangles
+            finally:
+                with self._lock:
+                    del self._pending[(key, lod)]
+                pending.set()
+            break
+        self.save_index()
+        return self.load(key, lod)
+
+    def get_mesh(self, object_type):
+        """
+        Returns an open3d mesh of an object type, read from the cache.
+
+        :param object_type: A burg ObjectType
+        """
+
+        return to_o3d_mesh(*self.get_arrays(object_type))
+
+    def build(self, object_library, lods=True):
+        """
+        Makes sure all meshes of a library are cached.
+
+        :param object_library: A burg ObjectLibrary
+        :param lods: Also create the display levels of detail
+        """
+
+        for identifier in object_library:
+            object_type = object_library[identifier]
+            self.get_arrays(object_type)
+            if lods:
+                for lod in DISPLAY_LODS:
+                    self.get_arrays(object_type, lod)
+
+    def _write_index(self, filename):
+        with open(filename, 'w') as f:
+            json.dump(self._index, f)
+
+    def save_index(self):
+        with self._lock:
+            if not self._index_changed or not self.writable:
+                return
+            try:
+                self.make_dir()
+                io.atomic_write(self._index_file, self._write_index)
+            except OSError as e:
+                self.disable_writes(e)
+                return
+            self._index_changed = False
@@ -0,0 +1,442 @@
+import argparse
+import json
+import os
+
+import numpy as np
+
+import burg_toolkit as burg
+import burg_setup_gui_io as io
+
+
+COLLECTION_FILE_TYPE = "SceneCollection"
+COLLECTION_FILE_VERSION = "1.0"
+
+
+def scene_to_record(scene):
+    """
+    Converts a burg scene to a json serializable record.
+
+    :param scene: A burg Scene
+    :return: Dictionary with ground area and object instances
+    """
+
+    return {"ground_area": [float(v) for v in scene.ground_area],
+            "objects": [{"identifier": instance.object_type.identifier,
+                         "pose": np.asarray(instance.pose, dtype=np.float64).ravel().tolist()}
+                        for instance in scene.objects]}
+
+
+def record_to_scene(record, object_library):
+    """
+    Creates a burg scene from a collection record.
+
+    :param record: Dictionary as created by scene_to_record
+    :param object_library: The burg ObjectLibrary the record refers to
+    :return: A burg Scene
+    """
+
+    scene = burg.core.Scene(ground_area=tuple(record["ground_area"]))
+    for item in record["objects"]:
+        pose = np.asarray(item["pose"], dtype=np.float64).reshape(4, 4)
+        scene.objects.append(burg.ObjectInstance(
+            object_library[item["identifier"]], pose=pose))
+    scene.object_library = object_library
+    return scene
+
+
+def index_filename(collection_file):
+    return collection_file + ".idx.npy"
+
+
+class SceneCollectionWriter(object):
+    """
+    Streams scenes into a scene collection file.
+
+    A scene collection is a JSON Lines file. The first line is a header
+    referencing the object library shared by all scenes, every following line
+    holds one scene. Byte offsets of all scenes are kept in an index file next
+    to the collection for random access.
+    """
+
+    def __init__(self, filename, object_library_file=None, append=False):
+        """
+        :param filename: Path to the collection file
+        :param object_library_file: Path to the object library yaml file, required for new collections
+        :param append: Append to an existing collection instead of overwriting it
+        """
+
+        self.filename = filename
+        self.offsets = []
+
+        if append and os.path.isfile(filename):
+            with SceneCollectionReader(filename) as reader:
+                self.object_library_file = reader.object_library_file
+                self.offsets = list(reader.offsets)
+            if object_library_file and not os.path.samefile(object_library_file,
+                                                             self.object_library_file):
+                raise ValueError(
+                    f"Collection {filename} uses object library {self.object_library_file}.")
+            self._file = open(filename, 'ab')
+        else:
+            if not object_library_file:
+                raise ValueError("A new scene collection needs an object library file.")
+            self.object_library_file = os.path.abspath(object_library_file)
+            self._file = open(filename, 'wb')
+            header = {"yaml_file_type": COLLECTION_FILE_TYPE,
+                      "yaml_file_version": COLLECTION_FILE_VERSION,
+                      "object_library_fn": os.path.relpath(
+                          self.object_library_file,
+                          os.path.dirname(os.path.abspath(filename)))}
+            self._write_line(header)
+
+    def _write_line(self, data):
+        line = json.dumps(data, separators=(',', ':')).encode('utf-8') + b'\n'
+        self._file.write(line)
+
+    def write(self, scene):
+        """
+        Appends a scene to the collection.
+
+        :param scene: A burg Scene, its objects must belong to the collection's object library
+        :return: Index of the scene within the collection
+        """
+
+        self.offsets.append(self._file.tell())
+        self._write_line(scene_to_record(scene))
+        return len(self.offsets) - 1
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+            np.save(index_filename(self.filename),
+                    np.asarray(self.offsets + [os.path.getsize(self.filename)], dtype=np.int64))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class SceneCollectionReader(object):
+    """
+    Streaming and random access reader for scene collection files.
+    """
+
+    def __init__(self, filename):
+        """
+        :param filename: Path to the collection file
+        """
+
+        self.filename = filename
+        self._file = open(filename, 'rb')
+        header = json.loads(self._file.readline())
+        if header.get("yaml_file_type") != COLLECTION_FILE_TYPE:
+            self._file.close()
+            raise ValueError(f"{filename} is not a scene collection file.")
+        self.header = header
+        self._data_start = self._file.tell()
+        self.object_library_file = os.path.normpath(os.path.join(
+            os.path.dirname(os.path.abspath(filename)), header["object_library_fn"]))
+        self.offsets = self._load_offsets()
+        self._pose_store = False
+
+    def _load_offsets(self):
+        # the index stores the file size as last entry, it is only valid for an unchanged collection
+        size = os.path.getsize(self.filename)
+        idx_file = index_filename(self.filename)
+        if os.path.isfile(idx_file):
+            offsets = np.load(idx_file)
+            if len(offsets) and offsets[-1] == size:
+                return offsets[:-1]
+
+        # no valid index, a single sequential pass recovers the offsets
+        offsets = []
+        self._file.seek(self._data_start)
+        position = self._data_start
+        for line in self._file:
+            if line.strip():
+                offsets.append(position)
+            position += len(line)
+        return np.asarray(offsets, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, index):
+        """
+        Reads the record of a single scene.
+
+        :param index: Index of the scene within the collection
+        :return: Scene record, see scene_to_record
+        """
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"Scene index {index} out of range for collection "
+                             f"{self.filename} with {len(self)} scenes.")
+        self._file.seek(int(self.offsets[index]))
+        return json.loads(self._file.readline())
+
+    def __iter__(self):
+        # sequential read, no seeking between records
+        self._file.seek(self._data_start)
+        for line in self._file:
+            if line.strip():
+                yield json.loads(line)
+
+    def read_scene(self, index, object_library):
+        """
+        Reads a single scene.
+
+        :param index: Index of the scene within the collection
+        :param object_library: The burg ObjectLibrary of this collection
+        :return: A burg Scene
+        """
+
+        store = self.pose_store()
+        if store:
+            return store.read_scene(index, object_library)
+        return record_to_scene(self[index], object_library)
+
+    def pose_store(self):
+        """
+        Returns the binary pose store of this collection, if it is up to date.
+        """
+
+        if self._pose_store is False:
+            self._pose_store = PoseStore.open(self.filename)
+        return self._pose_store
+
+    def scenes(self, object_library):
+        """
+        Generator over all scenes of the collection.
+
+        :param object_library: The burg ObjectLibrary of this collection
+        """
+
+        for record in self:
+            yield record_to_scene(record, object_library)
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def pose_store_filenames(collection_file):
+    return {"meta": collection_file + ".poses.json",
+            "poses": collection_file + ".poses.npy",
+            "types": collection_file + ".types.npy",
+            "scenes": collection_file + ".scenes.npy",
+            "ground_areas": collection_file + ".ground.npy"}
+
+
+class PoseStore(object):
+    """
+    Binary sidecar of a scene collection holding all instance poses.
+
+    Poses of all scenes are stored as one contiguous (M, 4, 4) float64 array,
+    together with an (M,) array of object type indices and (S + 1,) scene
+    offsets into both. The arrays are opened as memory maps, so browsing
+    scenes does not parse or copy anything. The collection file stays the
+    human-readable source of truth, the store is only used while size and
+    modification time of the collection match the ones it was built from.
+    """
+
+    def __init__(self, collection_file):
+        """
+        :param collection_file: Path to the collection file the store belongs to
+        """
+
+        files = pose_store_filenames(collection_file)
+        with open(files["meta"], 'r') as f:
+            meta = json.load(f)
+        self.collection_file = collection_file
+        self.identifiers = meta["identifiers"]
+        self.collection_size = meta["collection_size"]
+        # stores written before the modification time was recorded never match
+        self.collection_mtime = meta.get("collection_mtime")
+        self.poses = np.load(files["poses"], mmap_mode='r')
+        self.types = np.load(files["types"], mmap_mode='r')
+        self.scene_offsets = np.load(files["scenes"], mmap_mode='r')
+        self.ground_areas = np.load(files["ground_areas"], mmap_mode='r')
+
+    @classmethod
+    def open(cls, collection_file):
+        """
+        Opens the pose store of a collection.
+
+        :param collection_file: Path to the collection file
+        :return: The PoseStore or None if there is no store matching the collection
+        """
+
+        files = pose_store_filenames(collection_file)
+        if not all(os.path.isfile(f) for f in files.values()):
+            return None
+        try:
+            store = cls(collection_file)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Could not open pose store of collection: {collection_file}")
+            print(e)
+            return None
+        stat = os.stat(collection_file)
+        if (store.collection_size != stat.st_size
+                or store.collection_mtime != stat.st_mtime_ns):
+            return None
+        return store
+
+    def __len__(self):
+        return len(self.scene_offsets) - 1
+
+    def scene_arrays(self, index):
+        """
+        Zero-copy access to the arrays of a single scene.
+
+        :param index: Index of the scene within the collection
+        :return: Tuple of (N, 4, 4) poses, (N,) type indices and ground area
+        """
+
+        start, end = self.scene_offsets[index], self.scene_offsets[index + 1]
+        return self.poses[start:end], self.types[start:end], self.ground_areas[index]
+
+    def read_scene(self, index, object_library):
+        """
+        Creates a burg scene from the store.
+
+        :param index: Index of the scene within the collection
+        :param object_library: The burg ObjectLibrary of this collection
+        :return: A burg Scene
+        """
+
+        poses, types, ground_area = self.scene_arrays(index)
+        scene = burg.core.Scene(ground_area=tuple(float(v) for v in ground_area))
+        for pose, type_index in zip(poses, types):
+            # instances own their pose, since it is edited in place
+            scene.objects.append(burg.ObjectInstance(
+                object_library[self.identifiers[type_index]], pose=np.array(pose)))
+        scene.object_library = object_library
+        return scene
+
+
+def build_pose_store(collection_file):
+    """
+    Creates or replaces the pose store of a collection.
+    The collection is read sequentially once, poses are written into memory
+    mapped arrays without holding the whole dataset in memory.
+
+    :param collection_file: Path to the collection file
+    :return: The opened PoseStore
+    """
+
+    files = pose_store_filenames(collection_file)
+    # taken before reading, so changes while building make the store outdated
+    stat = os.stat(collection_file)
+    with SceneCollectionReader(collection_file) as reader:
+        # first pass only counts, so the arrays can be allocated on disk
+        n_scenes = len(reader)
+        identifiers = {}
+        n_instances = 0
+        for record in reader:
+            n_instances += len(record["objects"])
+            for item in record["objects"]:
+                identifiers.setdefault(item["identifier"], len(identifiers))
+
+        # the arrays are rewritten in place, without the meta file a store
+        # interrupted while building is never opened
+        if os.path.exists(files["meta"]):
+            os.remove(files["meta"])
+        poses = np.lib.format.open_memmap(
+            files["poses"], mode='w+', dtype=np.float64, shape=(n_instances, 4, 4))
+        types = np.lib.format.open_memmap(
+            files["types"], mode='w+', dtype=np.int32, shape=(n_instances,))
+        scene_offsets = np.lib.format.open_memmap(
+            files["scenes"], mode='w+', dtype=np.int64, shape=(n_scenes + 1,))
+        ground_areas = np.lib.format.open_memmap(
+            files["ground_areas"], mode='w+', dtype=np.float64, shape=(n_scenes, 2))
+
+        i = 0
+        scene_offsets[0] = 0
+        for s, record in enumerate(reader):
+            for item in record["objects"]:
+                poses[i] = np.asarray(item["pose"], dtype=np.float64).reshape(4, 4)
+                types[i] = identifiers[item["identifier"]]
+                i += 1
+            scene_offsets[s + 1] = i
+            ground_areas[s] = record["ground_area"]
+
+        for array in (poses, types, scene_offsets, ground_areas):
+            array.flush()
+        del poses, types, scene_offsets, ground_areas
+
+    # the meta file is written last, it marks the store as complete
+    meta = {"identifiers": sorted(identifiers, key=identifiers.get),
+            "collection_size": stat.st_size,
+            "collection_mtime": stat.st_mtime_ns}
+
+    def write_meta(filename):
+        with open(filename, 'w') as f:
+            json.dump(meta, f)
+
+    io.atomic_write(files["meta"], write_meta)
+    return PoseStore(collection_file)
+
+
+def convert_scene_files(scene_files, collection_file, append=False):
+    """
+    Converts scene yaml files into a single scene collection.
+    All scenes need to use the same object library.
+
+    :param scene_files: List of scene yaml files
+    :param collection_file: Path to the collection file
+    :param append: Append to an existing collection
+    :return: Number of scenes written
+    """
+
+    writer = None
+    object_library = None
+    try:
+        for scene_file in scene_files:
+            if object_library is None:
+                _, library, _ = burg.Scene.from_yaml(scene_file)
+                object_library = burg.ObjectLibrary.from_yaml(library.filename)
+                writer = SceneCollectionWriter(collection_file,
+                                               object_library_file=library.filename,
+                                               append=append)
+            scene, _, _ = burg.Scene.from_yaml(scene_file, object_library=object_library)
+            writer.write(scene)
+        return len(scene_files)
+    finally:
+        if writer:
+            writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Converts BURG scene yaml files into a scene collection.")
+    parser.add_argument("scene_files", nargs="+", help="scene yaml files")
+    parser.add_argument("-o", "--output", required=True,
+                        help="scene collection file (.jsonl)")
+    parser.add_argument("-a", "--append", action="store_true",
+                        help="append to an existing collection")
+    parser.add_argument("-p", "--pose-store", action="store_true",
+                        help="also write the binary pose store of the collection")
+    args = parser.parse_args()
+
+    n = convert_scene_files(args.scene_files, args.output, append=args.append)
+    print(f"Wrote {n} scenes to {args.output}.")
+    if args.pose_store:
+        store = build_pose_store(args.output)
+        print(f"Wrote pose store with {len(store.poses)} instances.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+import os
+
+import numpy as np
+import open3d as o3d
+import pybullet
+from pybullet_utils import bullet_client
+
+from burg_setup_gui_sim import tf_from_pos_quat, pos_quat_from_tf
+
+
+# penetration depth in m up to which touching objects are not in collision, none as for
+# the collision check of the burg toolkit
+COLLISION_TOLERANCE = 0.0
+
+
+class CollisionWorld(object):
+    """
+    Keeps the collision shapes of all instances of a scene loaded between checks.
+
+    Collision shapes are created once per object type, from the collision
+    geometry of its urdf file, the same shape the burg toolkit checks, and
+    shared by all bodies of that type. With a shape key,
+    e.g. the hash of the mesh file, object types with the same key share one
+    shape, also across libraries. Moving an instance
+    only moves its body, and contacts are only queried for moved instances
+    and the candidates passed in, so a check after a small edit does not
+    touch the rest of the scene.
+    """
+
+    def __init__(self, tolerance=COLLISION_TOLERANCE, shape_key=None):
+        """
+        :param tolerance: Penetration depth in m up to which touching objects are not in collision
+        :param shape_key: Callable returning the key of the collision shape of an object type,
+                          by default its identifier
+        """
+
+        self.tolerance = tolerance
+        self.shape_key = shape_key or (lambda object_type: object_type.identifier)
+        self.client = None
+        # shape key -> collision shape, None if the urdf is not a single mesh,
+        # and the inertial frame of the urdf
+        self.shapes = {}
+        # key -> pybullet body, shape key and the inertial frame of the body
+        self.bodies = {}
+        self.types = {}
+        self.inertial = {}
+        # key -> set of keys in collision with it
+        self.contacts = {}
+
+    def connect(self):
+        self.client = bullet_client.BulletClient(connection_mode=pybullet.DIRECT)
+
+    def disconnect(self):
+        if self.client is not None:
+            self.client.disconnect()
+        self.client = None
+        self.shapes.clear()
+        self.bodies.clear()
+        self.types.clear()
+        self.inertial.clear()
+        self.contacts.clear()
+
+    def clear(self):
+        """
+        Removes all bodies, collision shapes are kept for the next scene.
+        """
+
+        for body in self.bodies.values():
+            self.client.removeBody(body)
+        self.bodies.clear()
+        self.types.clear()
+        self.inertial.clear()
+        self.contacts.clear()
+
+    def remove_shapes(self, keep):
+        """
+        Removes the collision shapes which are not used by any body and not kept.
+
+        :param keep: Set of shape keys to keep
+        """
+
+        used = set(self.types.values())
+        for shape_key in [k for k in self.shapes if k not in keep and k not in used]:
+            shape, _ = self.shapes.pop(shape_key)
+            if shape is not None:
+                self.client.removeCollisionShape(shape)
+
+    def build(self, object_library):
+        """
+        Creates the collision shapes of all object types of a library.
+
+        :param object_library: A burg ObjectLibrary
+        """
+
+        for object_type in object_library.values():
+            self.get_shape(object_type)
+
+    def get_shape(self, object_type):
+        """
+        Collision shape of an object type, copied from a body loaded from its urdf file,
+        with the same mesh, scale and offset.
+
+        :param object_type: burg ObjectType
+        :return: Tuple of the collision shape, None if the urdf has no single mesh and
+                 instances load the urdf themselves, and the 4x4 inertial frame of the urdf
+        """
+
+        shape_key = self.shape_key(object_type)
+        if shape_key not in self.shapes:
+            template = self.client.loadURDF(object_type.urdf_fn)
+            info = self.client.getDynamicsInfo(template, -1)
+            inertial = tf_from_pos_quat(info[3], info[4])
+            data = self.client.getCollisionShapeData(template, -1)
+            shape = None
+            if len(data) == 1 and data[0][2] == pybullet.GEOM_MESH:
+                _, _, _, scale, filename, position, orientation = data[0][:7]
+                filename = filename.decode() if isinstance(filename, bytes) else filename
+                filename = os.path.join(os.path.dirname(object_type.urdf_fn), filename)
+                # the collision frame is given relative to the inertial frame, which is the
+                # frame of bodies created from the shape, see set_pose
+                shape = self.client.createCollisionShape(
+                    pybullet.GEOM_MESH, fileName=filename, meshScale=scale,
+                    collisionFramePosition=position, collisionFrameOrientation=orientation)
+            self.client.removeBody(template)
+            self.shapes[shape_key] = (shape, inertial)
+        return self.shapes[shape_key]
+
+    def set_pose(self, key, object_type, pose):
+        """
+        Moves the body of an instance, creating it first if necessary.
+
+        :param key: Unique key of the instance
+        :param object_type: burg ObjectType of the instance
+        :param pose: 4x4 pose of the instance
+        """
+
+        shape_key = self.shape_key(object_type)
+        if key in self.bodies and self.types[key] != shape_key:
+            self.remove(key)
+        if key not in self.bodies:
+            shape, inertial = self.get_shape(object_type)
+            if shape is not None:
+                body = self.client.createMultiBody(baseMass=0, baseCollisionShapeIndex=shape)
+            else:
+                body = self.client.loadURDF(object_type.urdf_fn)
+            self.bodies[key] = body
+            self.types[key] = shape_key
+            self.inertial[key] = inertial
+        # pybullet places the center of mass, the link frame of the urdf is offset by it
+        position, quaternion = pos_quat_from_tf(np.asarray(pose) @ self.inertial[key])
+        self.client.resetBasePositionAndOrientation(self.bodies[key], position, quaternion)
+
+    def remove(self, key):
+        """
+        Removes the body of an instance.
+
+        :return: Set of keys which were in collision with it
+        """
+
+        body = self.bodies.pop(key, None)
+        if body is not None:
+            self.client.removeBody(body)
+        self.types.pop(key, None)
+        self.inertial.pop(key, None)
+        partners = self.contacts.pop(key, set())
+        for other in partners:
+            self.contacts.get(other, set()).discard(key)
+        return partners
+
+    def in_collision(self, key, other):
+        points = self.client.getClosestPoints(self.bodies[key], self.bodies[other], 0.0)
+        return any(point[8] < -self.tolerance for point in points)
+
+    def update_contacts(self, key, candidates, updated=()):
+        """
+        Recomputes the contacts of an instance.
+
+        :param key: Key of the instance
+        :param candidates: Keys of instances which may be in collision with it, e.g. by footprint
+        :param updated: Keys whose contacts were already recomputed in the same pass
+        :return: Set of keys whose collision status may have changed, including key
+        """
+
+        old = self.contacts.get(key, set())
+        new = {other for other in candidates
+               if other != key and other in self.bodies
+               and (key in self.contacts.get(other, ()) if other in updated
+                    else self.in_collision(key, other))}
+        for other in old - new:
+            self.contacts.get(other, set()).discard(key)
+        for other in new:
+            self.contacts.setdefault(other, set()).add(key)
+        self.contacts[key] = new
+        return old | new | {key}
+
+    def is_colliding(self, key):
+        return bool(self.contacts.get(key))
+
+
+def hull_points(vertices):
+    """
+    Vertices of the convex hull of a mesh. Extreme coordinates of a transformed
+    mesh are always attained at these points.
+
+    :param vertices: (V, 3) array of mesh vertices
+    :return: (K, 3) array of points
+    """
+
+    cloud = o3d.geometry.PointCloud(o3d.utility.Vector3dVector(np.asarray(vertices)))
+    try:
+        hull, _ = cloud.compute_convex_hull()
+        return np.asarray(hull.vertices)
+    except RuntimeError:
+        # flat or degenerate meshes, e.g. a single plane
+        return np.asarray(vertices)
+
+
+class BoundsChecker(object):
+    """
+    Vectorized test of instances against the ground area.
+
+    The hull points of all object types are padded to a common length by
+    repeating their first point, which does not change their extent, so all
+    instances are transformed in one operation. Object types are added as
+    they appear in a scene, see add.
+    """
+
+    def __init__(self, points=None):
+        """
+        :param points: Dictionary of object type identifier to (K, 3) hull points
+        """
+
+        self.index = {}
+        # (T, 3, K), points as columns for batched matrix products
+        self.points = np.empty((0, 3, 1))
+        if points:
+            self.add(points)
+
+    def __contains__(self, identifier):
+        return identifier in self.index
+
+    def add(self, points):
+        """
+        Adds the hull points of further object types.
+
+        :param points: Dictionary of object type identifier to (K, 3) hull points
+        """
+
+        points = {identifier: np.asarray(p) for identifier, p in points.items()
+                  if identifier not in self.index}
+        if not points:
+            return
+        n_points = max(self.points.shape[2], max(len(p) for p in points.values()))
+        if n_points > self.points.shape[2]:
+            # pad the known object types with their first point as well
+            self.points = np.concatenate(
+                [self.points, np.repeat(self.points[:, :, :1],
+                                        n_points - self.points.shape[2], axis=2)], axis=2)
+        added = np.empty((len(points), 3, n_points))
+        for i, (identifier, p) in enumerate(points.items()):
+            added[i, :, :len(p)] = p.T
+            added[i, :, len(p):] = p[0, :, None]
+            self.index[identifier] = len(self.index)
+        self.points = np.concatenate([self.points, added])
+
+    def type_indices(self, identifiers):
+        return np.array([self.index[identifier] for identifier in identifiers], dtype=np.int64)
+
+    def out_of_bounds(self, type_indices, poses, ground_area):
+        """
+        :param type_indices: (N,) array of object type indices, see type_indices
+        :param poses: (N, 4, 4) array of instance poses
+        :param ground_area: Width and height of the ground area, starting at the origin
+        :return: (N,) boolean array, True for instances reaching outside of the ground area
+        """
+
+        if len(type_indices) == 0:
+            return np.zeros(0, dtype=bool)
+        # (N, 2, K) x and y coordinates of all points, relative to the instance positions
+        xy = np.matmul(poses[:, :2, :3], self.points[type_indices])
+        lower = xy.min(axis=2) + poses[:, :2, 3]
+        upper = xy.max(axis=2) + poses[:, :2, 3]
+        return (lower < 0).any(axis=1) | (upper > np.asarray(ground_area)).any(axis=1)
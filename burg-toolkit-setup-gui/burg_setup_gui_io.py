@@ -0,0 +1,132 @@
+import functools
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+def temporary_path(filename):
+    """
+    Hidden file next to filename with the same extension, so relative paths
+    written into the file stay valid after the rename.
+    """
+
+    directory, name = os.path.split(os.path.abspath(filename))
+    base, extension = os.path.splitext(name)
+    return os.path.join(directory, f".{base}.{uuid.uuid4().hex[:8]}.tmp{extension}")
+
+
+def atomic_write(filename, write, *args, **kwargs):
+    """
+    Writes a file to a temporary path and renames it once complete,
+    so filename is never left half-written.
+
+    :param filename: Path to the file
+    :param write: Callable writing to the path passed as first argument
+    :return: Return value of write
+    """
+
+    path = temporary_path(filename)
+    try:
+        result = write(path, *args, **kwargs)
+        os.replace(path, filename)
+        return result
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def file_key(filename):
+    """
+    Identifies a file version by path, modification time and size.
+    """
+
+    path = os.path.abspath(filename)
+    stat = os.stat(path)
+    return path, stat.st_mtime_ns, stat.st_size
+
+
+class IOWorker(object):
+    """
+    Runs file reads and writes off the main thread.
+
+    Reads run on a small pool and can be prefetched as soon as a file is
+    picked, writes run on a single thread, so they land in the order they
+    were submitted. Results are futures, polled by the caller. Nothing in
+    here touches blender data, writers get immutable copies of the scene.
+    """
+
+    def __init__(self, readers=2, max_prefetched=4):
+        """
+        :param readers: Number of threads for reads
+        :param max_prefetched: Number of unused prefetched reads kept, older ones are dropped
+        """
+
+        self.readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="burg-read")
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="burg-write")
+        self.max_prefetched = max_prefetched
+        # (read function, file key) -> future
+        self.prefetched = OrderedDict()
+        self.lock = threading.Lock()
+
+    def prefetch(self, read, filename):
+        """
+        Starts reading a file in the background, if it exists.
+
+        :param read: Callable reading the file passed as only argument
+        :param filename: Path to the file
+        """
+
+        try:
+            key = (read, file_key(filename))
+        except OSError:
+            return
+        with self.lock:
+            if key in self.prefetched:
+                return
+            self.prefetched[key] = self.readers.submit(read, filename)
+            while len(self.prefetched) > self.max_prefetched:
+                _, future = self.prefetched.popitem(last=False)
+                future.cancel()
+
+    def read(self, read, filename):
+        """
+        Reads a file in the background, taking over a prefetched read of the same file version.
+        Prefetched results are handed out once, as callers may modify them.
+
+        :param read: Callable reading the file passed as only argument
+        :param filename: Path to the file
+        :return: Future of the result of read
+        """
+
+        key = (read, file_key(filename))
+        with self.lock:
+            future = self.prefetched.pop(key, None)
+        if future is None or future.cancelled():
+            future = self.readers.submit(read, filename)
+        return future
+
+    def write(self, filename, write, *args, **kwargs):
+        """
+        Writes a file in the background, see atomic_write.
+
+        :param filename: Path to the file
+        :param write: Callable writing to the path passed as first argument
+        :return: Future of the return value of write
+        """
+
+        return self.writer.submit(functools.partial(atomic_write, filename, write,
+                                                    *args, **kwargs))
+
+    def shutdown(self):
+        """
+        Drops pending reads and waits for pending writes.
+        """
+
+        with self.lock:
+            for future in self.prefetched.values():
+                future.cancel()
+            self.prefetched.clear()
+        self.readers.shutdown(wait=False)
+        self.writer.shutdown(wait=True)
@@ -0,0 +1,592 @@
+import math
+import zlib
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+import burg_toolkit as burg
+
+
+# gray values of object footprints and their outlines
+FOOTPRINT_FILL = 200
+FOOTPRINT_OUTLINE = 0
+# angle in radians up to which an instance counts as resting in a stable pose, the
+# footprint of the stable pose is also only reused if no vertex moves by more than a pixel
+STABLE_POSE_TOLERANCE = math.radians(0.1)
+POINTS_PER_M = 72 / 0.0254
+# line width of footprint outlines and font size of labels in vector printouts, in m
+OUTLINE_WIDTH = 0.0003
+LABEL_SIZE = 0.004
+# distance in pixels up to which traced contours are simplified
+CONTOUR_TOLERANCE = 0.7
+
+# ground area size -> printout image with markers only, see base_image
+base_images = {}
+# ground area size -> black rectangles of the marker board, see base_rectangles
+base_rectangle_lists = {}
+
+
+def base_image(size):
+    """
+    Printout image of an empty scene, i.e. the marker board only.
+
+    :param size: Size of the ground area in m
+    :return: (H, W) uint8 image, cached per size
+    """
+
+    size = tuple(size)
+    if size not in base_images:
+        base_images[size] = burg.printout.Printout(size).get_image()
+    return base_images[size]
+
+
+def base_rectangles(size):
+    """
+    Black areas of the marker board as rectangles, for vector printouts.
+    Runs of dark pixels in a row are merged with identical runs in the rows
+    below, so every marker cell becomes a single rectangle.
+
+    :param size: Size of the ground area in m
+    :return: (R, 4) array of column, row, width and height in pixels, cached per size
+    """
+
+    size = tuple(size)
+    if size not in base_rectangle_lists:
+        dark = base_image(size) < 128
+        # run starts and ends per row, from the changes along padded rows
+        changes = np.diff(np.pad(dark, ((0, 0), (1, 1))).astype(np.int8), axis=1)
+        rows, starts = np.nonzero(changes == 1)
+        _, ends = np.nonzero(changes == -1)
+
+        rectangles = []
+        # (start, end) of a run -> index of the open rectangle it continues
+        open_runs = {}
+        for row in range(dark.shape[0]):
+            first, last = np.searchsorted(rows, [row, row + 1])
+            runs = {}
+            for start, end in zip(starts[first:last], ends[first:last]):
+                key = (int(start), int(end))
+                if key in open_runs:
+                    rectangles[open_runs[key]][3] += 1
+                    runs[key] = open_runs[key]
+                else:
+                    runs[key] = len(rectangles)
+                    rectangles.append([key[0], row, key[1] - key[0], 1])
+            open_runs = runs
+        base_rectangle_lists[size] = np.array(rectangles, dtype=np.int64).reshape(-1, 4)
+    return base_rectangle_lists[size]
+
+
+def simplify(points, tolerance):
+    """
+    Douglas-Peucker simplification of an open polyline.
+
+    :param points: (P, 2) array of points
+    :param tolerance: Distance up to which points are dropped
+    :return: (Q, 2) array of the kept points
+    """
+
+    keep = np.zeros(len(points), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        direction = points[last] - points[first]
+        offsets = points[first + 1:last] - points[first]
+        length = np.hypot(*direction)
+        if length > 0:
+            distances = np.abs(direction[0] * offsets[:, 1] - direction[1] * offsets[:, 0]) / length
+        else:
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        i = int(np.argmax(distances))
+        if distances[i] > tolerance:
+            keep[first + 1 + i] = True
+            stack += [(first, first + 1 + i), (first + 1 + i, last)]
+    return points[keep]
+
+
+def trace_contours(mask, tolerance=CONTOUR_TOLERANCE):
+    """
+    Traces the boundaries between filled and empty pixels of a mask.
+
+    :param mask: (H, W) boolean array
+    :param tolerance: Distance in pixels up to which contours are simplified
+    :return: List of (P, 2) arrays of closed contours, in column and row pixel corners
+    """
+
+    padded = np.pad(mask, 1)
+    inner = padded[1:-1, 1:-1]
+    # directed edges with the filled pixel on the same side, so every loop closes
+    edges = {}
+    for (dr, dc), start, end in (((-1, 0), (0, 0), (0, 1)), ((0, 1), (0, 1), (1, 1)),
+                                 ((1, 0), (1, 1), (1, 0)), ((0, -1), (1, 0), (0, 0))):
+        neighbor = padded[1 + dr:padded.shape[0] - 1 + dr, 1 + dc:padded.shape[1] - 1 + dc]
+        for r, c in zip(*np.nonzero(inner & ~neighbor)):
+            edges.setdefault((r + start[0], c + start[1]), []).append(
+                (r + end[0], c + end[1]))
+
+    contours = []
+    while edges:
+        first = next(iter(edges))
+        loop = [first]
+        vertex = first
+        while True:
+            targets = edges[vertex]
+            following = targets.pop()
+            if not targets:
+                del edges[vertex]
+            if following == first:
+                break
+            loop.append(following)
+            vertex = following
+        # close the loop at its farthest point from the start, then simplify both halves
+        points = np.array(loop, dtype=np.float64)[:, ::-1]
+        far = int(np.argmax(np.hypot(*(points - points[0]).T)))
+        closed = np.vstack([points, points[:1]])
+        contour = np.vstack([simplify(closed[:far + 1], tolerance)[:-1],
+                             simplify(closed[far:], tolerance)[:-1]])
+        if len(contour) >= 3:
+            contours.append(contour)
+    return contours
+
+
+def escape_pdf_text(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+class Footprint(object):
+    """
+    Rasterized footprint of an object type in one orientation.
+    Rows run along -y, columns along x, like the printout image.
+    """
+
+    def __init__(self, fill, outline, x_min, y_max):
+        self.fill = fill
+        self.outline = outline
+        self.x_min = x_min
+        self.y_max = y_max
+        self.contours = None
+
+    def get_contours(self, px_per_m):
+        """
+        Outline of the footprint as closed polygons in its own frame, traced on first use.
+
+        :param px_per_m: Resolution of the footprint in pixels per m
+        :return: List of (P, 2) arrays of x and y in m
+        """
+
+        if self.contours is None:
+            self.contours = [np.column_stack([self.x_min + contour[:, 0] / px_per_m,
+                                              self.y_max - contour[:, 1] / px_per_m])
+                             for contour in trace_contours(self.fill)]
+        return self.contours
+
+    def corners(self, px_per_m):
+        h, w = self.fill.shape
+        return np.array([[self.x_min, self.y_max], [self.x_min + w / px_per_m, self.y_max],
+                         [self.x_min, self.y_max - h / px_per_m],
+                         [self.x_min + w / px_per_m, self.y_max - h / px_per_m]])
+
+
+def rasterize_footprint(vertices, triangles, rotation, px_per_m):
+    """
+    Rasterizes the top view of a rotated mesh.
+
+    :param vertices: (V, 3) array of mesh vertices
+    :param triangles: (T, 3) array of triangles
+    :param rotation: 3x3 rotation of the mesh
+    :param px_per_m: Resolution in pixels per m
+    :return: A Footprint
+    """
+
+    xy = (np.asarray(vertices) @ np.asarray(rotation).T)[:, :2]
+    x_min, y_min = xy.min(axis=0)
+    x_max, y_max = xy.max(axis=0)
+    width = max(1, int(math.ceil((x_max - x_min) * px_per_m)) + 1)
+    height = max(1, int(math.ceil((y_max - y_min) * px_per_m)) + 1)
+
+    pixels = np.empty_like(xy)
+    pixels[:, 0] = (xy[:, 0] - x_min) * px_per_m
+    pixels[:, 1] = (y_max - xy[:, 1]) * px_per_m
+    image = Image.new('1', (width, height), 0)
+    draw = ImageDraw.Draw(image)
+    for triangle in pixels[np.asarray(triangles)]:
+        draw.polygon([tuple(p) for p in triangle], fill=1)
+    fill = np.array(image, dtype=bool)
+
+    # outline pixels have at least one empty 4-neighbor
+    padded = np.pad(fill, 1)
+    interior = (padded[:-2, 1:-1] & padded[2:, 1:-1] & padded[1:-1, :-2] & padded[1:-1, 2:])
+    return Footprint(fill, fill & ~interior, x_min, y_max)
+
+
+def transform_2d(points, angle, x, y):
+    c, s = math.cos(angle), math.sin(angle)
+    return points @ np.array([[c, s], [-s, c]]) + [x, y]
+
+
+class FootprintCache(object):
+    """
+    Footprints of object types per stable pose.
+
+    Instances resting in a stable pose only differ by a rotation around z and a
+    translation, so their footprint is the cached one, rotated and moved in 2D.
+    Instances tilted so far that the outline would move by more than a pixel,
+    or in other orientations, get a footprint of their own.
+    """
+
+    def __init__(self, mesh_arrays, px_per_m):
+        """
+        :param mesh_arrays: Callable returning the vertices and triangles of an object type
+        :param px_per_m: Resolution in pixels per m
+        """
+
+        self.mesh_arrays = mesh_arrays
+        self.px_per_m = px_per_m
+        # (object type identifier, stable pose index) -> Footprint
+        self.footprints = {}
+        # object type identifier -> largest distance of a vertex from the origin in m
+        self.radii = {}
+
+    def max_tilt(self, object_type):
+        """
+        Tilt in radians up to which no vertex of an object type moves by more than a pixel.
+        """
+
+        if object_type.identifier not in self.radii:
+            vertices, _ = self.mesh_arrays(object_type)
+            self.radii[object_type.identifier] = \
+                float(np.linalg.norm(vertices, axis=1).max()) if len(vertices) else 0.0
+        radius = self.radii[object_type.identifier]
+        if radius <= 0:
+            return STABLE_POSE_TOLERANCE
+        return min(STABLE_POSE_TOLERANCE, 1.0 / (self.px_per_m * radius))
+
+    def get(self, instance):
+        """
+        :param instance: A burg ObjectInstance
+        :return: Tuple of the Footprint and the rotation angle around z
+        """
+
+        object_type = instance.object_type
+        rotation = np.asarray(instance.pose)[:3, :3]
+        min_cos = math.cos(self.max_tilt(object_type)) if object_type.stable_poses else 1.0
+        for i, (_, stable_pose) in enumerate(object_type.stable_poses or []):
+            relative = rotation @ np.asarray(stable_pose)[:3, :3].T
+            if relative[2, 2] >= min_cos:
+                key = (object_type.identifier, i)
+                if key not in self.footprints:
+                    self.footprints[key] = rasterize_footprint(
+                        *self.mesh_arrays(object_type), np.asarray(stable_pose)[:3, :3],
+                        self.px_per_m)
+                return self.footprints[key], math.atan2(relative[1, 0], relative[0, 0])
+        return rasterize_footprint(*self.mesh_arrays(object_type), rotation, self.px_per_m), 0.0
+
+
+class FastPrintout(object):
+    """
+    Printout of a scene, drawn from cached footprints on top of the marker board.
+
+    Pdf files are written as vector graphics: the marker board as rectangles,
+    footprints as their traced outlines and object names as text. Rendering
+    to an image remains for the viewport, one region at a time, so memory
+    stays bounded by the region size.
+    """
+
+    def __init__(self, size, footprint_cache):
+        """
+        :param size: Size of the ground area in m
+        :param footprint_cache: A FootprintCache matching the resolution of the marker board
+        """
+
+        self.size = tuple(size)
+        self.base = base_image(size)
+        self.px_per_m = self.base.shape[1] / self.size[0]
+        self.footprint_cache = footprint_cache
+        # (footprint, angle, x, y, label, (min x, min y, max x, max y)) of all instances
+        self.items = []
+
+    @classmethod
+    def resolution(cls, size):
+        """
+        Resolution of the marker board of a ground area size, in pixels per m.
+        """
+
+        return base_image(size).shape[1] / tuple(size)[0]
+
+    def add_scene(self, scene):
+        for instance in scene.objects:
+            footprint, angle = self.footprint_cache.get(instance)
+            x, y = np.asarray(instance.pose)[:2, 3]
+            world = transform_2d(footprint.corners(self.px_per_m), angle, x, y)
+            bounds = (*world.min(axis=0), *world.max(axis=0))
+            self.items.append((footprint, angle, x, y, instance.object_type.identifier, bounds))
+
+    def render(self, row0, col0, rows, cols):
+        """
+        Renders a region of the printout image.
+
+        :param row0: First row of the region
+        :param col0: First column of the region
+        :param rows: Number of rows
+        :param cols: Number of columns
+        :return: (rows, cols) uint8 image
+        """
+
+        image = self.base[row0:row0 + rows, col0:col0 + cols].copy()
+        s = self.px_per_m
+        height_m = self.base.shape[0] / s
+        for footprint, angle, x, y, _, (x_min, y_min, x_max, y_max) in self.items:
+            h, w = footprint.fill.shape
+            r_start = max(row0, int(math.floor((height_m - y_max) * s)))
+            r_end = min(row0 + rows, int(math.ceil((height_m - y_min) * s)) + 1)
+            c_start = max(col0, int(math.floor(x_min * s)))
+            c_end = min(col0 + cols, int(math.ceil(x_max * s)) + 1)
+            if r_start >= r_end or c_start >= c_end:
+                continue
+
+            # pixel centers back into the frame of the footprint
+            c, si = math.cos(angle), math.sin(angle)
+            rr, cc = np.mgrid[r_start:r_end, c_start:c_end]
+            px = (cc + 0.5) / s - x
+            py = height_m - (rr + 0.5) / s - y
+            local_x = c * px + si * py
+            local_y = -si * px + c * py
+            fc = np.floor((local_x - footprint.x_min) * s).astype(np.int64)
+            fr = np.floor((footprint.y_max - local_y) * s).astype(np.int64)
+            inside = (fr >= 0) & (fr < h) & (fc >= 0) & (fc < w)
+            fr, fc = fr[inside], fc[inside]
+            target_r, target_c = rr[inside] - row0, cc[inside] - col0
+            fill = footprint.fill[fr, fc]
+            image[target_r[fill], target_c[fill]] = FOOTPRINT_FILL
+            outline = footprint.outline[fr, fc]
+            image[target_r[outline], target_c[outline]] = FOOTPRINT_OUTLINE
+        return image
+
+    def get_image(self):
+        return self.render(0, 0, *self.base.shape)
+
+    def pages(self, page_size, margin_mm=0.0):
+        """
+        Splits the printout into pages, choosing the page orientation which needs fewer pages.
+
+        :param page_size: Size of a page in m
+        :param margin_mm: Margin of each page in mm
+        :return: Tuple of the page size in m and a list of (x, y, width, height) regions in m,
+                 y measured from the top
+        """
+
+        margin = margin_mm / 1000
+        width, height = self.size
+        best = None
+        for page_width, page_height in (page_size, page_size[::-1]):
+            usable_width, usable_height = page_width - 2 * margin, page_height - 2 * margin
+            if usable_width <= 0 or usable_height <= 0:
+                raise ValueError(f"Margin of {margin_mm} mm does not fit on the page.")
+            nx = int(math.ceil(width / usable_width - 1e-9))
+            ny = int(math.ceil(height / usable_height - 1e-9))
+            if best is None or nx * ny < best[0]:
+                regions = [(i * usable_width, j * usable_height,
+                            min(usable_width, width - i * usable_width),
+                            min(usable_height, height - j * usable_height))
+                           for j in range(ny) for i in range(nx)]
+                best = (nx * ny, (page_width, page_height), regions)
+        return best[1], best[2]
+
+    def page_content(self, x, y, width, height, page_height, margin):
+        """
+        Content stream of one page in vector graphics.
+
+        :param x: Left edge of the region on the ground area in m
+        :param y: Top edge of the region on the ground area in m, measured from the top
+        :param width: Width of the region in m
+        :param height: Height of the region in m
+        :param page_height: Height of the page in m
+        :param margin: Page margin in m
+        :return: Content stream in pdf operators
+        """
+
+        k = POINTS_PER_M
+        height_m = self.base.shape[0] / self.px_per_m
+        # everything below is drawn in m on the ground area, clipped to the region
+        content = [f"q {k:.4f} 0 0 {k:.4f} {(margin - x) * k:.3f} "
+                   f"{(page_height - margin - (height_m - y)) * k:.3f} cm",
+                   f"{x:.5f} {height_m - y - height:.5f} {width:.5f} {height:.5f} re W n"]
+
+        # marker board, pixel rectangles flipped into m
+        col0, row0 = x * self.px_per_m, y * self.px_per_m
+        col1, row1 = (x + width) * self.px_per_m, (y + height) * self.px_per_m
+        rectangles = base_rectangles(self.size)
+        visible = ((rectangles[:, 0] < col1) & (rectangles[:, 0] + rectangles[:, 2] > col0) &
+                   (rectangles[:, 1] < row1) & (rectangles[:, 1] + rectangles[:, 3] > row0))
+        if visible.any():
+            content.append(f"q {1 / self.px_per_m:.8f} 0 0 {-1 / self.px_per_m:.8f} 0 "
+                           f"{height_m:.5f} cm 0 g")
+            content += [f"{c} {r} {w} {h} re" for c, r, w, h in rectangles[visible]]
+            content.append("f Q")
+
+        # footprints and labels of the instances on the page
+        y_bottom, y_top = height_m - y - height, height_m - y
+        content.append(f"{FOOTPRINT_FILL / 255:.3f} g {FOOTPRINT_OUTLINE / 255:.3f} G "
+                       f"{OUTLINE_WIDTH} w 1 j")
+        labels = []
+        for footprint, angle, px, py, label, (x_min, y_min, x_max, y_max) in self.items:
+            if x_max < x or x_min > x + width or y_max < y_bottom or y_min > y_top:
+                continue
+            contours = footprint.get_contours(self.px_per_m)
+            for contour in contours:
+                points = transform_2d(contour, angle, px, py)
+                content.append(f"{points[0, 0]:.5f} {points[0, 1]:.5f} m")
+                content += [f"{p[0]:.5f} {p[1]:.5f} l" for p in points[1:]]
+                content.append("h")
+            if contours:
+                content.append("B*")
+            labels.append((label, (x_min + x_max) / 2, (y_min + y_max) / 2))
+        content.append(f"BT /F1 {LABEL_SIZE} Tf 0 g")
+        for label, lx, ly in labels:
+            # centered by the average width of helvetica characters
+            content.append(f"1 0 0 1 {lx - 0.25 * LABEL_SIZE * len(label):.5f} "
+                           f"{ly - 0.35 * LABEL_SIZE:.5f} Tm ({escape_pdf_text(label)}) Tj")
+        content.append("ET Q")
+        return "\n".join(content)
+
+    def save_pdf(self, filename, page_size=None, margin_mm=0.0, vector=True):
+        """
+        Writes the printout to a pdf file, page by page.
+
+        :param filename: Path to the pdf file
+        :param page_size: Size of a page in m, defaults to the size of the ground area
+        :param margin_mm: Margin of each page in mm
+        :param vector: Write vector graphics, otherwise every page is a rendered image
+        """
+
+        page_size = tuple(page_size or self.size)
+        (page_width, page_height), regions = self.pages(page_size, margin_mm)
+        margin = margin_mm / 1000
+        s = self.px_per_m
+        with PdfWriter(filename) as pdf:
+            for x, y, width, height in regions:
+                if vector:
+                    pdf.add_page(page_width, page_height,
+                                 self.page_content(x, y, width, height, page_height, margin),
+                                 resources=f"/Font << /F1 {pdf.font_id()} 0 R >>")
+                    continue
+                col0, row0 = int(round(x * s)), int(round(y * s))
+                cols = min(int(round(width * s)), self.base.shape[1] - col0)
+                rows = min(int(round(height * s)), self.base.shape[0] - row0)
+                image = self.render(row0, col0, rows, cols)
+                pdf.add_image_page(image, page_width, page_height,
+                                   margin, page_height - margin - rows / s,
+                                   cols / s, rows / s)
+
+
+class PdfWriter(object):
+    """
+    Minimal pdf writer which writes every page as soon as it is added.
+    Only offsets of written objects are kept in memory.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.file = None
+        self.offsets = {}
+        self.page_ids = []
+        self.font = None
+        # object 1 is the catalog, object 2 the page tree, both written on close
+        self.next_id = 3
+
+    def __enter__(self):
+        self.file = open(self.filename, 'wb')
+        self.file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                self.close()
+        finally:
+            self.file.close()
+
+    def new_id(self):
+        object_id = self.next_id
+        self.next_id += 1
+        return object_id
+
+    def write_object(self, object_id, body, stream=None):
+        self.offsets[object_id] = self.file.tell()
+        self.file.write(f"{object_id} 0 obj\n".encode())
+        self.file.write(body.encode())
+        if stream is not None:
+            self.file.write(b"\nstream\n")
+            self.file.write(stream)
+            self.file.write(b"\nendstream")
+        self.file.write(b"\nendobj\n")
+
+    def font_id(self):
+        """
+        Id of the font used for labels, written on first use.
+        """
+
+        if self.font is None:
+            self.font = self.new_id()
+            self.write_object(self.font, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica "
+                                         "/Encoding /WinAnsiEncoding >>")
+        return self.font
+
+    def add_page(self, page_width, page_height, content, resources=""):
+        """
+        Adds a page with a content stream.
+
+        :param page_width: Width of the page in m
+        :param page_height: Height of the page in m
+        :param content: Content stream in pdf operators, in points
+        :param resources: Resource dictionary entries
+        """
+
+        page_id, content_id = self.new_id(), self.new_id()
+        data = zlib.compress(content.encode())
+        self.write_object(content_id, f"<< /Length {len(data)} /Filter /FlateDecode >>", data)
+        self.write_object(page_id, f"<< /Type /Page /Parent 2 0 R "
+                                   f"/MediaBox [0 0 {page_width * POINTS_PER_M:.2f} "
+                                   f"{page_height * POINTS_PER_M:.2f}] "
+                                   f"/Resources << {resources} >> /Contents {content_id} 0 R >>")
+        self.page_ids.append(page_id)
+
+    def add_image_page(self, image, page_width, page_height, x, y, width, height):
+        """
+        Adds a page showing a grayscale image.
+
+        :param image: (H, W) uint8 image
+        :param page_width: Width of the page in m
+        :param page_height: Height of the page in m
+        :param x: Left edge of the image on the page in m
+        :param y: Bottom edge of the image on the page in m
+        :param width: Width of the image on the page in m
+        :param height: Height of the image on the page in m
+        """
+
+        image_id = self.new_id()
+        rows, cols = image.shape
+        data = zlib.compress(np.ascontiguousarray(image, dtype=np.uint8).tobytes())
+        self.write_object(image_id, f"<< /Type /XObject /Subtype /Image /Width {cols} "
+                                    f"/Height {rows} /ColorSpace /DeviceGray "
+                                    f"/BitsPerComponent 8 /Filter /FlateDecode "
+                                    f"/Length {len(data)} >>", data)
+        k = POINTS_PER_M
+        content = (f"q {width * k:.3f} 0 0 {height * k:.3f} {x * k:.3f} {y * k:.3f} cm "
+                   f"/Im0 Do Q")
+        self.add_page(page_width, page_height, content,
+                      resources=f"/XObject << /Im0 {image_id} 0 R >>")
+
+    def close(self):
+        kids = " ".join(f"{page_id} 0 R" for page_id in self.page_ids)
+        self.write_object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.page_ids)} >>")
+        self.write_object(1, "<< /Type /Catalog /Pages 2 0 R >>")
+        xref = self.file.tell()
+        self.file.write(f"xref\n0 {self.next_id}\n0000000000 65535 f \n".encode())
+        for object_id in range(1, self.next_id):
+            self.file.write(f"{self.offsets[object_id]:010d} 00000 n \n".encode())
+        self.file.write(f"trailer\n<< /Size {self.next_id} /Root 1 0 R >>\n"
+                        f"startxref\n{xref}\n%%EOF\n".encode())
@@ -0,0 +1,223 @@
+import cProfile
+import csv
+import functools
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+
+
+# traceback depth of tracemalloc while capturing and number of allocation sites listed
+CAPTURE_TRACEBACK_FRAMES = 10
+CAPTURE_TOP_ALLOCATIONS = 20
+
+
+class StageStats(object):
+    """
+    Call count, total duration and a rolling window of recent durations of one stage.
+    """
+
+    def __init__(self, window=50):
+        self.count = 0
+        self.total = 0.0
+        self.recent = deque(maxlen=window)
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        self.recent.append(duration)
+
+    def summary(self):
+        recent = list(self.recent)
+        return {"count": self.count,
+                "total_s": self.total,
+                "last_s": recent[-1] if recent else 0.0,
+                "mean_s": sum(recent) / len(recent) if recent else 0.0,
+                "max_s": max(recent) if recent else 0.0}
+
+
+class Profiler(object):
+    """
+    Records durations of named stages.
+
+    Stages are nested freely, e.g. an operator stage containing a collision
+    check stage. Every stage keeps its own statistics, so the summary shows
+    both the time of an operator and the stages it spent it in.
+    """
+
+    def __init__(self, window=50):
+        self.window = window
+        self.enabled = True
+        self.stats = {}
+        # deep capture of the next operator invocations, see capture
+        self.capture_remaining = 0
+        self.capture_dir = None
+        self.capture_info = None
+        self._capturing = False
+        # number of captures written in this session, keeps file names unique
+        self._capture_count = 0
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Context manager timing the enclosed block as stage name.
+
+        :param name: Name of the stage
+        """
+
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def timed(self, name):
+        """
+        Decorator timing every call of a function as stage name.
+
+        :param name: Name of the stage
+        """
+
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def operator(self, idname):
+        """
+        Decorator for operator execute methods.
+        Times every invocation and captures a deep profile while a capture is armed.
+
+        :param idname: bl_idname of the operator
+        """
+
+        name = f"operator {idname}"
+
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                # operators called by other operators are part of the outer capture
+                if self.capture_remaining > 0 and not self._capturing:
+                    return self._capture_call(idname, func, args, kwargs)
+                with self.stage(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def capture(self, count, capture_dir=None, capture_info=None):
+        """
+        Arms cProfile and tracemalloc capture for the next operator invocations.
+
+        :param count: Number of operator invocations to capture
+        :param capture_dir: Callable returning the output directory, defaults to the temp directory
+        :param capture_info: Callable returning a dictionary stored with each capture, e.g. scene sizes
+        """
+
+        self.capture_remaining = count
+        self.capture_dir = capture_dir
+        self.capture_info = capture_info
+
+    def _capture_call(self, idname, func, args, kwargs):
+        self.capture_remaining -= 1
+        self._capturing = True
+        profile = cProfile.Profile()
+        was_tracing = tracemalloc.is_tracing()
+        if not was_tracing:
+            tracemalloc.start(CAPTURE_TRACEBACK_FRAMES)
+        before = tracemalloc.take_snapshot()
+        start = time.perf_counter()
+        try:
+            with self.stage(f"operator {idname}"):
+                profile.enable()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    profile.disable()
+        finally:
+            duration = time.perf_counter() - start
+            after = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            if not was_tracing:
+                tracemalloc.stop()
+            self._capturing = False
+            try:
+                self._write_capture(idname, profile, before, after, duration, peak)
+            except Exception as e:
+                print(f"Could not write profile of operator {idname}.")
+                print(e)
+
+    def _write_capture(self, idname, profile, before, after, duration, peak):
+        capture_dir = self.capture_dir() if self.capture_dir else None
+        if not capture_dir or not os.path.isdir(capture_dir):
+            capture_dir = tempfile.gettempdir()
+        self._capture_count += 1
+        name = (f"burg_profile_{time.strftime('%Y%m%d_%H%M%S')}_{self._capture_count:03d}"
+                f"_{idname.replace('.', '_')}")
+        base = os.path.join(capture_dir, name)
+        # captures of another session within the same second
+        suffix = 1
+        while os.path.exists(base + ".prof"):
+            suffix += 1
+            base = os.path.join(capture_dir, f"{name}_{suffix}")
+
+        profile.dump_stats(base + ".prof")
+        after.dump(base + ".snapshot")
+        top = after.compare_to(before, 'lineno')[:CAPTURE_TOP_ALLOCATIONS]
+        info = {"operator": idname,
+                "duration_s": duration,
+                "peak_traced_bytes": peak,
+                "top_allocations": [str(stat) for stat in top]}
+        if self.capture_info:
+            info.update(self.capture_info())
+        with open(base + ".json", 'w') as f:
+            json.dump(info, f, indent=2)
+        print(f"Wrote profile of operator {idname} to {base}.prof")
+
+    def record(self, name, duration):
+        stats = self.stats.get(name)
+        if stats is None:
+            stats = self.stats[name] = StageStats(self.window)
+        stats.add(duration)
+
+    def reset(self):
+        self.stats.clear()
+
+    def summary(self):
+        """
+        :return: Dictionary of stage name to statistics, slowest stages first
+        """
+
+        summary = {name: stats.summary() for name, stats in self.stats.items()}
+        return dict(sorted(summary.items(), key=lambda item: -item[1]["total_s"]))
+
+    def export(self, filename):
+        """
+        Writes the summary to a json or csv file, depending on the file extension.
+
+        :param filename: Path to the output file
+        """
+
+        summary = self.summary()
+        if filename.lower().endswith('.csv'):
+            with open(filename, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(["stage", "count", "total_s", "last_s", "mean_s", "max_s"])
+                for name, stats in summary.items():
+                    writer.writerow([name, stats["count"], stats["total_s"], stats["last_s"],
+                                     stats["mean_s"], stats["max_s"]])
+        else:
+            with open(filename, 'w') as f:
+                json.dump(summary, f, indent=2)
+
+
+# the one and only profiler, shared by the scene manager and the operators
+profiler = Profiler()
@@ -0,0 +1,158 @@
+import os
+
+import numpy as np
+
+import burg_setup_gui_io as io
+
+
+SEARCH_INDEX_FILE = "search_index.npz"
+SEARCH_INDEX_VERSION = 1
+SORT_KEYS = ("NAME", "SIZE", "MASS", "STABLE_POSES")
+
+
+class SearchIndex(object):
+    """
+    Precomputed fields of all object types of a library, for filtering and sorting
+    the object list with array operations instead of per item lookups.
+
+    The index is stored in the mesh cache directory together with the hash of
+    the library file, so it is only built once per library version.
+    """
+
+    def __init__(self, library_hash, identifiers, names, tags, dimensions, masses,
+                 stable_poses):
+        """
+        :param library_hash: Hash of the object library file the index was built from
+        :param identifiers: (N,) array of object type identifiers, in library order
+        :param names: (N,) array of object type names
+        :param tags: (N,) array of tags of each object type, joined by spaces
+        :param dimensions: (N, 3) array of bounding box extents in m
+        :param masses: (N,) array of masses in kg, NaN if unknown
+        :param stable_poses: (N,) array of numbers of stable poses
+        """
+
+        self.library_hash = library_hash
+        self.identifiers = np.asarray(identifiers, dtype=str)
+        self.names = np.asarray(names, dtype=str)
+        self.tags = np.asarray(tags, dtype=str)
+        self.dimensions = np.asarray(dimensions, dtype=np.float64).reshape(-1, 3)
+        self.masses = np.asarray(masses, dtype=np.float64)
+        self.stable_poses = np.asarray(stable_poses, dtype=np.int64)
+        # lower case text searched by queries
+        self.text = np.char.lower(np.char.add(np.char.add(
+            np.char.add(self.names, " "), np.char.add(self.identifiers, " ")), self.tags))
+        self.sizes = self.dimensions.max(axis=1) if len(self.dimensions) else np.zeros(0)
+        self._orders = {}
+
+    def __len__(self):
+        return len(self.identifiers)
+
+    @classmethod
+    def build(cls, object_library, mesh_cache, library_hash):
+        """
+        :param object_library: A burg ObjectLibrary
+        :param mesh_cache: The MeshCache of the library, for the mesh dimensions
+        :param library_hash: Hash of the object library file
+        """
+
+        identifiers, names, tags, dimensions, masses, stable_poses = [], [], [], [], [], []
+        for identifier, object_type in object_library.items():
+            vertices, _ = mesh_cache.get_arrays(object_type)
+            identifiers.append(identifier)
+            names.append(object_type.name or identifier)
+            tags.append(" ".join(str(tag) for tag in (getattr(object_type, 'tags', None) or [])))
+            dimensions.append(np.ptp(vertices, axis=0) if len(vertices) else np.zeros(3))
+            masses.append(np.nan if object_type.mass is None else object_type.mass)
+            stable_poses.append(len(object_type.stable_poses or []))
+        return cls(library_hash, identifiers, names, tags, dimensions, masses, stable_poses)
+
+    @classmethod
+    def load(cls, filename, library_hash):
+        """
+        :return: The stored index, None if it is missing or from another library version
+        """
+
+        if not os.path.isfile(filename):
+            return None
+        try:
+            with np.load(filename) as data:
+                if (int(data["version"]) != SEARCH_INDEX_VERSION
+                        or str(data["library_hash"]) != library_hash):
+                    return None
+                return cls(library_hash, data["identifiers"], data["names"], data["tags"],
+                           data["dimensions"], data["masses"], data["stable_poses"])
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Could not read search index {filename}, rebuilding it.")
+            print(e)
+            return None
+
+    def save(self, filename):
+        # write to a uniquely named temporary file first, so readers never see a half written
+        # index and processes sharing the cache directory do not write to the same file
+        io.atomic_write(filename, np.savez, version=SEARCH_INDEX_VERSION,
+                        library_hash=self.library_hash, identifiers=self.identifiers,
+                        names=self.names, tags=self.tags, dimensions=self.dimensions,
+                        masses=self.masses, stable_poses=self.stable_poses)
+
+    @classmethod
+    def for_library(cls, object_library, mesh_cache, library_hash):
+        """
+        Reads the index of a library from its mesh cache directory, building it if necessary.
+        """
+
+        filename = os.path.join(mesh_cache.cache_dir, SEARCH_INDEX_FILE)
+        index = cls.load(filename, library_hash)
+        if index is None or len(index) != len(object_library):
+            index = cls.build(object_library, mesh_cache, library_hash)
+            try:
+                os.makedirs(mesh_cache.cache_dir, exist_ok=True)
+                index.save(filename)
+            except OSError as e:
+                print(f"Could not save search index {filename}.")
+                print(e)
+        return index
+
+    def filter(self, query="", min_size=0.0, max_size=0.0, min_mass=0.0, max_mass=0.0,
+               min_stable_poses=0):
+        """
+        Finds the object types matching a query and ranges. Upper limits of 0 are ignored.
+
+        :param query: Words which all appear in the name, identifier or tags, '*' is ignored
+        :param min_size: Minimum of the largest dimension in m
+        :param max_size: Maximum of the largest dimension in m
+        :param min_mass: Minimum mass in kg, object types without mass only pass a minimum of 0
+        :param max_mass: Maximum mass in kg
+        :param min_stable_poses: Minimum number of stable poses
+        :return: (N,) boolean array
+        """
+
+        visible = np.ones(len(self), dtype=bool)
+        for word in query.replace("*", " ").lower().split():
+            visible &= np.char.find(self.text, word) >= 0
+        if min_size > 0:
+            visible &= self.sizes >= min_size
+        if max_size > 0:
+            visible &= self.sizes <= max_size
+        if min_mass > 0:
+            visible &= self.masses >= min_mass
+        if max_mass > 0:
+            visible &= ~(self.masses > max_mass)
+        if min_stable_poses > 0:
+            visible &= self.stable_poses >= min_stable_poses
+        return visible
+
+    def order(self, sort_key):
+        """
+        Positions of the object types when sorted, cached per key.
+
+        :param sort_key: One of SORT_KEYS
+        :return: (N,) array with the sorted position of every object type
+        """
+
+        if sort_key not in self._orders:
+            values = {"NAME": np.char.lower(self.names), "SIZE": self.sizes,
+                      "MASS": self.masses, "STABLE_POSES": self.stable_poses}[sort_key]
+            positions = np.empty(len(self), dtype=np.int64)
+            positions[np.argsort(values, kind='stable')] = np.arange(len(self))
+            self._orders[sort_key] = positions
+        return self._orders[sort_key]
@@ -0,0 +1,266 @@
+import threading
+import traceback
+
+import numpy as np
+import pybullet
+import pybullet_data
+from pybullet_utils import bullet_client
+
+
+DEFAULT_FRICTION = 0.24
+# distance in m up to which footprints count as touching
+NEIGHBOR_MARGIN = 0.005
+
+
+def tf_from_pos_quat(position, quaternion):
+    """
+    Creates a 4x4 transform from a position and a pybullet (x, y, z, w) quaternion.
+    """
+
+    x, y, z, w = quaternion
+    tf = np.eye(4)
+    tf[:3, :3] = [[1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)],
+                  [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)],
+                  [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)]]
+    tf[:3, 3] = position
+    return tf
+
+
+def pos_quat_from_tf(tf):
+    """
+    Splits a 4x4 transform into a position and a pybullet (x, y, z, w) quaternion.
+    """
+
+    m = tf[:3, :3]
+    trace = np.trace(m)
+    if trace > 0:
+        s = 2 * np.sqrt(trace + 1)
+        quaternion = [(m[2, 1] - m[1, 2]) / s, (m[0, 2] - m[2, 0]) / s,
+                      (m[1, 0] - m[0, 1]) / s, s / 4]
+    elif m[0, 0] > m[1, 1] and m[0, 0] > m[2, 2]:
+        s = 2 * np.sqrt(1 + m[0, 0] - m[1, 1] - m[2, 2])
+        quaternion = [s / 4, (m[0, 1] + m[1, 0]) / s, (m[0, 2] + m[2, 0]) / s,
+                      (m[2, 1] - m[1, 2]) / s]
+    elif m[1, 1] > m[2, 2]:
+        s = 2 * np.sqrt(1 + m[1, 1] - m[0, 0] - m[2, 2])
+        quaternion = [(m[0, 1] + m[1, 0]) / s, s / 4, (m[1, 2] + m[2, 1]) / s,
+                      (m[0, 2] - m[2, 0]) / s]
+    else:
+        s = 2 * np.sqrt(1 + m[2, 2] - m[0, 0] - m[1, 1])
+        quaternion = [(m[0, 2] + m[2, 0]) / s, (m[1, 2] + m[2, 1]) / s, s / 4,
+                      (m[1, 0] - m[0, 1]) / s]
+    quaternion = np.asarray(quaternion)
+    return list(tf[:3, 3]), list(quaternion / np.linalg.norm(quaternion))
+
+
+def box_corners(vertices):
+    """
+    Corners of the axis aligned bounding box of a set of vertices.
+
+    :param vertices: (V, 3) array of vertices
+    :return: (8, 3) array of corners
+    """
+
+    lower, upper = vertices.min(axis=0), vertices.max(axis=0)
+    return np.array([[x, y, z] for x in (lower[0], upper[0])
+                     for y in (lower[1], upper[1]) for z in (lower[2], upper[2])])
+
+
+def footprints(corners, poses):
+    """
+    Axis aligned footprints of instances on the ground plane.
+
+    :param corners: (N, 8, 3) bounding box corners of the instances in their own frames
+    :param poses: (N, 4, 4) array of instance poses
+    :return: (N, 4) array of min x, min y, max x, max y
+    """
+
+    points = np.einsum('nij,nkj->nki', poses[:, :3, :3], corners) + poses[:, None, :3, 3]
+    return np.hstack([points[:, :, :2].min(axis=1), points[:, :, :2].max(axis=1)])
+
+
+def touching_pairs(footprints, seeds, margin=NEIGHBOR_MARGIN):
+    """
+    Tests all pairs of footprints and seed footprints for overlap or contact.
+
+    :param footprints: (N, 4) array of footprints
+    :param seeds: (M, 4) array of footprints
+    :param margin: Gap up to which footprints still touch
+    :return: (N, M) boolean array
+    """
+
+    a, b = footprints[:, None, :], seeds[None, :, :]
+    return ((a[..., 0] <= b[..., 2] + margin) & (b[..., 0] <= a[..., 2] + margin) &
+            (a[..., 1] <= b[..., 3] + margin) & (b[..., 1] <= a[..., 3] + margin))
+
+
+def touching(footprints, seeds, margin=NEIGHBOR_MARGIN):
+    """
+    Finds footprints which overlap or touch any of the seed footprints.
+
+    :param footprints: (N, 4) array of footprints
+    :param seeds: (M, 4) array of footprints
+    :param margin: Gap up to which footprints still touch
+    :return: (N,) boolean array
+    """
+
+    if len(footprints) == 0 or len(seeds) == 0:
+        return np.zeros(len(footprints), dtype=bool)
+    return touching_pairs(footprints, seeds, margin).any(axis=1)
+
+
+class StreamingSimulator(object):
+    """
+    Simulates a snapshot of scene instances in a background thread.
+
+    The simulation uses the urdf files of the object library, like the
+    SceneSimulator of the burg toolkit, but steps in small batches and
+    publishes the poses of all instances after every batch. Consumers poll
+    the latest poses, older ones are dropped, so a slow consumer never
+    slows down the simulation.
+    """
+
+    def __init__(self, urdf_files, poses, frictions, dt=1. / 240, max_duration=10.0,
+                 stream_steps=8, converge=False, linear_threshold=0.002,
+                 angular_threshold=0.02, rest_steps=48, static=None):
+        """
+        :param urdf_files: List of urdf files, one per instance
+        :param poses: (N, 4, 4) array of instance poses, copied on construction
+        :param frictions: List of lateral friction coefficients, None uses the default
+        :param dt: Simulation time step in s
+        :param max_duration: Simulated time after which the simulation stops, in s
+        :param stream_steps: Number of steps between published poses
+        :param converge: Stop as soon as all instances are at rest
+        :param linear_threshold: Linear velocity in m/s below which an instance is at rest
+        :param angular_threshold: Angular velocity in rad/s below which an instance is at rest
+        :param rest_steps: Number of steps all instances need to stay at rest
+        :param static: List of flags, static instances collide but keep their poses
+        """
+
+        self.urdf_files = list(urdf_files)
+        self.initial_poses = np.array(poses, dtype=np.float64).reshape(-1, 4, 4)
+        self.frictions = [DEFAULT_FRICTION if f is None else f for f in frictions]
+        self.static = list(static) if static is not None else [False] * len(self.urdf_files)
+        self.dt = dt
+        self.max_steps = int(max_duration / dt)
+        self.stream_steps = stream_steps
+        self.converge = converge
+        self.linear_threshold = linear_threshold
+        self.angular_threshold = angular_threshold
+        self.rest_steps = rest_steps
+
+        self.steps = 0
+        self.converged = False
+        self.poses = self.initial_poses.copy()
+        self.error = None
+        self._latest = None
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+        self._thread = None
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def wait(self, timeout=None):
+        self._done.wait(timeout)
+
+    def run(self):
+        """
+        Runs the simulation in the calling thread.
+
+        :return: (N, 4, 4) array of settled poses
+        """
+
+        self._run()
+        if self.error:
+            raise RuntimeError(self.error)
+        return self.poses
+
+    def latest(self):
+        """
+        Returns the poses published last and clears them.
+
+        :return: Tuple of (steps, (N, 4, 4) poses) or None if nothing new was published
+        """
+
+        with self._lock:
+            latest, self._latest = self._latest, None
+        return latest
+
+    def _publish(self, poses):
+        with self._lock:
+            self._latest = (self.steps, poses)
+
+    def _at_rest(self, client, bodies):
+        velocities = np.array([np.concatenate(client.getBaseVelocity(body)) for body in bodies])
+        if len(velocities) == 0:
+            return True
+        return (np.linalg.norm(velocities[:, :3], axis=1).max() < self.linear_threshold and
+                np.linalg.norm(velocities[:, 3:], axis=1).max() < self.angular_threshold)
+
+    def _run(self):
+        client = None
+        try:
+            client = bullet_client.BulletClient(connection_mode=pybullet.DIRECT)
+            client.setAdditionalSearchPath(pybullet_data.getDataPath())
+            client.setGravity(0, 0, -9.81)
+            client.setTimeStep(self.dt)
+            client.loadURDF("plane.urdf")
+
+            # only dynamic bodies are read back, static ones keep their initial poses
+            bodies = {}
+            for i, (urdf_file, pose, friction, static) in enumerate(zip(
+                    self.urdf_files, self.initial_poses, self.frictions, self.static)):
+                position, quaternion = pos_quat_from_tf(pose)
+                body = client.loadURDF(urdf_file, basePosition=position,
+                                       baseOrientation=quaternion, useFixedBase=static)
+                client.changeDynamics(body, -1, lateralFriction=friction)
+                if not static:
+                    bodies[i] = body
+
+            # pybullet reports the pose of the center of mass, the urdf link frame is offset by it
+            inertial_inv = {}
+            for i, body in bodies.items():
+                info = client.getDynamicsInfo(body, -1)
+                inertial_inv[i] = np.linalg.inv(tf_from_pos_quat(info[3], info[4]))
+
+            steps_at_rest = 0
+            self.converged = not bodies
+            while bodies and self.steps < self.max_steps and not self._cancel.is_set():
+                for _ in range(self.stream_steps):
+                    client.stepSimulation()
+                self.steps += self.stream_steps
+                poses = self.initial_poses.copy()
+                for i, body in bodies.items():
+                    position, quaternion = client.getBasePositionAndOrientation(body)
+                    poses[i] = tf_from_pos_quat(position, quaternion) @ inertial_inv[i]
+                self.poses = poses
+                self._publish(poses)
+
+                if self.converge:
+                    if self._at_rest(client, bodies.values()):
+                        steps_at_rest += self.stream_steps
+                    else:
+                        steps_at_rest = 0
+                    if steps_at_rest >= self.rest_steps:
+                        self.converged = True
+                        break
+        except Exception as e:
+            self.error = f"{e}\n{traceback.format_exc()}"
+        finally:
+            if client is not None:
+                client.disconnect()
+            self._done.set()
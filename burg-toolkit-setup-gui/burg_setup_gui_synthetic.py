@@ -0,0 +1,199 @@
+import argparse
+import os
+
+import numpy as np
+import open3d as o3d
+
+import burg_toolkit as burg
+
+
+SHAPES = ("box", "cylinder", "hull")
+
+
+def box_mesh(size, triangles=12):
+    """
+    Creates a box centered at the origin.
+    Each side is subdivided into a regular grid to reach the requested number of triangles.
+
+    :param size: Edge lengths along x, y and z
+    :param triangles: Approximate number of triangles, at least 12
+    :return: Tuple of (V, 3) vertices and (T, 3) triangles
+    """
+
+    k = max(1, int(round(np.sqrt(triangles / 12))))
+    t = np.linspace(-0.5, 0.5, k + 1)
+    u, v = np.meshgrid(t, t, indexing='ij')
+    u, v = u.ravel(), v.ravel()
+    grid = np.arange((k + 1) ** 2).reshape(k + 1, k + 1)
+    a, b = grid[:-1, :-1].ravel(), grid[1:, :-1].ravel()
+    c, d = grid[1:, 1:].ravel(), grid[:-1, 1:].ravel()
+    quads = np.concatenate([np.stack([a, b, c], axis=1), np.stack([a, c, d], axis=1)])
+
+    vertices, faces = [], []
+    for axis in range(3):
+        for sign in (-1, 1):
+            side = np.zeros((len(u), 3))
+            # the two remaining axes are ordered so that faces point outwards
+            first, second = (axis + 1) % 3, (axis + 2) % 3
+            if sign < 0:
+                first, second = second, first
+            side[:, axis] = 0.5 * sign
+            side[:, first] = u
+            side[:, second] = v
+            faces.append(quads + len(vertices) * len(u))
+            vertices.append(side)
+    vertices = np.concatenate(vertices) * np.asarray(size)
+    return vertices, np.concatenate(faces)
+
+
+def cylinder_mesh(radius, height, triangles=64):
+    """
+    Creates an upright cylinder centered at the origin.
+
+    :param radius: Radius of the cylinder
+    :param height: Height of the cylinder
+    :param triangles: Approximate number of triangles, at least 12
+    :return: Tuple of (V, 3) vertices and (T, 3) triangles
+    """
+
+    segments = max(3, triangles // 4)
+    angles = np.linspace(0, 2 * np.pi, segments, endpoint=False)
+    ring = np.stack([radius * np.cos(angles), radius * np.sin(angles)], axis=1)
+    bottom = np.hstack([ring, np.full((segments, 1), -height / 2)])
+    top = np.hstack([ring, np.full((segments, 1), height / 2)])
+    centers = np.array([[0, 0, -height / 2], [0, 0, height / 2]])
+    vertices = np.vstack([bottom, top, centers])
+
+    i = np.arange(segments)
+    j = (i + 1) % segments
+    bottom_center, top_center = 2 * segments, 2 * segments + 1
+    faces = np.concatenate([
+        np.stack([i, j, segments + j], axis=1),
+        np.stack([i, segments + j, segments + i], axis=1),
+        np.stack([np.full(segments, bottom_center), j, i], axis=1),
+        np.stack([np.full(segments, top_center), segments + i, segments + j], axis=1)])
+    return vertices, faces
+
+
+def hull_mesh(size, triangles=200, noise=0.15, rng=None):
+    """
+    Creates the convex hull of noisy points on an ellipsoid, centered at the origin.
+
+    :param size: Extent of the ellipsoid along x, y and z
+    :param triangles: Approximate number of triangles
+    :param noise: Relative radial noise of the points
+    :param rng: numpy random generator
+    :return: Tuple of (V, 3) vertices and (T, 3) triangles
+    """
+
+    rng = rng or np.random.default_rng()
+    n_points = max(4, triangles // 2 + 2)
+    directions = rng.normal(size=(n_points, 3))
+    directions /= np.linalg.norm(directions, axis=1, keepdims=True)
+    radii = 1 + rng.uniform(-noise, noise, size=(n_points, 1))
+    points = directions * radii * np.asarray(size) / 2
+
+    cloud = o3d.geometry.PointCloud(o3d.utility.Vector3dVector(points))
+    hull, _ = cloud.compute_convex_hull()
+    hull.remove_unreferenced_vertices()
+    vertices = np.asarray(hull.vertices)
+    vertices -= (vertices.max(axis=0) + vertices.min(axis=0)) / 2
+    return vertices, np.asarray(hull.triangles)
+
+
+def mesh_volume(vertices, triangles):
+    """
+    Volume of a closed mesh, using the divergence theorem.
+    """
+
+    v0, v1, v2 = (vertices[triangles[:, i]] for i in range(3))
+    return abs(np.einsum('ij,ij->i', v0, np.cross(v1, v2)).sum()) / 6
+
+
+def write_obj(filename, vertices, triangles):
+    with open(filename, 'w') as f:
+        np.savetxt(f, vertices, fmt="v %.6f %.6f %.6f")
+        np.savetxt(f, triangles + 1, fmt="f %d %d %d")
+
+
+def generate_library(directory, n_objects, shapes=SHAPES, triangles=200,
+                     size_range=(0.03, 0.12), density_range=(200.0, 800.0),
+                     friction_range=(0.2, 0.6), seed=0, complete=False):
+    """
+    Generates an object library of procedural meshes.
+
+    :param directory: Output directory, meshes are written to its meshes sub-directory
+    :param n_objects: Number of object types
+    :param shapes: Shapes to pick from, see SHAPES
+    :param triangles: Approximate number of triangles per mesh
+    :param size_range: Range of object extents in m
+    :param density_range: Range of densities in kg/m^3, masses follow from the mesh volume
+    :param friction_range: Range of lateral friction coefficients
+    :param seed: Random seed, the same seed creates the same library
+    :param complete: Also compute vhacd, urdf, stable poses and thumbnails
+    :return: Path to the object library yaml file
+    """
+
+    for shape in shapes:
+        if shape not in SHAPES:
+            raise ValueError(f"Unknown shape {shape}, use one of {SHAPES}.")
+
+    rng = np.random.default_rng(seed)
+    mesh_dir = os.path.join(directory, 'meshes')
+    os.makedirs(mesh_dir, exist_ok=True)
+    library_file = os.path.join(directory, 'object_library.yaml')
+
+    lib = burg.ObjectLibrary(name=f"synthetic library ({n_objects} objects)",
+                             description=f"Procedural {', '.join(shapes)} meshes, seed {seed}.")
+    digits = len(str(n_objects - 1))
+    for i in range(n_objects):
+        shape = shapes[i % len(shapes)]
+        size = rng.uniform(*size_range, size=3)
+        if shape == "box":
+            vertices, faces = box_mesh(size, triangles)
+        elif shape == "cylinder":
+            vertices, faces = cylinder_mesh(min(size[0], size[1]) / 2, size[2], triangles)
+        else:
+            vertices, faces = hull_mesh(size, triangles, rng=rng)
+
+        identifier = f"{i:0{digits}d}_{shape}"
+        mesh_fn = os.path.join(mesh_dir, f"{identifier}.obj")
+        write_obj(mesh_fn, vertices, faces)
+        mass = float(mesh_volume(vertices, faces) * rng.uniform(*density_range))
+        lib[identifier] = burg.ObjectType(identifier=identifier, name=f"{shape} {i}",
+                                          mesh_fn=mesh_fn, mass=mass,
+                                          friction_coeff=float(rng.uniform(*friction_range)))
+
+    lib.to_yaml(library_file)
+    if complete:
+        lib.compute_all_attributes()
+        lib.to_yaml(library_file)
+    return library_file
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generates a BURG object library of procedural meshes.")
+    parser.add_argument("directory", help="output directory of the library")
+    parser.add_argument("-n", "--objects", type=int, default=100,
+                        help="number of object types")
+    parser.add_argument("-s", "--shapes", nargs="+", default=list(SHAPES), choices=SHAPES,
+                        help="shapes to generate")
+    parser.add_argument("-t", "--triangles", type=int, default=200,
+                        help="approximate number of triangles per mesh")
+    parser.add_argument("--min-size", type=float, default=0.03, help="minimum extent in m")
+    parser.add_argument("--max-size", type=float, default=0.12, help="maximum extent in m")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("-c", "--complete", action="store_true",
+                        help="also compute all attributes (vhacd, urdf, stable poses, thumbnails)")
+    args = parser.parse_args()
+
+    library_file = generate_library(args.directory, args.objects, shapes=args.shapes,
+                                    triangles=args.triangles,
+                                    size_range=(args.min_size, args.max_size),
+                                    seed=args.seed, complete=args.complete)
+    print(f"Wrote object library {library_file}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+
+
+# approximate size of a python string in a snapshot, in bytes
+KEY_OVERHEAD = 64
+
+
+class SceneSnapshot(object):
+    """
+    Compact copy of the state of the scene manager.
+
+    Instances are stored as arrays, object types as indices into the
+    identifiers of the object library, so restoring a snapshot only copies
+    arrays and never reads from disk.
+    """
+
+    def __init__(self, library_file, identifiers, keys, type_indices, poses, settled,
+                 ground_area, color_id, scene_name=None):
+        """
+        :param library_file: Path to the object library yaml file
+        :param identifiers: Tuple of object type identifiers, shared by snapshots of the same library
+        :param keys: List of blender object names
+        :param type_indices: (N,) array of indices into identifiers
+        :param poses: (N, 4, 4) array of instance poses
+        :param settled: (N, 4, 4) array of settled poses, NaN for objects not settled
+        :param ground_area: Size of the ground area
+        :param color_id: Color counter of the scene manager
+        :param scene_name: Name of the scene in the workspace, if any
+        """
+
+        self.library_file = library_file
+        self.identifiers = identifiers
+        self.keys = keys
+        self.type_indices = type_indices
+        self.poses = poses
+        self.settled = settled
+        self.ground_area = ground_area
+        self.color_id = color_id
+        self.scene_name = scene_name
+        # (N,) array of object statuses, only set if the scene was validated, see stash_scene
+        self.statuses = None
+
+    @property
+    def nbytes(self):
+        return (self.type_indices.nbytes + self.poses.nbytes + self.settled.nbytes
+                + (self.statuses.nbytes if self.statuses is not None else 0)
+                + sum(len(key) + KEY_OVERHEAD for key in self.keys))
+
+    @classmethod
+    def from_instances(cls, library_file, identifiers, instances, settled_poses,
+                       ground_area, color_id, scene_name=None):
+        """
+        :param library_file: Path to the object library yaml file
+        :param identifiers: Tuple of all object type identifiers of the library
+        :param instances: Dictionary of blender object name to burg ObjectInstance
+        :param settled_poses: Dictionary of blender object name to (identifier, settled pose)
+        :param ground_area: Size of the ground area
+        :param color_id: Color counter of the scene manager
+        :param scene_name: Name of the scene in the workspace, if any
+        """
+
+        index = {identifier: i for i, identifier in enumerate(identifiers)}
+        keys = list(instances.keys())
+        type_indices = np.array([index[instances[key].object_type.identifier] for key in keys],
+                                dtype=np.int32)
+        poses = np.array([instances[key].pose for key in keys],
+                         dtype=np.float64).reshape(-1, 4, 4)
+        settled = np.full_like(poses, np.nan)
+        for i, key in enumerate(keys):
+            entry = settled_poses.get(key)
+            if entry and entry[0] == instances[key].object_type.identifier:
+                settled[i] = entry[1]
+        return cls(library_file, identifiers, keys, type_indices, poses, settled,
+                   ground_area, color_id, scene_name)
+
+
+class SnapshotBuffer(object):
+    """
+    Ring buffer of scene snapshots with a memory cap, oldest snapshots are dropped first.
+
+    Snapshot ids include a random session token, so ids stored in blend files
+    of an earlier session never match.
+    """
+
+    def __init__(self, max_bytes=32 << 20):
+        self.max_bytes = max_bytes
+        self.session = uuid.uuid4().hex[:8]
+        self.counter = 0
+        self.snapshots = OrderedDict()
+        self.nbytes = 0
+
+    def __len__(self):
+        return len(self.snapshots)
+
+    def __contains__(self, snapshot_id):
+        return snapshot_id in self.snapshots
+
+    def push(self, snapshot):
+        """
+        Adds a snapshot, dropping the oldest ones above the memory cap.
+
+        :param snapshot: A SceneSnapshot
+        :return: Id of the snapshot
+        """
+
+        self.counter += 1
+        snapshot_id = f"{self.session}-{self.counter}"
+        self.snapshots[snapshot_id] = snapshot
+        self.nbytes += snapshot.nbytes
+        self.trim()
+        return snapshot_id
+
+    def get(self, snapshot_id):
+        return self.snapshots.get(snapshot_id)
+
+    def trim(self):
+        # the newest snapshot is always kept
+        while self.nbytes > self.max_bytes and len(self.snapshots) > 1:
+            _, snapshot = self.snapshots.popitem(last=False)
+            self.nbytes -= snapshot.nbytes
+
+    def library_files(self):
+        return {snapshot.library_file for snapshot in self.snapshots.values()}
+
+    def clear(self):
+        self.snapshots.clear()
+        self.nbytes = 0
@@ -1,7 +1,9 @@
 import bpy
 import addon_utils
 
+from collections import Counter
 from enum import IntEnum
+import hashlib
 import os
 import numpy as np
 import mathutils
@@ -9,6 +11,17 @@ import matplotlib.pyplot as plt
 from PIL import Image
 
 import burg_toolkit as burg
+import burg_setup_gui_collection as collection
+import burg_setup_gui_cache as cache
+import burg_setup_gui_sim as sim
+import burg_setup_gui_undo as undo
+import burg_setup_gui_collision as collision
+import burg_setup_gui_printout as printout
+import burg_setup_gui_io as io
+import burg_setup_gui_warmup as warmup
+import burg_setup_gui_search as search
+import burg_setup_gui_workspace as workspace
+from burg_setup_gui_profiling import profiler
 
 
 class BurgStatus(IntEnum):
@@ -29,6 +42,25 @@ BURG_TO_BLENDER_SIZES = {burg.constants.SIZE_A2: "SIZE_A2",
                          burg.constants.SIZE_A3: "SIZE_A3",
                          burg.constants.SIZE_A4: "SIZE_A4"}
 
+# version and text datablock of the scene state stored in blend files, see SceneManager.get_state
+SCENE_STATE_VERSION = 1
+SCENE_STATE_TEXT = "burg_scene_state.json"
+# steps poses are quantized to before hashing, in m and for rotation matrix entries,
+# see SceneManager.fingerprint
+FINGERPRINT_POSITION_STEP = 1e-6
+FINGERPRINT_ROTATION_STEP = 1e-5
+
+BLENDER_TO_BURG_LODS = {"LOD_FULL": 0,
+                        "LOD_MEDIUM": 1,
+                        "LOD_LOW": 2}
+
+# attributes of the scene manager which belong to the current object library,
+# they are swapped as a whole when switching libraries, see SceneManager.switch_library
+LIBRARY_FIELDS = ("object_library", "object_library_file", "mesh_cache", "object_library_hash",
+                  "library_identifiers", "mesh_keys", "cached_mesh_types", "type_corners",
+                  "stable_pose_matrices", "search_index", "bounds_checker", "footprint_cache",
+                  "mesh_bytes", "type_usage")
+
 
 def get_resources_folder():
     for mod in addon_utils.modules():
@@ -55,6 +87,35 @@ def convert_numpy_image(image):
                        dtype=np.float32) * byte_to_normalized).ravel()
 
 
+def create_blender_mesh(name, vertices, triangles):
+    """
+    Creates a blender mesh from vertex and triangle arrays.
+    Uses foreach_set, which copies whole arrays instead of per vertex lists.
+
+    :param name: Name of the new mesh datablock
+    :param vertices: (V, 3) array of vertices
+    :param triangles: (T, 3) array of vertex indices
+    :return: The blender mesh
+    """
+
+    n_triangles = len(triangles)
+    blender_mesh = bpy.data.meshes.new(name)
+    blender_mesh.vertices.add(len(vertices))
+    blender_mesh.vertices.foreach_set(
+        "co", np.asarray(vertices, dtype=np.float32).ravel())
+    blender_mesh.loops.add(n_triangles * 3)
+    blender_mesh.loops.foreach_set(
+        "vertex_index", np.asarray(triangles, dtype=np.int32).ravel())
+    blender_mesh.polygons.add(n_triangles)
+    blender_mesh.polygons.foreach_set(
+        "loop_start", np.arange(0, n_triangles * 3, 3, dtype=np.int32))
+    blender_mesh.polygons.foreach_set(
+        "loop_total", np.full(n_triangles, 3, dtype=np.int32))
+    blender_mesh.update()
+    blender_mesh.validate()
+    return blender_mesh
+
+
 def add_material(blender_object):
     if not "burg_object_material" in bpy.data.materials:
         print("The material for displaying object colors is missing.")
@@ -69,6 +130,51 @@ def get_size(size):
     return BLENDER_TO_BURG_SIZES[size]
 
 
+def get_simulation_settings():
+    """
+    Simulation parameters chosen in the settings, as keyword arguments of the StreamingSimulator.
+    """
+
+    burg_params = bpy.context.scene.burg_params
+    return {"max_duration": burg_params.simulation_duration,
+            "converge": burg_params.simulation_mode == 'CONVERGE',
+            "linear_threshold": burg_params.rest_linear_velocity,
+            "angular_threshold": burg_params.rest_angular_velocity,
+            "rest_steps": burg_params.rest_steps}
+
+
+def use_local_simulation():
+    return bpy.context.scene.burg_params.local_simulation
+
+
+def use_library_warmup():
+    return bpy.context.scene.burg_params.library_warmup
+
+
+def get_undo_memory():
+    """
+    Memory cap of the undo snapshots in bytes.
+    """
+
+    return bpy.context.scene.burg_params.undo_memory << 20
+
+
+def get_workspace_memory():
+    """
+    Memory cap of the object libraries kept loaded in the workspace in bytes.
+    """
+
+    return bpy.context.scene.burg_params.workspace_memory << 20
+
+
+def blender_mesh_nbytes(mesh):
+    """
+    Approximate memory of a blender mesh: vertices, loops and polygons.
+    """
+
+    return len(mesh.vertices) * 20 + len(mesh.loops) * 8 + len(mesh.polygons) * 12
+
+
 def get_stable_poses(instance):
     stable_poses = []
     for pose in instance.object_type.stable_poses:
@@ -80,9 +186,11 @@ def get_stable_poses(instance):
     return stable_poses
 
 
-def update_display_colors():
+def update_display_colors(objects=None):
     burg_params = bpy.context.scene.burg_params
-    burg_objects = [o for o in bpy.data.objects if o.get("burg_object_type")]
+    if objects is None:
+        objects = bpy.data.objects
+    burg_objects = [o for o in objects if o.get("burg_object_type")]
     if burg_params.view_mode == 'view_color':
         for o in burg_objects:
             o.color = o["burg_color"]
@@ -96,16 +204,51 @@ def trigger_display_update(params):
         params.view_mode = 'view_state'
 
 
+# (space type, region type) pairs waiting for a redraw, see request_redraw
+pending_redraws = set()
+
+
+def request_redraw(space_type="VIEW_3D", region_types=("WINDOW", "UI")):
+    """
+    Schedules a redraw of the given regions of all areas of a space type.
+    Requests are collected and handled once by a timer, so many changes
+    within one frame only tag each region once.
+
+    :param space_type: Type of the areas to redraw
+    :param region_types: Types of the regions to redraw within these areas
+    """
+
+    pending_redraws.update((space_type, region_type) for region_type in region_types)
+    if not bpy.app.timers.is_registered(flush_redraws):
+        bpy.app.timers.register(flush_redraws, first_interval=0.0)
+
+
+def flush_redraws():
+    """
+    Tags all regions requested since the last call for redraw.
+    """
+
+    requested = set(pending_redraws)
+    pending_redraws.clear()
+    space_types = {space_type for space_type, _ in requested}
+    window_manager = bpy.context.window_manager
+    if window_manager:
+        for window in window_manager.windows:
+            for area in window.screen.areas:
+                if area.type not in space_types:
+                    continue
+                for region in area.regions:
+                    if (area.type, region.type) in requested:
+                        region.tag_redraw()
+    # run once
+    return None
+
+
 def tag_redraw(context, space_type="PROPERTIES", region_type="WINDOW"):
     # https://blender.stackexchange.com/questions/45138/buttons-for-custom-properties-dont-refresh-when-changed-by-other-parts-of-the-s
     # Auto refresh for custom collection property does not work without tagging a redraw
     """ Redraws given windows area of specific type """
-    for window in context.window_manager.windows:
-        for area in window.screen.areas:
-            if area.spaces[0].type == space_type:
-                for region in area.regions:
-                    if region.type == region_type:
-                        region.tag_redraw()
+    request_redraw(space_type, (region_type,))
 
 
 def set_active_and_select(obj):
@@ -125,6 +268,20 @@ def singleton(cls):
     return getinstance
 
 
+def write_scene(scene_file, scene, object_library):
+    """
+    Writes a scene to a yaml file, with a printout of the current settings.
+    Touches no blender data, so it can run in the background.
+
+    :param scene_file: Path to the scene yaml file
+    :param scene: A burg Scene
+    :param object_library: The object library of the scene
+    """
+
+    printout = burg.printout.Printout(size=scene.ground_area)
+    scene.to_yaml(scene_file, object_library, printout=printout)
+
+
 @singleton
 class SceneManager(object):
     """
@@ -133,12 +290,84 @@ class SceneManager(object):
     """
 
     def __init__(self):
+        # blender object name -> burg ObjectInstance, objects of the same
+        # object type are linked duplicates sharing one cached mesh
         self.blender_to_burg = {}
         self.object_library = None
         self.scene = None
+        self.scene_file = None
         self.object_library_file = None
         self.colormap = plt.get_cmap('tab20')
         self.color_id = 0
+        self.mesh_cache = None
+        self.cached_mesh_types = set()
+        # object type identifier -> mesh cache key, the hash of its mesh file
+        self.mesh_keys = {}
+        # approximate memory of the blender meshes created for the current library
+        self.mesh_bytes = 0
+        # (mesh cache key, level of detail) -> name of the blender mesh, shared by all
+        # object types with the same mesh, None until the blend file was scanned
+        self.blender_meshes = None
+        self.display_lod = 0
+        # steps and convergence of the last simulation, shown in the settings
+        self.last_simulation = None
+        # blender object name -> (object type identifier, pose) after the last simulation
+        self.settled_poses = {}
+        # object type identifier -> (8, 3) bounding box corners
+        self.type_corners = {}
+        # object type identifier -> (P, 4, 4) stable poses, see get_stable_pose_matrices
+        self.stable_pose_matrices = {}
+        # object type identifier -> number of instances added by the user, warmed up first
+        self.type_usage = Counter()
+        # running preparation of the object types of the library, see start_warmup
+        self.warmup = None
+        # fields of all object types for the object list, see get_search_index
+        self.search_index = None
+        # scene snapshots restored by undo and redo, see push_snapshot
+        self.snapshots = undo.SnapshotBuffer()
+        # object libraries kept loaded with their caches and scenes, see switch_library,
+        # and the name of the current scene of the current library
+        self.workspace = workspace.Workspace()
+        self.scene_name = workspace.DEFAULT_SCENE_NAME
+        # called with the dropped workspace.LibraryEntry list, e.g. to remove their previews
+        self.eviction_callback = None
+        self.library_identifiers = None
+        # hash of the object library file and fingerprint of the last validated scene
+        self.object_library_hash = None
+        self.validated_fingerprint = None
+        # collision shapes of all object types of all libraries in the workspace and
+        # convex hulls of the current library, see check_status
+        self.collision_world = None
+        self.bounds_checker = None
+        # footprints of object types per stable pose, see get_printout
+        self.footprint_cache = None
+        # running background simulation, see start_simulation
+        self.active_simulator = None
+        # blender object name -> pose last shown in the viewport while simulating, objects
+        # whose matrix_world differs were moved by the user, see moved_during_simulation
+        self.shown_poses = {}
+
+    def profile_dir(self):
+        """
+        Directory for captured profiles, next to the scene file if there is one.
+        """
+
+        if self.scene_file:
+            return os.path.dirname(os.path.abspath(self.scene_file))
+        if bpy.data.filepath:
+            return os.path.dirname(bpy.data.filepath)
+        return None
+
+    def profile_info(self):
+        """
+        Library and scene sizes recorded with captured profiles.
+        """
+
+        return {"object_library_file": self.object_library_file,
+                "object_types": len(self.object_library) if self.object_library else 0,
+                "scene_file": self.scene_file,
+                "instances": len(self.scene.objects) if self.scene else 0,
+                "blender_objects": len(self.blender_to_burg)}
 
     def same_object_library(self, object_library_file=None):
         return self.object_library_file == object_library_file
@@ -146,6 +375,7 @@ class SceneManager(object):
     def set_area_size(self, size):
         self.scene.ground_area = get_size(size)
 
+    @profiler.timed("library completion")
     def complete_object_library(self, savepath):
         lib = self.object_library
 
@@ -157,12 +387,15 @@ class SceneManager(object):
             lib.generate_thumbnails(render_engine=engine, override=False)
             engine.dismiss()
             lib.to_yaml(savepath)
+            # all meshes are loaded at this point, store them for later sessions
+            cache.MeshCache.for_library(savepath).build(lib)
 
-    def load_object_library(self, filepath, savepath=None):
+    def load_object_library(self, filepath, savepath=None, object_library=None):
         """
         Loads and updates object library related interface items.
 
         :param filepath: Path to a object library yaml file
+        :param object_library: The library read from filepath in the background, if any
         """
 
         if not filepath or not os.path.isfile(filepath):
@@ -174,14 +407,335 @@ class SceneManager(object):
             savepath = filepath
 
         if not self.same_object_library(filepath):
-            self.object_library = burg.ObjectLibrary.from_yaml(filepath)
-            self.complete_object_library(savepath)
-            self.object_library.filepath = savepath
-            self.object_library_file = savepath
+            self.cancel_warmup()
+            # the scene of the previous library stays in the workspace, see stash_scene
+            self.remove_blender_objects()
+            self.stash_library()
+            # libraries still in the workspace are used as long as their file did not change
+            entry = self.workspace.get(filepath) if savepath == filepath else None
+            if (entry is not None
+                    and entry.fields.get("object_library_hash") == cache.file_hash(filepath)):
+                self.activate_library(entry)
+                # scenes created with this library so far are kept, the new scene gets its own slot
+                self.scene_name = entry.new_scene_name() if entry.scenes else entry.active_scene
+                entry.active_scene = self.scene_name
+            else:
+                self.workspace.remove(savepath)
+                if object_library is None:
+                    with profiler.stage("yaml parse"):
+                        object_library = burg.ObjectLibrary.from_yaml(filepath)
+                self.reset_library_fields()
+                self.object_library = object_library
+                self.complete_object_library(savepath)
+                self.object_library.filepath = savepath
+                self.object_library_file = savepath
+                self.mesh_cache = cache.MeshCache.for_library(savepath)
+                self.object_library_hash = cache.file_hash(savepath)
+                self.scene_name = workspace.DEFAULT_SCENE_NAME
+                self.workspace.put(workspace.LibraryEntry(savepath))
+                self.trim_workspace()
+                if not use_library_warmup():
+                    # otherwise the warm up creates the collision shapes type by type
+                    # and the search index in the background
+                    with profiler.stage("collision shapes"):
+                        self.get_collision_world().build(self.object_library)
+                    self.get_search_index()
         # Loading a new object_library invalidates the scene and mapping
         self.blender_to_burg.clear()
+        self.settled_poses.clear()
         self.scene = None
 
+    def library_fields(self):
+        return {name: getattr(self, name) for name in LIBRARY_FIELDS}
+
+    def reset_library_fields(self):
+        """
+        Starts empty caches for a new object library. Caches are replaced instead of
+        cleared, as the previous library keeps them in the workspace.
+        """
+
+        for name in LIBRARY_FIELDS:
+            setattr(self, name, None)
+        self.mesh_keys = {}
+        self.cached_mesh_types = set()
+        self.type_corners = {}
+        self.stable_pose_matrices = {}
+        self.mesh_bytes = 0
+        self.type_usage = Counter()
+
+    def stash_library(self):
+        """
+        Keeps the current object library with its caches in the workspace.
+        Collision shapes and blender meshes stay loaded, only bodies of the scene are removed.
+        """
+
+        if not self.object_library or not self.object_library_file:
+            return
+        entry = self.workspace.entries.get(self.object_library_file)
+        if entry is None:
+            entry = workspace.LibraryEntry(self.object_library_file)
+            self.workspace.put(entry)
+        entry.fields = self.library_fields()
+        entry.active_scene = self.scene_name
+        if self.collision_world:
+            self.collision_world.clear()
+        self.trim_workspace()
+
+    def activate_library(self, entry):
+        """
+        Makes an object library of the workspace the current one, without reading from disk.
+
+        :param entry: A workspace.LibraryEntry
+        """
+
+        for name in LIBRARY_FIELDS:
+            setattr(self, name, entry.fields[name])
+        self.workspace.get(entry.library_file)
+        self.scene_name = entry.active_scene
+
+    def trim_workspace(self):
+        """
+        Drops the least recently used libraries above the memory cap of the workspace,
+        with the blender meshes and collision shapes only they used, see eviction_callback.
+        """
+
+        entry = self.workspace.entries.get(self.object_library_file)
+        if entry is not None and self.object_library:
+            entry.fields = self.library_fields()
+        self.workspace.max_bytes = get_workspace_memory()
+        evicted = self.workspace.trim(keep=self.object_library_file)
+        if not evicted:
+            return
+        keep = set(self.mesh_keys.values())
+        for library_entry in self.workspace.entries.values():
+            keep.update(library_entry.fields.get("mesh_keys", {}).values())
+        self.release_blender_meshes(keep=keep)
+        if self.collision_world:
+            self.collision_world.remove_shapes(keep)
+        if self.eviction_callback:
+            self.eviction_callback(evicted)
+
+    def clear_workspace(self):
+        """
+        Drops all libraries of the workspace, e.g. when another blend file is opened.
+        """
+
+        self.workspace.clear()
+        self.blender_meshes = None
+        self.scene_name = workspace.DEFAULT_SCENE_NAME
+
+    def library_entry(self):
+        """
+        :return: The workspace entry of the current object library, or None
+        """
+
+        return self.workspace.entries.get(self.object_library_file)
+
+    def scene_names(self):
+        entry = self.library_entry()
+        return entry.scene_names() if entry else [self.scene_name]
+
+    def stash_scene(self):
+        """
+        Keeps the current scene in its slot of the workspace, with the poses of the blender
+        objects. Nothing is stored while the mapping to blender objects is incomplete,
+        e.g. after the blender objects were removed.
+        """
+
+        entry = self.library_entry()
+        if (entry is None or self.scene is None or not self.object_library
+                or len(self.blender_to_burg) != len(self.scene.objects)):
+            return
+        for key, instance in self.blender_to_burg.items():
+            obj = bpy.data.objects.get(key)
+            if obj:
+                instance.pose[:, :] = obj.matrix_world
+        snapshot = self.scene_snapshot()
+        if self.is_validated():
+            # the scene is shown again without validating it, see load_snapshot
+            snapshot.statuses = np.array(
+                [bpy.data.objects[key].get("burg_status", BurgStatus.OK) for key in snapshot.keys],
+                dtype=np.int8)
+        entry.scenes[self.scene_name] = snapshot
+        entry.active_scene = self.scene_name
+
+    def load_snapshot(self, snapshot):
+        """
+        Creates the scene and its blender objects from a snapshot of the current library.
+
+        :param snapshot: An undo.SceneSnapshot
+        """
+
+        self.scene = burg.core.Scene(ground_area=snapshot.ground_area)
+        self.blender_to_burg.clear()
+        self.settled_poses.clear()
+        self.validated_fingerprint = None
+        self.color_id = 0
+        objects = []
+        with profiler.stage("snapshot restore"):
+            for type_index, pose, settled in zip(snapshot.type_indices, snapshot.poses,
+                                                 snapshot.settled):
+                object_type = self.object_library[snapshot.identifiers[type_index]]
+                instance = burg.ObjectInstance(object_type, pose=pose.copy())
+                self.scene.objects.append(instance)
+                obj = self.add_burg_instance_to_blender(instance)
+                objects.append(obj)
+                if not np.isnan(settled[0, 0]):
+                    self.settled_poses[obj.name] = (object_type.identifier, settled.copy())
+        self.color_id = max(self.color_id, snapshot.color_id)
+        if snapshot.statuses is not None:
+            # the scene was validated when it was stashed and nothing changed since
+            for obj, status in zip(objects, snapshot.statuses):
+                obj["burg_status"] = int(status)
+            self.validated_fingerprint = self.fingerprint()
+
+    def switch_library(self, library_file):
+        """
+        Makes a library of the workspace the current one and shows its current scene.
+        The scene of the previous library is kept, nothing is read from disk.
+
+        :param library_file: Path to the object library yaml file
+        :return: False if the library is no longer in the workspace
+        """
+
+        if library_file == self.object_library_file:
+            return True
+        entry = self.workspace.entries.get(library_file)
+        if entry is None:
+            return False
+
+        with profiler.stage("library switch"):
+            self.cancel_warmup()
+            ground_area = self.scene.ground_area if self.scene else burg.constants.SIZE_A3
+            self.remove_blender_objects()
+            self.stash_library()
+            self.activate_library(entry)
+            self.show_scene(self.scene_name, ground_area)
+        return True
+
+    def switch_scene(self, scene_name):
+        """
+        Shows another scene of the current library, a new empty one if there is none of that name.
+
+        :param scene_name: Name of the scene in the workspace
+        """
+
+        if scene_name == self.scene_name and self.scene:
+            return
+        with profiler.stage("scene switch"):
+            ground_area = self.scene.ground_area if self.scene else burg.constants.SIZE_A3
+            self.remove_blender_objects()
+            self.show_scene(scene_name, ground_area)
+
+    def new_scene(self):
+        """
+        Adds an empty scene to the current library and shows it.
+        """
+
+        entry = self.library_entry()
+        if entry is None:
+            return
+        self.switch_scene(entry.new_scene_name())
+
+    def show_scene(self, scene_name, ground_area):
+        """
+        Creates a scene of the current library from its slot in the workspace.
+
+        :param scene_name: Name of the scene
+        :param ground_area: Size of the ground area of a new scene
+        """
+
+        if self.scene:
+            self.scene.objects.clear()
+        self.scene_name = scene_name
+        entry = self.library_entry()
+        snapshot = entry.scenes.get(scene_name) if entry else None
+        if entry:
+            entry.active_scene = scene_name
+        if snapshot is None:
+            self.scene = burg.core.Scene(ground_area=ground_area)
+            self.validated_fingerprint = None
+        else:
+            self.load_snapshot(snapshot)
+
+    def get_library_identifiers(self):
+        """
+        Identifiers of all object types of the current library, in a fixed order.
+        """
+
+        if self.library_identifiers is None:
+            self.library_identifiers = tuple(self.object_library.keys())
+        return self.library_identifiers
+
+    def push_snapshot(self):
+        """
+        Stores a snapshot of the current scene and tags the blender scene with its id.
+        Blender stores the tag with the undo step of the running operator, so
+        undo and redo can restore the matching snapshot, see restore_snapshot.
+        """
+
+        if not self.scene or not self.object_library:
+            return
+
+        with profiler.stage("snapshot"):
+            self.snapshots.max_bytes = get_undo_memory()
+            bpy.context.scene["burg_snapshot_id"] = self.snapshots.push(self.scene_snapshot())
+
+    def scene_snapshot(self):
+        """
+        :return: An undo.SceneSnapshot of the current scene
+        """
+
+        return undo.SceneSnapshot.from_instances(
+            self.object_library_file, self.get_library_identifiers(), self.blender_to_burg,
+            self.settled_poses, self.scene.ground_area, self.color_id,
+            scene_name=self.scene_name)
+
+    def restore_snapshot(self, snapshot_id):
+        """
+        Restores the scene, the mapping to blender objects and the object library
+        from a snapshot, without reading from disk. The object library has to be
+        in the workspace.
+
+        :param snapshot_id: Id of the snapshot, as stored in the blender scene
+        :return: True if the snapshot was restored, False if it is no longer available
+        """
+
+        snapshot = self.snapshots.get(snapshot_id)
+        if snapshot is None:
+            return False
+
+        if snapshot.library_file != self.object_library_file:
+            entry = self.workspace.entries.get(snapshot.library_file)
+            if entry is None:
+                return False
+            self.cancel_warmup()
+            # undo already replaced the blender objects, so the scene is not stashed
+            self.stash_library()
+            self.activate_library(entry)
+        if snapshot.scene_name:
+            self.scene_name = snapshot.scene_name
+            entry = self.library_entry()
+            if entry:
+                entry.active_scene = snapshot.scene_name
+
+        with profiler.stage("snapshot restore"):
+            if self.scene:
+                self.scene.objects.clear()
+            self.scene = burg.core.Scene(ground_area=snapshot.ground_area)
+            self.blender_to_burg.clear()
+            self.settled_poses.clear()
+            for key, type_index, pose, settled in zip(snapshot.keys, snapshot.type_indices,
+                                                      snapshot.poses, snapshot.settled):
+                object_type = self.object_library[snapshot.identifiers[type_index]]
+                instance = burg.ObjectInstance(object_type, pose=pose.copy())
+                self.scene.objects.append(instance)
+                self.blender_to_burg[key] = instance
+                if not np.isnan(settled[0, 0]):
+                    self.settled_poses[key] = (object_type.identifier, settled.copy())
+            self.color_id = snapshot.color_id
+        return True
+
     def random_scene(self, object_library_file=None, ground_area=burg.constants.SIZE_A3, n_instances=1, n_instances_objects=1):
         """
         Creates a random scene.
@@ -198,27 +752,31 @@ class SceneManager(object):
             self.remove_blender_objects()
             self.scene.objects.clear()
 
-        self.scene = burg.sampling.sample_scene(
-            object_library=self.object_library,
-            ground_area=ground_area,
-            instances_per_scene=n_instances,
-            instances_per_object=n_instances_objects
-        )
+        with profiler.stage("scene sampling"):
+            self.scene = burg.sampling.sample_scene(
+                object_library=self.object_library,
+                ground_area=ground_area,
+                instances_per_scene=n_instances,
+                instances_per_object=n_instances_objects
+            )
 
         self.color_id = 0
 
         for item in self.scene.objects:
             self.add_burg_instance_to_blender(item)
 
-    def empty_scene(self, object_library_file=None, ground_area=burg.constants.SIZE_A3, savepath=None):
+    def empty_scene(self, object_library_file=None, ground_area=burg.constants.SIZE_A3, savepath=None,
+                    object_library=None):
         """
         Creates an empty scene.
 
         :param object_library_file: Path to a object library yaml file
         :param ground_area: Size of the working area.
+        :param object_library: The library read from object_library_file in the background, if any
         """
 
-        self.load_object_library(object_library_file, savepath=savepath)
+        self.load_object_library(object_library_file, savepath=savepath,
+                                 object_library=object_library)
 
         if self.scene:
             self.remove_blender_objects()
@@ -227,11 +785,12 @@ class SceneManager(object):
         self.scene = burg.core.Scene(ground_area=ground_area)
         self.color_id = 0
 
-    def load_scene(self, scene_file=None, savepath=None):
+    def load_scene(self, scene_file=None, savepath=None, prefetched=None):
         """
         Loads a scene from file.
 
         :param scene_file: Path to a scene yaml file
+        :param prefetched: Tuple of scene and library read from scene_file in the background, if any
         """
 
         if not os.path.isfile(scene_file):
@@ -239,15 +798,24 @@ class SceneManager(object):
         else:
             try:
                 self.remove_blender_objects()
-                scene, library, printout = burg.Scene.from_yaml(scene_file)
-                self.load_object_library(library.filename, savepath=savepath)
-                scene, library, printout = burg.Scene.from_yaml(
-                    scene_file, object_library=self.object_library)
+                if prefetched is None:
+                    with profiler.stage("yaml parse"):
+                        scene, library, _ = burg.Scene.from_yaml(scene_file)
+                else:
+                    scene, library = prefetched
+                self.load_object_library(library.filename, savepath=savepath,
+                                         object_library=library)
                 if scene and library:
+                    # the library was loaded before, use its object types instead of the copies
+                    if library is not self.object_library:
+                        for instance in scene.objects:
+                            instance.object_type = self.object_library[
+                                instance.object_type.identifier]
                     if self.scene:
                         self.scene.objects.clear()
                     self.scene = scene
                     self.scene.object_library = self.object_library
+                    self.scene_file = scene_file
                     self.blender_to_burg.clear()
                     for item in self.scene.objects:
                         self.add_burg_instance_to_blender(item)
@@ -255,6 +823,33 @@ class SceneManager(object):
                 print(f"Could not open burg scene: {scene_file}")
                 print(e)
 
+    def load_scene_from_collection(self, collection_file=None, index=0, savepath=None):
+        """
+        Loads a single scene from a scene collection file.
+
+        :param collection_file: Path to a scene collection file
+        :param index: Index of the scene within the collection
+        """
+
+        if not os.path.isfile(collection_file):
+            print(f"The scene collection file {collection_file} does not exist.")
+        else:
+            try:
+                self.remove_blender_objects()
+                with collection.SceneCollectionReader(collection_file) as reader:
+                    self.load_object_library(reader.object_library_file, savepath=savepath)
+                    with profiler.stage("collection read"):
+                        scene = reader.read_scene(index, self.object_library)
+                if self.scene:
+                    self.scene.objects.clear()
+                self.scene = scene
+                self.blender_to_burg.clear()
+                for item in self.scene.objects:
+                    self.add_burg_instance_to_blender(item)
+            except Exception as e:
+                print(f"Could not open scene {index} of collection: {collection_file}")
+                print(e)
+
     def save_scene(self, scene_file=None):
         """
         Saves a scene to file.
@@ -264,14 +859,40 @@ class SceneManager(object):
 
         if scene_file:
             try:
-                # create a printout with current settings
-                printout = burg.printout.Printout(size=self.scene.ground_area)
-                self.scene.to_yaml(
-                    scene_file, self.object_library, printout=printout)
+                with profiler.stage("yaml write"):
+                    io.atomic_write(scene_file, write_scene, self.copy_scene(),
+                                    self.object_library)
+                self.scene_file = scene_file
             except Exception as e:
                 print(f"Could not save burg scene: {scene_file}")
                 print(e)
 
+    def copy_scene(self):
+        """
+        Copy of the current scene which later edits do not change, e.g. for writing it
+        in the background. Object types are shared, they are not modified by edits.
+        """
+
+        scene = burg.core.Scene(ground_area=self.scene.ground_area)
+        for instance in self.scene.objects:
+            scene.objects.append(burg.ObjectInstance(instance.object_type,
+                                                     pose=np.array(instance.pose, copy=True)))
+        return scene
+
+    def save_scene_to_collection(self, collection_file=None):
+        """
+        Appends the current scene to a scene collection file.
+        The collection is created if it does not exist yet.
+
+        :param collection_file: Path to a scene collection file
+        :return: Index of the scene within the collection
+        """
+
+        with collection.SceneCollectionWriter(collection_file,
+                                              object_library_file=self.object_library_file,
+                                              append=True) as writer:
+            return writer.write(self.scene)
+
     def check_status(self):
         """
         Checks the status of all object in the scene using simulation.
@@ -280,29 +901,284 @@ class SceneManager(object):
         if not self.scene:
             return False
 
-        collision_objects = self.scene.colliding_instances()
-        out_of_bounds_objects = self.scene.out_of_bounds_instances()
+        self.use_cached_meshes()
+        with profiler.stage("collision check"):
+            # collision shapes of all object types are reused, only bodies are moved
+            self.update_collisions(self.blender_to_burg.keys())
+            world = self.collision_world
+        keys = list(self.blender_to_burg.keys())
+        with profiler.stage("out of bounds check"):
+            out_of_bounds = self.out_of_bounds_status(keys)
         status_ok = True
 
         # check which objects in our map are in collision or out
-        collision_instances = [self.scene.objects[i]
-                               for i in collision_objects]
-        out_of_bounds_instances = [self.scene.objects[i]
-                                   for i in out_of_bounds_objects]
-
-        for key, value in self.blender_to_burg.items():
+        for key, is_out in zip(keys, out_of_bounds):
             real_object = bpy.data.objects[key]
-            if value in collision_instances:
+            if world.is_colliding(key):
                 real_object["burg_status"] = BurgStatus.COLLISION
                 status_ok = False
-            elif value in out_of_bounds_instances:
+            elif is_out:
                 real_object["burg_status"] = BurgStatus.OUT_OF_BOUNDS
                 status_ok = False
             else:
                 real_object["burg_status"] = BurgStatus.OK
 
+        self.validated_fingerprint = self.fingerprint()
         return status_ok
 
+    def fingerprint(self):
+        """
+        Hash of everything the validation depends on: object library, ground area,
+        objects, their types and poses. Poses are quantized before hashing, so poses
+        from the simulation and the same poses read back from blender, which stores
+        them in single precision, have the same fingerprint.
+        """
+
+        sha1 = hashlib.sha1()
+        sha1.update(f"{self.object_library_hash} {tuple(self.scene.ground_area)}".encode())
+        for key in sorted(self.blender_to_burg.keys()):
+            instance = self.blender_to_burg[key]
+            pose = np.asarray(instance.pose, dtype=np.float64)
+            rotation = np.round(pose[:3, :3] / FINGERPRINT_ROTATION_STEP).astype(np.int64)
+            position = np.round(pose[:3, 3] / FINGERPRINT_POSITION_STEP).astype(np.int64)
+            sha1.update(f"{key} {instance.object_type.identifier}".encode())
+            sha1.update(rotation.tobytes())
+            sha1.update(position.tobytes())
+        return sha1.hexdigest()
+
+    def get_state(self):
+        """
+        State of the scene manager to store in a blend file, see restore_state.
+
+        :return: json serializable dictionary, None without a scene
+        """
+
+        if not self.scene or not self.object_library_hash:
+            return None
+
+        objects = {}
+        for key, instance in self.blender_to_burg.items():
+            obj = bpy.data.objects.get(key)
+            if obj:
+                objects[key] = {"type": instance.object_type.identifier,
+                                "status": int(obj.get("burg_status", BurgStatus.OK))}
+        return {"version": SCENE_STATE_VERSION,
+                "object_library_file": self.object_library_file,
+                "object_library_hash": self.object_library_hash,
+                "ground_area": list(self.scene.ground_area),
+                "color_id": self.color_id,
+                "type_usage": dict(self.type_usage),
+                "objects": objects,
+                "fingerprint": self.validated_fingerprint}
+
+    def restore_state(self, state):
+        """
+        Rebuilds the scene from a state stored in a blend file and the blender objects.
+        The object library is loaded without regenerating anything, as long as its
+        file did not change.
+
+        :param state: Dictionary, see get_state
+        :return: True if the state was restored, False if the library file changed
+        """
+
+        if state.get("version") != SCENE_STATE_VERSION:
+            return False
+        library_file = state.get("object_library_file")
+        if not library_file or not os.path.isfile(library_file):
+            return False
+        if cache.file_hash(library_file) != state.get("object_library_hash"):
+            return False
+
+        with profiler.stage("state restore"):
+            # the blend file replaced all blender objects and meshes, the old mapping is void
+            self.blender_to_burg.clear()
+            self.settled_poses.clear()
+            self.scene = None
+            self.blender_meshes = None
+            self.load_object_library(library_file)
+            self.validated_fingerprint = None
+            self.scene = burg.core.Scene(ground_area=tuple(state["ground_area"]))
+            self.color_id = state.get("color_id", 0)
+            # the stored counts already include all instances of the library, replace them
+            self.type_usage = Counter(state.get("type_usage", {}))
+            for key, entry in state["objects"].items():
+                obj = bpy.data.objects.get(key)
+                if (obj is None or obj.get("burg_object_type") != entry["type"]
+                        or entry["type"] not in self.object_library):
+                    continue
+                pose = np.eye(4)
+                pose[:, :] = obj.matrix_world
+                instance = burg.ObjectInstance(self.object_library[entry["type"]], pose=pose)
+                self.scene.objects.append(instance)
+                self.blender_to_burg[key] = instance
+                obj["burg_status"] = entry["status"]
+
+            # statuses are still valid if nothing changed since the last validation
+            if state.get("fingerprint") and self.fingerprint() == state["fingerprint"]:
+                self.validated_fingerprint = state["fingerprint"]
+        return True
+
+    def reset_collision_world(self):
+        """
+        Drops the collision shapes of all libraries, and the convex hulls and footprints
+        of the current object library.
+        """
+
+        if self.collision_world:
+            self.collision_world.disconnect()
+        self.collision_world = None
+        self.bounds_checker = None
+        self.footprint_cache = None
+
+    def get_printout(self, vector=False):
+        """
+        Creates a printout of the current scene, holding its own copy of the instances.
+
+        :param vector: Use the vector printout of the setup tool. Its footprints of object
+                       types are kept between printouts, so only instances in new orientations
+                       are rasterized. Otherwise the burg toolkit printout is used.
+        """
+
+        size = self.scene.ground_area
+        if not vector:
+            scene = burg.core.Scene(ground_area=tuple(size))
+            scene.objects.extend(
+                burg.ObjectInstance(instance.object_type, pose=instance.pose.copy())
+                for instance in self.scene.objects)
+            burg_printout = burg.printout.Printout(size=size)
+            burg_printout.add_scene(scene)
+            return burg_printout
+        px_per_m = printout.FastPrintout.resolution(size)
+        if self.footprint_cache is None or self.footprint_cache.px_per_m != px_per_m:
+            self.footprint_cache = printout.FootprintCache(self.mesh_cache.get_arrays, px_per_m)
+        fast_printout = printout.FastPrintout(size, self.footprint_cache)
+        fast_printout.add_scene(self.scene)
+        return fast_printout
+
+    def get_bounds_checker(self, object_types=()):
+        """
+        Returns the bounds checker of the current object library. Convex hulls are
+        only computed for the object types which are checked, on first use.
+
+        :param object_types: burg ObjectTypes the checker needs to know
+        """
+
+        if self.bounds_checker is None:
+            self.bounds_checker = collision.BoundsChecker()
+        missing = {object_type.identifier: object_type for object_type in object_types
+                   if object_type.identifier not in self.bounds_checker}
+        if missing:
+            with profiler.stage("convex hulls"):
+                self.bounds_checker.add(
+                    {identifier: collision.hull_points(self.mesh_cache.get_arrays(object_type)[0])
+                     for identifier, object_type in missing.items()})
+        return self.bounds_checker
+
+    def out_of_bounds_status(self, keys):
+        """
+        Checks which objects reach outside of the ground area, all at once.
+
+        :param keys: Names of blender objects
+        :return: (N,) boolean array
+        """
+
+        instances = [self.blender_to_burg[key] for key in keys]
+        checker = self.get_bounds_checker([i.object_type for i in instances])
+        type_indices = checker.type_indices([i.object_type.identifier for i in instances])
+        poses = np.array([i.pose for i in instances]).reshape(-1, 4, 4)
+        return checker.out_of_bounds(type_indices, poses, self.scene.ground_area)
+
+    def get_collision_world(self):
+        """
+        Returns the collision world, shared by all libraries of the workspace. Collision
+        shapes are created at library load or by the warm up, otherwise on first use,
+        object types with the same mesh share one shape.
+        """
+
+        if self.collision_world is None:
+            self.collision_world = collision.CollisionWorld(shape_key=self.get_mesh_key)
+            self.collision_world.connect()
+        return self.collision_world
+
+    def update_collisions(self, keys):
+        """
+        Moves the collision bodies of the given objects to their instance poses and
+        recomputes their contacts. Objects without a body, e.g. added ones, are
+        always updated, bodies of removed objects are removed.
+
+        :param keys: Names of changed blender objects
+        :return: Set of names whose collision status may have changed
+        """
+
+        world = self.get_collision_world()
+        affected = set()
+        for key in [key for key in world.bodies if key not in self.blender_to_burg]:
+            affected |= world.remove(key)
+
+        changed = {key for key in keys if key in self.blender_to_burg}
+        changed |= {key for key in self.blender_to_burg if key not in world.bodies}
+        changed = list(changed)
+        for key in changed:
+            instance = self.blender_to_burg[key]
+            world.set_pose(key, instance.object_type, instance.pose)
+
+        if changed:
+            all_keys = list(self.blender_to_burg.keys())
+            instances = [self.blender_to_burg[key] for key in all_keys]
+            footprints = self.get_footprints([i.object_type for i in instances],
+                                             [i.pose for i in instances])
+            index = {key: i for i, key in enumerate(all_keys)}
+            candidates = sim.touching_pairs(footprints,
+                                            footprints[[index[key] for key in changed]])
+            updated = set()
+            for j, key in enumerate(changed):
+                affected |= world.update_contacts(
+                    key, [all_keys[i] for i in np.flatnonzero(candidates[:, j])], updated)
+                updated.add(key)
+        return affected
+
+    def validate_objects(self, keys):
+        """
+        Checks collisions and bounds of the given objects only, e.g. after they were moved.
+        Collision shapes stay loaded between calls, statuses of objects which were
+        or are in contact with the given ones are updated as well.
+
+        :param keys: Names of changed blender objects
+        :return: List of blender objects whose status was updated
+        """
+
+        if not self.scene:
+            return []
+
+        changed = [key for key in keys
+                   if key in self.blender_to_burg and key in bpy.data.objects]
+        for key in changed:
+            self.blender_to_burg[key].pose[:, :] = bpy.data.objects[key].matrix_world
+        with profiler.stage("live collision check"):
+            affected = self.update_collisions(changed)
+
+        world = self.collision_world
+        objects = []
+        affected = [key for key in affected
+                    if key in self.blender_to_burg and key in bpy.data.objects]
+        with profiler.stage("live out of bounds check"):
+            out_of_bounds = self.out_of_bounds_status(affected)
+            for key, is_out in zip(affected, out_of_bounds):
+                obj = bpy.data.objects[key]
+                if world.is_colliding(key):
+                    obj["burg_status"] = BurgStatus.COLLISION
+                elif is_out:
+                    obj["burg_status"] = BurgStatus.OUT_OF_BOUNDS
+                else:
+                    obj["burg_status"] = BurgStatus.OK
+                objects.append(obj)
+        return objects
+
+    def is_validated(self):
+        return (self.validated_fingerprint is not None
+                and self.validated_fingerprint == self.fingerprint())
+
+    @profiler.timed("pose sync")
     def update_scene_poses(self):
         """
         Updates poses of all object instances of current scene.
@@ -312,6 +1188,7 @@ class SceneManager(object):
             real_object = bpy.data.objects[key]
             self.blender_to_burg[key].pose[:, :] = real_object.matrix_world
 
+    @profiler.timed("pose sync")
     def update_blender_poses(self):
         """
         Updates poses of all blender objects from current scene.   
@@ -323,20 +1200,19 @@ class SceneManager(object):
 
     def remove_blender_objects(self):
         """
-        Removes all blender objects and their meshes   
+        Removes all blender objects, the scene is kept in the workspace first, see stash_scene.
+        Their meshes are kept for reuse, see release_blender_meshes.
         """
+        self.stash_scene()
         for key in self.blender_to_burg.keys():
             # The blender object can be deleted before an update to the blender_to_burg map during Undo/Redo actions
             # Therfore no remove is necessary
             if key in bpy.data.objects.keys():
                 obj = bpy.data.objects[key]
-                mesh = bpy.data.meshes[obj.data.name]
                 bpy.data.objects.remove(obj, do_unlink=True)
-                # check if we are the last user for this mesh
-                if mesh.users < 1:
-                    bpy.data.meshes.remove(mesh, do_unlink=True)
 
         self.blender_to_burg.clear()
+        self.settled_poses.clear()
         self.color_id = 0
 
     def is_burg_object(self, obj):
@@ -349,27 +1225,233 @@ class SceneManager(object):
             self.scene.objects.remove(item)
 
             real_object = bpy.data.objects[obj.name]
-            mesh = bpy.data.meshes[real_object.data.name]
             bpy.data.objects.remove(real_object, do_unlink=True)
-            if mesh.users < 1:
-                bpy.data.meshes.remove(mesh, do_unlink=True)
 
+    @profiler.timed("simulation")
     def simulate_scene(self, verbose=True):
         """
         Simulates current scene
 
         :param verbose: Visualize simulation. 
+        :return: Number of simulated steps
         """
 
         if not self.scene:
-            return
+            return 0
+
+        if verbose:
+            # verbose shows the simulator GUI, slower than real-time
+            simulator = burg.scene_sim.SceneSimulator(verbose=verbose)
+            try:
+                # the poses of all instances in the scene are automatically updated by the simulator
+                simulator.simulate_scene(self.scene)
+            finally:
+                # errors are reported by the calling operator, the window is closed in any case
+                simulator.dismiss()
+            return 0
+
+        # simulates the maximum duration, or stops early once the scene is at rest
+        # if chosen in the settings
+        keys, simulator = self.create_simulator()
+        poses = simulator.run()
+        for key, pose in zip(keys, poses):
+            self.blender_to_burg[key].pose[:, :] = pose
+        self.mark_settled()
+        self.last_simulation = (simulator.steps, simulator.converged)
+        return simulator.steps
+
+    def start_simulation(self, **kwargs):
+        """
+        Starts simulating a snapshot of the current scene in a background thread.
+        Poses are only written back by finish_simulation.
+
+        :param kwargs: Parameters of the StreamingSimulator, overriding the settings
+        :return: Tuple of the blender object names and the running simulator
+        """
+
+        keys, simulator = self.create_simulator(**kwargs)
+        self.shown_poses = {key: instance.pose.copy()
+                            for key, instance in self.blender_to_burg.items()}
+        simulator.start()
+        self.active_simulator = simulator
+        return keys, simulator
+
+    def is_simulating(self):
+        return self.active_simulator is not None and not self.active_simulator.done
+
+    def create_simulator(self, **kwargs):
+        """
+        Creates a simulator for the current scene. With local simulation enabled
+        in the settings only changed objects and their neighbors are simulated.
+
+        :param kwargs: Parameters of the StreamingSimulator, overriding the settings
+        :return: Tuple of the simulated blender object names and the simulator
+        """
+
+        if use_local_simulation():
+            keys, static = self.changed_neighborhood()
+        else:
+            keys = list(self.blender_to_burg.keys())
+            static = [False] * len(keys)
+        instances = [self.blender_to_burg[key] for key in keys]
+        settings = get_simulation_settings()
+        settings.update(kwargs)
+        simulator = sim.StreamingSimulator(
+            [instance.object_type.urdf_fn for instance in instances],
+            [instance.pose for instance in instances],
+            [instance.object_type.friction_coeff for instance in instances],
+            static=static, **settings)
+        return keys, simulator
+
+    def get_type_corners(self, object_type):
+        """
+        Bounding box corners of an object type, in its own frame.
+
+        :param object_type: A burg ObjectType
+        :return: (8, 3) array of corners
+        """
+
+        corners = self.type_corners.get(object_type.identifier)
+        if corners is None:
+            vertices, _ = self.mesh_cache.get_arrays(object_type)
+            corners = self.type_corners[object_type.identifier] = sim.box_corners(vertices)
+        return corners
+
+    def get_footprints(self, object_types, poses):
+        """
+        :param object_types: List of burg ObjectTypes
+        :param poses: List of 4x4 poses
+        :return: (N, 4) array of footprints, see sim.footprints
+        """
+
+        if not object_types:
+            return np.zeros((0, 4))
+        corners = np.array([self.get_type_corners(object_type) for object_type in object_types])
+        return sim.footprints(corners, np.array(poses).reshape(-1, 4, 4))
+
+    def changed_neighborhood(self):
+        """
+        Finds the objects moved, added or removed since the last simulation.
+        Changed objects and the objects touching them are simulated, the objects
+        touching those are static, all others are left out.
+
+        :return: Tuple of blender object names and a static flag for each of them
+        """
+
+        keys = list(self.blender_to_burg.keys())
+        if not self.settled_poses:
+            return keys, [False] * len(keys)
+
+        instances = [self.blender_to_burg[key] for key in keys]
+        changed = np.zeros(len(keys), dtype=bool)
+        for i, (key, instance) in enumerate(zip(keys, instances)):
+            settled = self.settled_poses.get(key)
+            changed[i] = (settled is None or settled[0] != instance.object_type.identifier
+                          or not np.allclose(settled[1], instance.pose, atol=1e-5))
+
+        # objects resting on removed objects have to settle again
+        removed = [settled for key, settled in self.settled_poses.items()
+                   if key not in self.blender_to_burg and settled[0] in self.object_library]
+        if not changed.any() and not removed:
+            return [], []
+
+        with profiler.stage("simulation neighborhood"):
+            footprints = self.get_footprints([i.object_type for i in instances],
+                                             [i.pose for i in instances])
+            seeds = np.vstack([
+                footprints[changed],
+                self.get_footprints([self.object_library[identifier] for identifier, _ in removed],
+                                    [pose for _, pose in removed])])
+            dynamic = changed | sim.touching(footprints, seeds)
+            static = ~dynamic & sim.touching(footprints, footprints[dynamic])
+        selected = np.flatnonzero(dynamic | static)
+        return [keys[i] for i in selected], [bool(static[i]) for i in selected]
+
+    def mark_settled(self):
+        """
+        Remembers the current poses as settled, later simulations only simulate
+        objects changed since.
+        """
+
+        self.settled_poses = {key: (instance.object_type.identifier, instance.pose.copy())
+                              for key, instance in self.blender_to_burg.items()}
+
+    @profiler.timed("pose sync")
+    def apply_simulation_poses(self, keys, poses):
+        """
+        Shows intermediate simulation poses on the blender objects.
+
+        :param keys: Blender object names, as returned by start_simulation
+        :param poses: (N, 4, 4) array of poses
+        """
+
+        for key, pose in zip(keys, poses):
+            # objects may have been deleted while simulating
+            obj = bpy.data.objects.get(key)
+            if obj:
+                obj.matrix_world = mathutils.Matrix(pose)
+                self.shown_poses[key] = np.array(pose)
+
+    def moved_during_simulation(self):
+        """
+        Finds the objects the user moved in the viewport while the simulation was running.
+
+        :return: Set of blender object names
+        """
+
+        moved = set()
+        for key, shown in self.shown_poses.items():
+            obj = bpy.data.objects.get(key)
+            if obj and key in self.blender_to_burg and not np.allclose(
+                    np.array(obj.matrix_world), shown, atol=1e-5):
+                moved.add(key)
+        return moved
+
+    def keep_moved_objects(self):
+        """
+        Takes over the poses of objects moved while simulating, so writing poses back
+        to blender does not undo these edits.
+
+        :return: Set of blender object names of the moved objects
+        """
+
+        moved = self.moved_during_simulation()
+        for key in moved:
+            self.blender_to_burg[key].pose[:, :] = bpy.data.objects[key].matrix_world
+        self.shown_poses = {}
+        return moved
+
+    def cancel_simulation(self):
+        """
+        Restores the poses from before the simulation, except for objects moved while simulating.
+        """
+
+        self.keep_moved_objects()
+        self.update_blender_poses()
+
+    def finish_simulation(self, keys, poses, steps=0, converged=False):
+        """
+        Writes settled simulation poses back to the scene and the blender objects.
+        Objects moved by the user while simulating keep their new pose and are not
+        marked as settled, so the next simulation includes them.
+
+        :param keys: Blender object names, as returned by start_simulation
+        :param poses: (N, 4, 4) array of poses
+        :param steps: Number of simulated steps
+        :param converged: Whether the simulation stopped because the scene was at rest
+        """
 
-        # TODO: Error handling
-        # verbose shows the simulator GUI, slower than real-time
-        sim = burg.scene_sim.SceneSimulator(verbose=verbose)
-        # the poses of all instances in the scene are automatically updated by the simulator
-        sim.simulate_scene(self.scene)
-        sim.dismiss()  # can also reuse, then the window stays open
+        self.last_simulation = (steps, converged)
+        moved = self.moved_during_simulation()
+        for key, pose in zip(keys, poses):
+            instance = self.blender_to_burg.get(key)
+            if instance and key not in moved:
+                instance.pose[:, :] = pose
+        self.keep_moved_objects()
+        self.update_blender_poses()
+        self.mark_settled()
+        for key in moved:
+            self.settled_poses.pop(key, None)
 
     def add_object(self, id):
         """
@@ -382,8 +1464,9 @@ class SceneManager(object):
             return None
 
          # retrieve first stable pose as default
-        if self.object_library[id].stable_poses:
-            stable_pose = self.object_library[id].stable_poses[0][1]
+        stable_poses = self.get_stable_pose_matrices(self.object_library[id])
+        if len(stable_poses):
+            stable_pose = stable_poses[0]
         else:
             stable_pose = np.eye(4)
 
@@ -391,8 +1474,182 @@ class SceneManager(object):
             self.object_library[id], pose=stable_pose.copy())
 
         self.scene.objects.append(instance)
+        self.type_usage[id] += 1
         return self.add_burg_instance_to_blender(instance)
 
+    def get_search_index(self, build=True):
+        """
+        Returns the search index of the current object library, read from the
+        mesh cache directory or built once per library version.
+
+        :param build: Read or build a missing index, which reads all meshes. Otherwise only
+                      an index prepared by the warm up is taken and None returned until then.
+        """
+
+        if not self.object_library:
+            return None
+        if self.search_index is None or self.search_index.library_hash != self.object_library_hash:
+            if (self.warmup and self.warmup.object_library is self.object_library
+                    and self.warmup.search_index is not None):
+                self.search_index = self.warmup.search_index
+            elif build:
+                with profiler.stage("search index"):
+                    self.search_index = search.SearchIndex.for_library(
+                        self.object_library, self.mesh_cache, self.object_library_hash)
+            else:
+                return None
+        return self.search_index
+
+    def get_stable_pose_matrices(self, object_type):
+        """
+        Stable poses of an object type as one array, see warmup.stable_pose_matrices.
+        """
+
+        if object_type.identifier not in self.stable_pose_matrices:
+            self.stable_pose_matrices[object_type.identifier] = \
+                warmup.stable_pose_matrices(object_type)
+        return self.stable_pose_matrices[object_type.identifier]
+
+    def start_warmup(self):
+        """
+        Starts preparing all object types of the current library in the background,
+        most used first, unless this library is already prepared or being prepared.
+
+        :return: The LibraryWarmup
+        """
+
+        if (self.warmup and not self.warmup.cancelled and self.warmup.error is None
+                and self.warmup.object_library is self.object_library):
+            return self.warmup
+        self.cancel_warmup()
+        identifiers = self.get_library_identifiers()
+        order = {identifier: i for i, identifier in enumerate(identifiers)}
+        identifiers = sorted(identifiers,
+                             key=lambda i: (-self.type_usage[i], order[i]))
+        self.warmup = warmup.LibraryWarmup(self.object_library, self.mesh_cache, identifiers,
+                                           lods=sorted({0, self.display_lod}),
+                                           library_hash=self.object_library_hash)
+        self.warmup.start()
+        return self.warmup
+
+    def cancel_warmup(self):
+        if self.warmup:
+            self.warmup.cancel()
+
+    def finish_warmup(self, identifier, mesh_key, stable_poses):
+        """
+        Creates everything of a prepared object type which needs the main thread:
+        its blender mesh and collision shape.
+
+        :param identifier: Identifier of the object type
+        :param mesh_key: Mesh cache key of the object type, hashed in the background
+        :param stable_poses: (P, 4, 4) array of its stable poses
+        """
+
+        object_type = self.object_library[identifier]
+        self.mesh_keys.setdefault(identifier, mesh_key)
+        self.stable_pose_matrices[identifier] = stable_poses
+        self.get_blender_mesh(object_type)
+        with profiler.stage("collision shapes"):
+            self.get_collision_world().get_shape(object_type)
+
+    def get_mesh_key(self, object_type):
+        """
+        Mesh cache key of an object type, the hash of its mesh file. Object types
+        of all libraries with the same key share meshes, collision shapes and previews.
+
+        :param object_type: A burg ObjectType
+        """
+
+        mesh_key = self.mesh_keys.get(object_type.identifier)
+        if mesh_key is None:
+            mesh_key = self.mesh_keys[object_type.identifier] = \
+                self.mesh_cache.key(object_type.mesh_fn)
+        return mesh_key
+
+    def find_blender_mesh(self, mesh_key, lod):
+        """
+        :return: The blender mesh of a mesh cache key and level of detail, or None
+        """
+
+        if self.blender_meshes is not None:
+            name = self.blender_meshes.get((mesh_key, lod))
+            if name is None:
+                return None
+            blender_mesh = bpy.data.meshes.get(name)
+            if (blender_mesh and blender_mesh.get("burg_mesh_key") == mesh_key
+                    and blender_mesh.get("burg_lod", 0) == lod):
+                return blender_mesh
+        # undo, redo and opening files add and remove meshes, look them up again
+        self.blender_meshes = {(m["burg_mesh_key"], m.get("burg_lod", 0)): m.name
+                               for m in bpy.data.meshes if m.get("burg_mesh_key")}
+        name = self.blender_meshes.get((mesh_key, lod))
+        return bpy.data.meshes.get(name) if name else None
+
+    def get_blender_mesh(self, object_type):
+        """
+        Returns the blender mesh of an object type at the current display level of detail.
+        Meshes are shared by all object types with the same mesh file, also across
+        libraries. The full resolution mesh uses the identifier of the first object type as name.
+
+        :param object_type: A burg ObjectType
+        """
+
+        mesh_key = self.get_mesh_key(object_type)
+        blender_mesh = self.find_blender_mesh(mesh_key, self.display_lod)
+        if not blender_mesh:
+            mesh_id = f"{object_type.identifier}"
+            if self.display_lod:
+                mesh_id = f"{mesh_id}.lod{self.display_lod}"
+            with profiler.stage("mesh load"):
+                vertices, triangles = self.mesh_cache.get_arrays(
+                    object_type, self.display_lod)
+            with profiler.stage("blender mesh creation"):
+                blender_mesh = create_blender_mesh(mesh_id, vertices, triangles)
+            # the fake user keeps the mesh alive while no instance uses it
+            blender_mesh.use_fake_user = True
+            blender_mesh["burg_object_type"] = object_type.identifier
+            blender_mesh["burg_mesh_key"] = mesh_key
+            blender_mesh["burg_lod"] = self.display_lod
+            self.blender_meshes[(mesh_key, self.display_lod)] = blender_mesh.name
+            self.mesh_bytes += blender_mesh_nbytes(blender_mesh)
+        return blender_mesh
+
+    def release_blender_meshes(self, keep=None):
+        """
+        Removes all cached object meshes which are not used by any object.
+
+        :param keep: Set of mesh cache keys whose meshes are kept, e.g. of libraries in the workspace
+        """
+
+        for mesh in [m for m in bpy.data.meshes if m.get("burg_object_type")]:
+            if keep is not None and mesh.get("burg_mesh_key") in keep:
+                continue
+            mesh.use_fake_user = False
+            if mesh.users < 1:
+                bpy.data.meshes.remove(mesh, do_unlink=True)
+        self.blender_meshes = None
+
+    def set_display_lod(self, lod):
+        """
+        Switches all blender objects to another display level of detail.
+        Only the displayed meshes change, validation and printouts always use
+        the full resolution meshes.
+
+        :param lod: Level of detail, 0 is the full resolution mesh
+        """
+
+        if lod == self.display_lod:
+            return
+        self.display_lod = lod
+
+        for key, value in self.blender_to_burg.items():
+            if key in bpy.data.objects.keys():
+                obj = bpy.data.objects[key]
+                obj.data = self.get_blender_mesh(value.object_type)
+                add_material(obj)
+
+    @profiler.timed("blender object creation")
     def add_burg_instance_to_blender(self, instance):
         """
         Adds all relevant blender objects for a specific burg ObjectInstance 
@@ -400,14 +1657,7 @@ class SceneManager(object):
         :param instance: A burg ObjectInstance 
         """
 
-        mesh_id = f"{instance.object_type.identifier}"
-        if bpy.data.meshes.get(mesh_id):
-            blender_mesh = bpy.data.meshes.get(mesh_id)
-        else:
-            o3d_mesh = instance.object_type.mesh
-            blender_mesh = bpy.data.meshes.new(mesh_id)
-            blender_mesh.from_pydata(o3d_mesh.vertices, [], o3d_mesh.triangles)
-
+        blender_mesh = self.get_blender_mesh(instance.object_type)
         obj = bpy.data.objects.new(
             f"{hash(instance)}", blender_mesh)
         self.color_id += 1
@@ -427,6 +1677,19 @@ class SceneManager(object):
         bpy.context.collection.objects.link(obj)
         return obj
 
+    def use_cached_meshes(self):
+        """
+        Replaces the meshes of all object types in the scene with meshes read
+        from the mesh cache, so burg functions do not parse mesh files again.
+        """
+
+        for instance in self.scene.objects:
+            object_type = instance.object_type
+            if object_type.identifier not in self.cached_mesh_types:
+                with profiler.stage("mesh load"):
+                    object_type.mesh = self.mesh_cache.get_mesh(object_type)
+                self.cached_mesh_types.add(object_type.identifier)
+
     def set_to_stable_pose(self, obj):
         if self.has_stable_poses(obj):
             idx = obj.burg_stable_poses
@@ -434,12 +1697,11 @@ class SceneManager(object):
 
             if instance:
                 new_pose = mathutils.Matrix(
-                    instance.object_type.stable_poses[idx][1].copy())
+                    self.get_stable_pose_matrices(instance.object_type)[idx])
                 new_pose[0][3] = obj.matrix_world[0][3]
                 new_pose[1][3] = obj.matrix_world[1][3]
                 obj.matrix_world = new_pose
-                for area in bpy.context.screen.areas:
-                    area.tag_redraw()
+                request_redraw()
 
     def lock_transform(self, enable=True):
         """
@@ -491,6 +1753,7 @@ class SceneManager(object):
     def get_burg_instance(self, obj):
         return self.blender_to_burg.get(obj.name)
 
+    @profiler.timed("synchronize")
     def synchronize(self):
         try:
             if self.scene:
@@ -529,8 +1792,10 @@ class SceneManager(object):
                     size = bpy.context.scene.burg_params.area_size
                     bpy.context.scene.burg_params.area_size = size
 
-            for area in bpy.context.screen.areas:
-                area.tag_redraw()
+                self.set_display_lod(
+                    BLENDER_TO_BURG_LODS[bpy.context.scene.burg_params.display_lod])
+
+            request_redraw()
         except Exception as e:
             print("Error during synchronize.")
             print(e)
@@ -0,0 +1,119 @@
+import queue
+import threading
+import time
+import traceback
+
+import numpy as np
+
+import burg_setup_gui_search as search
+
+
+def stable_pose_matrices(object_type):
+    """
+    Stable poses of an object type as one array, most probable first.
+
+    :param object_type: A burg ObjectType
+    :return: (P, 4, 4) array of poses
+    """
+
+    return np.array([np.asarray(pose) for _, pose in (object_type.stable_poses or [])],
+                    dtype=np.float64).reshape(-1, 4, 4)
+
+
+class LibraryWarmup(object):
+    """
+    Prepares the object types of a library before they are first added.
+
+    Work which does not touch blender data, hashing mesh files, reading meshes
+    from the mesh cache and stacking stable poses, runs in a background thread, in the
+    order of the given identifiers. The search index of the library is read
+    or built last, when all meshes are cached. Blender meshes, collision shapes and
+    previews of prepared object types are created on the main thread by
+    step, for a limited time per call, so the interface stays responsive.
+    """
+
+    def __init__(self, object_library, mesh_cache, identifiers, lods=(0,), library_hash=None):
+        """
+        :param object_library: A burg ObjectLibrary
+        :param mesh_cache: The MeshCache of the library
+        :param identifiers: Object type identifiers in the order they are prepared
+        :param lods: Levels of detail of the meshes read from the mesh cache
+        :param library_hash: Hash of the object library file, the search index is only
+                             prepared if it is given
+        """
+
+        self.object_library = object_library
+        self.mesh_cache = mesh_cache
+        self.identifiers = list(identifiers)
+        self.lods = tuple(lods)
+        self.library_hash = library_hash
+        # SearchIndex of the library, once prepared
+        self.search_index = None
+        self.finished = 0
+        self.error = None
+        # (identifier, mesh key, stable poses) of object types prepared in the background
+        self._prepared = queue.Queue()
+        self._cancel = threading.Event()
+        self._thread = None
+
+    @property
+    def total(self):
+        return len(self.identifiers)
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def done(self):
+        return (self.cancelled or self.error is not None
+                or (self.finished >= self.total and not self.running))
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def _run(self):
+        try:
+            for identifier in self.identifiers:
+                if self._cancel.is_set():
+                    break
+                object_type = self.object_library[identifier]
+                mesh_key = self.mesh_cache.key(object_type.mesh_fn)
+                for lod in self.lods:
+                    self.mesh_cache.get_arrays(object_type, lod)
+                self._prepared.put((identifier, mesh_key, stable_pose_matrices(object_type)))
+            if self.library_hash is not None and not self._cancel.is_set():
+                self.search_index = search.SearchIndex.for_library(
+                    self.object_library, self.mesh_cache, self.library_hash)
+        except Exception as e:
+            self.error = f"{e}\n{traceback.format_exc()}"
+
+    def step(self, finish, max_seconds=0.02):
+        """
+        Finishes prepared object types on the calling thread.
+
+        :param finish: Callable with the identifier, mesh cache key and stable poses
+                       of a prepared object type
+        :param max_seconds: Time after which no further object type is finished
+        :return: Number of object types finished
+        """
+
+        start = time.perf_counter()
+        count = 0
+        while not self.cancelled and time.perf_counter() - start < max_seconds:
+            try:
+                identifier, mesh_key, poses = self._prepared.get_nowait()
+            except queue.Empty:
+                break
+            finish(identifier, mesh_key, poses)
+            self.finished += 1
+            count += 1
+        return count
@@ -0,0 +1,141 @@
+from collections import OrderedDict
+
+import numpy as np
+
+
+# approximate size of a loaded object type without its meshes, in bytes
+OBJECT_TYPE_OVERHEAD = 4096
+# fields which are not counted as cache memory: the library is counted per object type,
+# the mesh cache only memory maps files
+UNCOUNTED_FIELDS = ("object_library", "mesh_cache")
+DEFAULT_SCENE_NAME = "Scene 1"
+
+
+def cache_nbytes(value, depth=4):
+    """
+    Approximate memory of the arrays held by nested containers and objects.
+
+    :param value: Array, container or object
+    :param depth: Number of nesting levels searched for arrays
+    :return: Number of bytes
+    """
+
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if depth == 0:
+        return 0
+    if isinstance(value, dict):
+        values = value.values()
+    elif isinstance(value, (list, tuple, set)):
+        values = value
+    elif hasattr(value, '__dict__'):
+        values = vars(value).values()
+    else:
+        return 0
+    return sum(cache_nbytes(v, depth - 1) for v in values)
+
+
+class LibraryEntry(object):
+    """
+    An object library kept in memory with its caches and scenes.
+    """
+
+    def __init__(self, library_file, fields=None):
+        """
+        :param library_file: Path to the object library yaml file
+        :param fields: Dictionary of the per library attributes of the scene manager
+        """
+
+        self.library_file = library_file
+        self.fields = fields or {}
+        # scene name -> SceneSnapshot
+        self.scenes = OrderedDict()
+        self.active_scene = DEFAULT_SCENE_NAME
+
+    @property
+    def nbytes(self):
+        library = self.fields.get("object_library")
+        # blender meshes are counted by the scene manager, in the mesh_bytes field
+        return (OBJECT_TYPE_OVERHEAD * (len(library) if library else 0)
+                + self.fields.get("mesh_bytes", 0)
+                + sum(cache_nbytes(value) for name, value in self.fields.items()
+                      if name not in UNCOUNTED_FIELDS)
+                + sum(snapshot.nbytes for snapshot in self.scenes.values()))
+
+    def scene_names(self):
+        names = list(self.scenes.keys())
+        if self.active_scene not in self.scenes:
+            names.append(self.active_scene)
+        return names
+
+    def new_scene_name(self):
+        names = set(self.scene_names())
+        i = len(names) + 1
+        while f"Scene {i}" in names:
+            i += 1
+        return f"Scene {i}"
+
+
+class Workspace(object):
+    """
+    Object libraries kept in memory, so switching between them reads nothing from disk.
+    Least recently used libraries are dropped above the memory cap.
+    """
+
+    def __init__(self, max_bytes=256 << 20):
+        self.max_bytes = max_bytes
+        # library file -> LibraryEntry, least recently used first
+        self.entries = OrderedDict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, library_file):
+        return library_file in self.entries
+
+    @property
+    def nbytes(self):
+        return sum(entry.nbytes for entry in self.entries.values())
+
+    def get(self, library_file):
+        """
+        :return: The LibraryEntry, marked as used last, or None
+        """
+
+        entry = self.entries.get(library_file)
+        if entry is not None:
+            self.entries.move_to_end(library_file)
+        return entry
+
+    def put(self, entry):
+        self.entries[entry.library_file] = entry
+        self.entries.move_to_end(entry.library_file)
+
+    def remove(self, library_file):
+        return self.entries.pop(library_file, None)
+
+    def library_files(self):
+        return list(self.entries.keys())
+
+    def trim(self, keep=None):
+        """
+        Drops the least recently used libraries above the memory cap.
+
+        :param keep: Library file which is never dropped, e.g. the current one
+        :return: List of dropped LibraryEntry
+        """
+
+        evicted = []
+        sizes = {library_file: entry.nbytes for library_file, entry in self.entries.items()}
+        total = sum(sizes.values())
+        for library_file in list(self.entries.keys()):
+            if total <= self.max_bytes:
+                break
+            if library_file == keep:
+                continue
+            evicted.append(self.entries.pop(library_file))
+            total -= sizes[library_file]
+        return evicted
+
+    def clear(self):
+        self.entries.clear()